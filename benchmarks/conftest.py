@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+"""Fixtures of the benchmarks, see stub.py."""
+
+import pytest
+
+from benchmarks.stub import StubServer
+from metsaregister import Client, configure_catalogue, configure_throttle
+
+
+def pytest_addoption(parser):
+    parser.addoption('--run-slow', action='store_true',
+                     help='Also run the benchmarks of the large inputs.')
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'slow: a benchmark of a large input, see --run-slow')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--run-slow'):
+        return
+    skip = pytest.mark.skip(reason='a large input, run with --run-slow')
+    for item in items:
+        if 'slow' in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture(scope='session')
+def stub_server():
+    # Benchmark the client rather than the throttling
+    configure_throttle(initial_rps=1e6, max_rps=1e6, max_concurrency=64)
+    # Keep the layer lists of the stub server out of the user's catalogue
+    configure_catalogue(False)
+    server = StubServer()
+    yield server
+    server.close()
+    configure_throttle()
+    configure_catalogue()
+
+
+@pytest.fixture
+def client(stub_server):
+    stub_server.layers.clear()
+    with Client(base_url=stub_server.url, pool_size=16) as client:
+        yield client
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+"""
+Replaying the recorded test cassettes, and synthetically scaled versions of them, from a local
+HTTP server.
+
+Layer query responses are scaled by repeating the recorded features under new IDs. Information
+pages are served for any requested ID by cycling through the recorded pages of the same kind, so
+that scaled layers resolve to thousands of distinct information pages.
+"""
+
+import glob
+import itertools
+import os
+import re
+import zlib
+
+from lxml import etree
+from six.moves.urllib.parse import parse_qs, urlsplit
+
+from tests import stub
+from tests.stub import CASSETTES, load_cassette
+
+EMPTY_LAYER = (b'<?xml version="1.0" encoding="UTF-8"?><objects><total>0 objects</total>'
+               b'</objects>')
+
+
+def load_layer_responses(name):
+    """Return the recorded layer query responses of a cassette by layer ID."""
+    return {int(parse_qs(urlsplit(url).query)['layer_id'][0]): body
+            for method, url, body in load_cassette(name) if 'in=objects' in url}
+
+
+def load_info_pages():
+    """Return the recorded information pages of all cassettes by page, e.g. 'info.php'."""
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(CASSETTES, '*.yaml'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        for method, url, body in load_cassette(name):
+            page = urlsplit(url).path.rsplit('/', 1)[-1]
+            if page.startswith('info'):
+                pages.setdefault(page, {})[url] = body
+    return {page: [bodies[url] for url in sorted(bodies)] for page, bodies in pages.items()}
+
+
+def scale_layer_response(body, n_features):
+    """Repeat the features of a recorded layer query response until there are `n_features`."""
+    root = etree.fromstring(body)
+    objects = root.findall('obj')
+    scaled = etree.Element('objects')
+    for i, obj in zip(range(n_features), itertools.cycle(objects)):
+        obj = etree.fromstring(etree.tostring(obj))
+        id = '{}{:06d}'.format(obj.get('id'), i)
+        obj.set('id', id)
+        url = obj.find('url')
+        url.text = re.sub(r'id%3D\d+', 'id%3D' + id, url.text)
+        scaled.append(obj)
+    return etree.tostring(scaled, xml_declaration=True, encoding='UTF-8')
+
+
+class StubServer(stub.StubServer):
+    """A local server answering layer queries and information page requests."""
+
+    def __init__(self):
+        self.layers = {}
+        self.info_pages = load_info_pages()
+        super(StubServer, self).__init__()
+
+    def respond(self, path):
+        url = urlsplit(path)
+        page = url.path.rsplit('/', 1)[-1]
+        if page == 'flashconf.php':
+            return self.layers.get(int(parse_qs(url.query)['layer_id'][0]), EMPTY_LAYER)
+        if page in self.info_pages:
+            pages = self.info_pages[page]
+            # The same ID always gets the same page
+            return pages[zlib.crc32(url.query.encode()) % len(pages)]
+        return None
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmarks for reading and merging the areas of interest of the command line interface."""
+
+import random
+
+import geopandas as gpd
+import pytest
+import shapely.ops
+from shapely.geometry import box
+
+from metsaregister.aoi import read_aoi, union
+
+
+def synthetic_parcels(n, seed=0):
+    """Adjacent and overlapping rectangular parcels in L-EST97 coordinates, with attributes."""
+    rnd = random.Random(seed)
+    side = int(n ** 0.5)
+    parcels = []
+    for i in range(n):
+        x0, y0 = 600000 + (i % side) * 100, 6400000 + (i // side) * 100
+        parcels.append(box(x0, y0, x0 + rnd.uniform(100, 120), y0 + rnd.uniform(100, 120)))
+    return gpd.GeoDataFrame({
+        'tunnus': ['{:05d}:{:03d}:{:04d}'.format(i // 1000, i % 1000, i) for i in range(n)],
+        'nimi': ['Parcel {}'.format(i) for i in range(n)],
+        'pindala': [p.area for p in parcels],
+    }, geometry=parcels, crs='EPSG:3301')
+
+
+@pytest.fixture(scope='module')
+def aoi_path(tmpdir_factory):
+    path = str(tmpdir_factory.mktemp('aoi').join('parcels.gpkg'))
+    synthetic_parcels(20000).to_file(path, driver='GPKG')
+    return path
+
+
+@pytest.mark.slow
+@pytest.mark.benchmark(group='aoi-20k')
+def test_read_aoi_legacy(benchmark, aoi_path):
+    # The former reading of the whole file followed by a union of a list of the geometries. It
+    # used cascaded_union, which is unary_union since Shapely 1.8 and was removed in Shapely 2.
+    def read():
+        gdf = gpd.read_file(aoi_path)
+        return shapely.ops.unary_union(list(gdf.geometry)).wkt
+
+    benchmark.pedantic(read, rounds=3)
+
+
+@pytest.mark.slow
+@pytest.mark.benchmark(group='aoi-20k')
+def test_read_aoi(benchmark, aoi_path):
+    wkt = benchmark.pedantic(read_aoi, args=(aoi_path,), rounds=3)
+    assert shapely.wkt.loads(wkt).area > 0
+
+
+@pytest.mark.slow
+@pytest.mark.benchmark(group='aoi-20k')
+def test_aoi_union(benchmark, aoi_path):
+    # The union alone, most of the time taken by either reader
+    geometries = list(gpd.read_file(aoi_path).geometry)
+    benchmark.pedantic(union, args=(geometries,), rounds=3)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmarks for decoding the WKT geometries of layer query responses."""
+
+import math
+import random
+
+import pandas as pd
+import pytest
+
+from metsaregister.metsaregister import _wkt_to_geometry, wkt_to_geometries
+
+
+def synthetic_wkts(n, seed=0):
+    """Polygons in L-EST97 coordinates, with occasional GeometryCollections and unclosed rings."""
+    rnd = random.Random(seed)
+    wkts = []
+    for i in range(n):
+        x0, y0 = rnd.uniform(370000, 740000), rnd.uniform(6380000, 6640000)
+        n_vertices = rnd.randint(8, 40)
+        ring = []
+        for j in range(n_vertices):
+            angle = 2 * math.pi * j / n_vertices
+            radius = rnd.uniform(50, 150)
+            ring.append('%.3f %.3f' % (x0 + radius * math.cos(angle),
+                                       y0 + radius * math.sin(angle)))
+        if i % 1000 == 1:
+            # Unclosed ring
+            wkts.append('POLYGON ((%s))' % ', '.join(ring))
+            continue
+        polygon = '((%s))' % ', '.join(ring + ring[:1])
+        if i % 100 == 2:
+            wkts.append('GEOMETRYCOLLECTION (POLYGON %s, LINESTRING (%s, %s))'
+                        % (polygon, ring[0], ring[1]))
+        else:
+            wkts.append('POLYGON ' + polygon)
+    return pd.Series(wkts)
+
+
+@pytest.fixture(scope='module')
+def wkts():
+    return synthetic_wkts(100000)
+
+
+@pytest.mark.slow
+@pytest.mark.benchmark(group='wkt-100k')
+def test_wkt_per_row(benchmark, wkts):
+    benchmark.pedantic(lambda: [_wkt_to_geometry(wkt) for wkt in wkts], rounds=3)
+
+
+@pytest.mark.slow
+@pytest.mark.benchmark(group='wkt-100k')
+def test_wkt_vectorized(benchmark, wkts):
+    geometries = benchmark.pedantic(wkt_to_geometries, args=(wkts,), rounds=3)
+    assert len(geometries) == len(wkts)
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks for parsing the information pages recorded in the test cassettes.
+
+The previous BeautifulSoup + ``pandas.read_html`` based parsers are kept here as the baseline.
+Empty table rows are dropped around ``read_html`` so that they behave the same way on recent
+pandas versions.
+"""
+
+import glob
+import os
+import re
+from collections import OrderedDict
+
+import pandas as pd
+import pytest
+import yaml
+from babel.numbers import parse_decimal
+from bs4 import BeautifulSoup
+from six import StringIO
+
+from metsaregister.metsaregister import (parse_forest_notifications, parse_inventory_info,
+                                         species_codes)
+from metsaregister.schema import field
+
+CASSETTES = os.path.join(os.path.dirname(__file__), '..', 'tests', 'cassettes')
+
+
+def load_info_pages():
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(CASSETTES, '*.yaml'))):
+        with open(path) as f:
+            interactions = yaml.safe_load(f)['interactions']
+        for interaction in interactions:
+            url = interaction['request']['uri']
+            if 'info.php' in url or 'info_teatis.php' in url:
+                pages[url] = interaction['response']['body']['string']
+    return sorted(pages.items())
+
+
+def _extract_tables(info):
+    soup = BeautifulSoup(info, "lxml")
+    tables = soup.find_all('table')
+    for th in soup.find_all('th'):
+        if th.get('colspan') == '2':
+            th.extract()
+    for tr in soup.find_all('tr'):
+        if not tr.find(['td', 'th']):
+            tr.extract()
+    for tbl in tables[::-1]:
+        tbl.extract()
+    return tables
+
+
+def _read_html(table, **kwargs):
+    df = pd.read_html(StringIO(str(table)), thousands=' ', decimal=',', **kwargs)[0]
+    # Older pandas versions skipped blank rows
+    return df.dropna(how='all')
+
+
+def legacy_parse_inventory_info(info):
+    tables = _extract_tables(info)
+    if u'Üldised takseerandmed' in info:
+        s = _read_html(tables[0]).set_index(0).iloc[:, 0]
+        s.name = None
+        s.index.name = None
+        s['Täiskirjeldusega'] = False
+        if len(tables) == 1:
+            return s
+        kooslus = _read_html(tables[1], header=0)
+        if len(kooslus) == 0:
+            return s
+        species, age = kooslus['Liik'].map(species_codes), kooslus['A']
+    else:
+        txt = tables[0].text
+        d = OrderedDict()
+        d['Katastritunnus'] = re.search(r'katastritunnus ([^,\s]+)', txt).group(1)
+        d['Eraldise nr.'] = int(re.search(r'eraldis ([^,\s]+)', txt).group(1))
+        m = re.search(r'kvartal ([^,\s]+)', txt)
+        d['Kvartali nr.'] = m.group(1) if m else '-'
+        for l in txt.splitlines():
+            parts = re.sub(r'\s+', ' ', l.strip()).split(': ', 1)
+            if len(parts) != 2:
+                continue
+            key, value = parts[0], parts[1].replace(' ha', '')
+            try:
+                value = float(parse_decimal(value, 'et_ee'))
+            except Exception:
+                pass
+            if 'pindala' in key.lower():
+                key += ' (ha)'
+            d[key] = value
+        s = pd.Series(d)
+        s['Täiskirjeldusega'] = True
+        kooslus = _read_html(tables[2], header=0)
+        kooslus = kooslus.loc[kooslus['Rinne'].str.endswith('Esimene')]
+        species, age = kooslus['Puuliik'].str.lower(), kooslus['Vanus']
+    s['Pealiik'] = species[kooslus['%'].idxmax()]
+    s['Kõrgus'] = (kooslus['H'] * kooslus['%']).sum() / 100
+    s['Vanus'] = (age * kooslus['%']).sum() / 100
+    for idx in kooslus.index:
+        s[species[idx] + ' %'] = kooslus.loc[idx, '%']
+        s[species[idx] + ' H'] = kooslus.loc[idx, 'H']
+        s[species[idx] + ' A'] = age[idx]
+    return s
+
+
+def legacy_parse_forest_notifications(info):
+    tables = _extract_tables(info)
+    general_s = _read_html(tables[0]).set_index(0).iloc[:, 0]
+    for row in tables[1].find_all('tr'):
+        if row.get('class') != ['selected_row'] and not row.find('th'):
+            row.extract()
+    works_s = _read_html(tables[1], header=0, converters={'Kvartal': lambda x: x}).iloc[0]
+    work = works_s['Töö']
+    works_s['Maht (tm)'] = float('nan')
+    works_s['Seemnepuid'] = float('nan')
+    if ' tm' in work:
+        m = re.search(r'(\D+) +(\d+) +tm(?: +\(seemnepuud +(\d+) +tk\))?', work)
+        work_type, amount, seed_trees = m.groups()
+        works_s['Töö'] = work_type
+        works_s['Maht (tm)'] = float(amount)
+        if seed_trees:
+            works_s['Seemnepuid'] = float(seed_trees)
+    works_s = works_s.rename({'Er': 'Eraldis', 'P': 'Pindala (ha)'})
+    return pd.concat([general_s, works_s])
+
+
+PAGES = load_info_pages()
+
+
+def _parse_all(parse_inventory, parse_notifications):
+    return [parse_notifications(info) if 'info_teatis.php' in url else parse_inventory(info)
+            for url, info in PAGES]
+
+
+def _typed(key, value):
+    # The legacy parsers left the numbers on the short inventory pages as strings
+    f = field(key)
+    if isinstance(value, str) and f is not None:
+        return f.convert(value)
+    return value
+
+
+def test_parsers_match_legacy():
+    expected = _parse_all(legacy_parse_inventory_info, legacy_parse_forest_notifications)
+    result = _parse_all(parse_inventory_info, parse_forest_notifications)
+    for e, r in zip(expected, result):
+        assert list(e.index) == list(r.index)
+        for key in e.index:
+            both_missing = pd.isnull(e[key]) and pd.isnull(r[key])
+            assert (_typed(key, e[key]) == r[key]) or both_missing, key
+
+
+@pytest.mark.benchmark(group='info-pages')
+def test_legacy_parsers(benchmark):
+    benchmark(_parse_all, legacy_parse_inventory_info, legacy_parse_forest_notifications)
+
+
+@pytest.mark.benchmark(group='info-pages')
+def test_lxml_parsers(benchmark):
+    benchmark(_parse_all, parse_inventory_info, parse_forest_notifications)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+"""
+End-to-end benchmarks of querying layers, fetching information pages and saving the results,
+replayed from the test cassettes by a local HTTP server.
+
+Every benchmark runs on the recorded responses as they are and on versions of them scaled to
+many more features, the largest of which only with ``--run-slow``. Timings are only comparable on
+the same machine, store a baseline of your own and compare later runs against it with::
+
+    py.test benchmarks --run-slow --benchmark-save=baseline
+    py.test benchmarks --run-slow --benchmark-compare
+
+The comparison is informational, see CONTRIBUTING.rst.
+"""
+
+import pandas as pd
+import pytest
+
+from benchmarks.stub import load_layer_responses, scale_layer_response
+from metsaregister import Client
+from metsaregister.metsaregister import _iter_objects, _objects_to_gdf
+from metsaregister.writers import open_writer
+
+AOI = 'POLYGON ((645000 6484000, 646000 6484000, 646000 6485000, 645000 6485000, 645000 6484000))'
+
+STAND_LAYERS = load_layer_responses('test_forest_stands')
+NOTIFICATION_LAYERS = load_layer_responses('test_forest_notifications')
+
+
+def _chunks(body, chunk_size=2 ** 16):
+    return [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+
+
+def _layer_response(n_features):
+    body = NOTIFICATION_LAYERS[10]
+    return body if n_features is None else scale_layer_response(body, n_features)
+
+
+@pytest.mark.benchmark(group='layer-parse')
+@pytest.mark.parametrize('n_features', [None, 10000, pytest.param(100000, marks=pytest.mark.slow)],
+                         ids=['cassette', '10k', '100k'])
+def test_parse_layer_response(benchmark, n_features):
+    chunks = _chunks(_layer_response(n_features))
+    gdf = benchmark.pedantic(lambda: _objects_to_gdf(list(_iter_objects(chunks))), rounds=3)
+    if n_features:
+        assert gdf.shape[0] == n_features
+
+
+@pytest.mark.benchmark(group='query-layer')
+@pytest.mark.parametrize('n_features', [None, 10000], ids=['cassette', '10k'])
+def test_query_layer(benchmark, stub_server, client, n_features):
+    stub_server.layers[10] = _layer_response(n_features)
+    gdf = benchmark.pedantic(client.query_layer, args=(AOI, 10), rounds=3)
+    if n_features:
+        assert gdf.shape[0] == n_features
+
+
+def _attribute_memory(gdf):
+    """Bytes taken by the index and the attributes, the geometries being the same either way."""
+    return int(gdf.drop(gdf.geometry.name, axis=1).memory_usage(deep=True).sum())
+
+
+@pytest.mark.slow
+@pytest.mark.benchmark(group='query-layer-100k')
+@pytest.mark.parametrize('compact', [False, True], ids=['default', 'compact'])
+def test_query_layer_memory(benchmark, stub_server, client, compact):
+    stub_server.layers[10] = _layer_response(100000)
+    gdf = benchmark.pedantic(client.query_layer, args=(AOI, 10), kwargs=dict(compact=compact),
+                             rounds=1)
+    assert gdf.shape[0] == 100000
+    benchmark.extra_info['attribute_bytes'] = _attribute_memory(gdf)
+    if compact:
+        default = _objects_to_gdf(list(_iter_objects(_chunks(_layer_response(100000)))))
+        assert _attribute_memory(gdf) * 3 < _attribute_memory(default)
+
+
+@pytest.mark.benchmark(group='query-with-info')
+@pytest.mark.parametrize('n_features', [None, pytest.param(2000, marks=pytest.mark.slow)],
+                         ids=['cassette', '2k'])
+def test_query_forest_stands(benchmark, stub_server, client, n_features):
+    for layer_id, body in STAND_LAYERS.items():
+        stub_server.layers[layer_id] = (body if n_features is None or b'<obj ' not in body else
+                                        scale_layer_response(body, n_features))
+    gdf = benchmark.pedantic(client.query_forest_stands, args=(AOI,),
+                             kwargs=dict(concurrency=8), rounds=1)
+    assert 'Pealiik' in gdf.columns
+
+
+@pytest.mark.benchmark(group='query-with-info')
+@pytest.mark.parametrize('n_features', [None, pytest.param(2000, marks=pytest.mark.slow)],
+                         ids=['cassette', '2k'])
+def test_query_forest_notifications(benchmark, stub_server, client, n_features):
+    stub_server.layers[10] = _layer_response(n_features)
+    gdf = benchmark.pedantic(client.query_forest_notifications, args=(AOI,),
+                             kwargs=dict(concurrency=8), rounds=1)
+    if n_features:
+        assert gdf.shape[0] == n_features
+
+
+@pytest.fixture(scope='module')
+def notifications(stub_server):
+    stub_server.layers[10] = _layer_response(None)
+    with Client(base_url=stub_server.url) as client:
+        return client.query_forest_notifications(AOI)
+
+
+@pytest.mark.benchmark(group='geojson-output')
+@pytest.mark.parametrize('n_features', [None, 10000, pytest.param(100000, marks=pytest.mark.slow)],
+                         ids=['cassette', '10k', '100k'])
+def test_write_geojson(benchmark, tmpdir, notifications, n_features):
+    gdf = notifications
+    if n_features:
+        gdf = pd.concat([notifications] * (n_features // len(notifications) + 1)).iloc[:n_features]
+    path = str(tmpdir.join('result.geojson'))
+
+    def write():
+        with open_writer(path) as writer:
+            for start in range(0, len(gdf), 10000):
+                writer.write(gdf.iloc[start:start + 10000])
+
+    benchmark.pedantic(write, rounds=3)
@@ -1,7 +1,75 @@
 """Top-level package for metsaregister-client."""
 
-from .metsaregister import *
+import importlib
+import sys
 
 __author__ = """Martin Valgur"""
 __email__ = 'martin.valgur@gmail.com'
 __version__ = '0.1.0'
+
+# The public names of the package and the submodules they are defined in. The submodules are
+# only imported when one of their names is first accessed, which keeps `import metsaregister`
+# and the command line tool's start-up fast.
+_exports = {
+    'BASE_URL': 'metsaregister',
+    'CRS': 'metsaregister',
+    'Client': 'metsaregister',
+    'DEFAULT_HEADERS': 'metsaregister',
+    'FOREST_NOTIFICATION_LAYERS': 'metsaregister',
+    'FOREST_STAND_LAYERS': 'metsaregister',
+    'RateLimiter': 'metsaregister',
+    'ServerError': 'metsaregister',
+    'configure_catalogue': 'metsaregister',
+    'configure_throttle': 'metsaregister',
+    'default_client': 'metsaregister',
+    'disable_aoi_preprocessing': 'metsaregister',
+    'disable_cache': 'metsaregister',
+    'disable_store': 'metsaregister',
+    'enable_aoi_preprocessing': 'metsaregister',
+    'enable_cache': 'metsaregister',
+    'enable_store': 'metsaregister',
+    'get_info': 'metsaregister',
+    'get_layers': 'metsaregister',
+    'iter_layer': 'metsaregister',
+    'parse_forest_notifications': 'metsaregister',
+    'parse_full_inventory_info': 'metsaregister',
+    'parse_inventory_info': 'metsaregister',
+    'parse_short_inventory_info': 'metsaregister',
+    'query_forest_notifications': 'metsaregister',
+    'query_forest_stands': 'metsaregister',
+    'query_layer': 'metsaregister',
+    'query_layer_tiled': 'metsaregister',
+    'query_layers': 'metsaregister',
+    'session': 'metsaregister',
+    'species_codes': 'metsaregister',
+    'wkt_to_geometries': 'metsaregister',
+    'batch_forest_notifications': 'batch',
+    'batch_forest_stands': 'batch',
+    'sync_forest_notifications': 'sync',
+    'sync_forest_stands': 'sync',
+    'compact_features': 'compact',
+    'feature_urls': 'compact',
+    'read_aoi': 'aoi',
+    'read_aois': 'aoi',
+}
+
+__all__ = sorted(_exports)
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+    module = importlib.import_module('.' + _exports[name], __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_exports))
+
+
+if sys.version_info < (3, 7):
+    # Module-level __getattr__ is not supported, import everything up front
+    for _name in _exports:
+        __getattr__(_name)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+"""
+Deferred imports of the heavy dependencies.
+
+Importing pandas, geopandas and shapely takes a large part of a second, which dominates the run
+time of short command line invocations such as ``metsaregister list``. The modules are instead
+bound to placeholders that import them on first use.
+"""
+
+import importlib
+import types
+
+
+class LazyModule(types.ModuleType):
+    """A placeholder for a module that is imported when one of its attributes is first used."""
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        # Later lookups are served from the placeholder's own namespace
+        self.__dict__.update(module.__dict__)
+        try:
+            return getattr(module, attr)
+        except AttributeError:
+            pass
+        # A submodule that is not imported by its package, e.g. shapely.wkt
+        try:
+            return importlib.import_module(self.__name__ + '.' + attr)
+        except ImportError:
+            raise AttributeError("module '{}' has no attribute '{}'".format(self.__name__, attr))
+
+
+def lazy_import(name):
+    """Return a placeholder for the named module that imports it on first attribute access."""
+    return LazyModule(name)
@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+
+"""
+Asynchronous counterparts of the query functions for use in asyncio applications.
+
+The requests are sent with an ``httpx.AsyncClient`` and the responses are parsed with the same
+parsers as in the synchronous API, in the event loop's default executor so that parsing does not
+block the loop. All requests of a client share a bound on the number of requests in flight and
+go through the same adaptive throttle of the host as the requests of the synchronous API (see
+`metsaregister.configure_throttle`), so that thousands of information pages can be fetched from
+a single task without overloading the server. Cancelling a query cancels all of its outstanding
+requests.
+
+Requires Python 3.6+ and httpx. The response cache and checkpoints of the synchronous API are not
+supported.
+"""
+
+import asyncio
+import functools
+import time
+import weakref
+from collections import OrderedDict
+
+import geopandas as gpd
+import pandas as pd
+import requests
+from lxml import etree
+from six.moves.urllib.parse import urlencode, urljoin
+
+from . import metsaregister as _sync
+from .aoi import AOIPreprocessor
+from .cache import endpoint_of
+from .metsaregister import (CRS, DEFAULT_HEADERS, FOREST_NOTIFICATION_LAYERS,
+                            FOREST_STAND_LAYERS, RateLimiter, _byte_counters, _catalogue,
+                            _clean_info, _forest_notification_record, _inventory_record,
+                            _iter_objects, _merge_info, _objects_to_gdf, _request_stages)
+from .metrics import metrics
+from .records import RecordBuilder
+from .throttle import ServerError, is_retryable, retry_after, throttle_for
+from .transports import to_requests_response, translate_errors
+
+
+def _retry(func=None, max_delay=30, initial_wait=1):
+    """Async version of `metsaregister.throttle.retry`."""
+    if func is None:
+        return functools.partial(_retry, max_delay=max_delay, initial_wait=initial_wait)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.monotonic()
+        wait = initial_wait
+        while True:
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                delay = max(wait, retry_after(e) or 0)
+                if time.monotonic() - start + delay > max_delay:
+                    raise
+                metrics.increment('retries')
+                await asyncio.sleep(delay)
+                wait *= 2
+
+    return wrapper
+
+
+# Time in seconds between checks for a free request slot of a throttle
+_POLL_INTERVAL = 0.01
+
+
+class _Throttled(object):
+    """Async counterpart of `metsaregister.throttle.AdaptiveThrottle.request`."""
+
+    def __init__(self, throttle, kind):
+        self.throttle = throttle
+        self.kind = kind
+        self._start = None
+
+    async def __aenter__(self):
+        delay = self.throttle.try_acquire()
+        while delay is None:
+            await asyncio.sleep(_POLL_INTERVAL)
+            delay = self.throttle.try_acquire()
+        try:
+            if delay > 0:
+                await asyncio.sleep(delay)
+        except BaseException:
+            self.throttle.release(kind=self.kind)
+            raise
+        self._start = time.monotonic()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if exc_val is None:
+            self.throttle.release(latency=time.monotonic() - self._start, kind=self.kind)
+        elif isinstance(exc_val, Exception):
+            self.throttle.release(error=exc_val, kind=self.kind)
+        else:
+            # Cancelled
+            self.throttle.release(kind=self.kind)
+
+
+async def _in_executor(func, *args):
+    """Run a blocking function in the default executor of the running event loop."""
+    return await asyncio.get_event_loop().run_in_executor(None, functools.partial(func, *args))
+
+
+def _parse_layer_response(content, geometry):
+    chunk_size = 2 ** 16
+    chunks = (content[i:i + chunk_size] for i in range(0, len(content), chunk_size))
+    objects = list(_iter_objects(chunks))
+    if not objects:
+        return gpd.GeoDataFrame(crs=CRS)
+    gdf = AOIPreprocessor.filter(_objects_to_gdf(objects), geometry)
+    return gdf if len(gdf) > 0 else gpd.GeoDataFrame(crs=CRS)
+
+
+def _parse_info(parser, info):
+    with metrics.time('html_parse'):
+        return parser(info)
+
+
+async def _gather(coroutines):
+    """Run the coroutines concurrently and return their results in order. If any of them fails
+    or the caller is cancelled, the others are cancelled as well."""
+    tasks = [asyncio.ensure_future(c) for c in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+class AsyncClient(object):
+    """
+    An asynchronous client for the forest registry server.
+
+    Parameters
+    ----------
+    base_url : str, optional
+        URL of the server's public API. Defaults to `metsaregister.BASE_URL`.
+    max_concurrency : int
+        Maximum number of requests in flight at the same time. The adaptive throttling of the
+        host also limits the number of concurrent requests.
+    max_rps : float, optional
+        Maximum number of requests per second of the client, on top of the adaptive throttling.
+    timeout : float or tuple, optional
+        Connect and read timeouts in seconds, either as a single value or a (connect, read)
+        tuple. None waits forever.
+    http2 : bool
+        Use HTTP/2 if the server supports it. Requires the h2 package.
+    headers : dict, optional
+        Additional headers to send with every request.
+    preprocessor : metsaregister.aoi.AOIPreprocessor, optional
+        Simplifies the areas of interest of the layer queries. Defaults to the one set up with
+        `metsaregister.enable_aoi_preprocessing`, if any.
+    """
+
+    def __init__(self, base_url=None, max_concurrency=10, timeout=(10, 120), http2=False,
+                 headers=None, preprocessor=None, max_rps=None):
+        import httpx
+        self._httpx = httpx
+        self._base_url = base_url
+        self.preprocessor = preprocessor
+        self.max_concurrency = max_concurrency
+        self._limiter = RateLimiter(max_rps)
+        if isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        request_headers = dict(DEFAULT_HEADERS)
+        request_headers.update(headers or {})
+        # httpx sets the Content-Type of the form requests and manages the connections itself
+        request_headers.pop('Content-Type', None)
+        request_headers.pop('Connection', None)
+        limits = httpx.Limits(max_connections=max_concurrency,
+                              max_keepalive_connections=max_concurrency)
+        self.client = httpx.AsyncClient(http2=http2, timeout=timeout, limits=limits,
+                                        headers=request_headers)
+        self._semaphore = None
+
+    @property
+    def base_url(self):
+        return self._base_url or _sync.BASE_URL
+
+    async def close(self):
+        """Close the connections of the client."""
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def _request(self, method, url, params=None, data=None, check_bytes=None):
+        """Send a request, raising an error if the response is an error or contains an error
+        message within its first `check_bytes` bytes."""
+        if self._semaphore is None:
+            # Created lazily to bind it to the running event loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        endpoint = endpoint_of(url + '?' + urlencode(params or []))
+        start = time.monotonic()
+        async with self._semaphore:
+            delay = self._limiter.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            async with _Throttled(throttle_for(url), endpoint):
+                metrics.observe('throttle_wait', time.monotonic() - start)
+                metrics.increment('requests')
+                start = time.monotonic()
+                with translate_errors(self._httpx):
+                    r = await self.client.request(method, url, params=params, data=data)
+                metrics.observe(_request_stages[endpoint], time.monotonic() - start)
+                metrics.increment(_byte_counters[endpoint], len(r.content))
+                # Raised within the throttle to slow down on errors
+                if r.status_code >= 400:
+                    raise requests.HTTPError('{} Error for url: {}'.format(r.status_code, r.url),
+                                             response=to_requests_response(r))
+                if b'Error' in r.content[:check_bytes]:
+                    raise ServerError('Server raised an error: ' + r.text[:1000])
+        return r
+
+    async def get_layers(self, refresh=False):
+        """
+        Returns the list of available layers as a dictionary of layer name -> layer ID.
+
+        Shares the layer catalogue of the synchronous API, see
+        `metsaregister.configure_catalogue`. Expired lists are refreshed right away rather than
+        in the background.
+        """
+        layers = None if refresh else _catalogue.cached(self.base_url)
+        if layers is None:
+            layers = await self._fetch_layers()
+            _catalogue.put(self.base_url, layers)
+        return layers
+
+    @_retry
+    async def _fetch_layers(self):
+        r = await self._request('GET', urljoin(self.base_url, 'flashconf.php?in=layers'))
+        root = etree.fromstring(r.content)
+        return OrderedDict((layer.get('name'), int(layer.get('Lid')))
+                           for layer in root.xpath('//layer'))
+
+    async def _resolve_layer(self, layer):
+        if not isinstance(layer, str) or layer.isdigit():
+            return int(layer)
+        layers = await self.get_layers()
+        if layer not in layers:
+            layers = await self.get_layers(refresh=True)
+        if layer not in layers:
+            raise ValueError('Unknown layer: {}. See get_layers() for the available '
+                             'layers.'.format(layer))
+        return layers[layer]
+
+    @_retry
+    async def query_layer(self, aoi, layer_id=10):
+        """
+        Return the features of the given layer that intersect with the given area of interest.
+
+        Parameters
+        ----------
+        aoi : str
+            A WKT string specifying the area of interest.
+        layer_id
+            ID number or name of the layer.
+
+        Returns
+        -------
+        geopandas.GeoDataFrame
+        """
+        layer_id = await self._resolve_layer(layer_id)
+        preprocessor = self.preprocessor or _sync._preprocessor
+        geometry = None
+        if preprocessor is not None:
+            aoi, geometry = preprocessor.prepare(aoi)
+        params = [('in', 'objects'),
+                  ('layer_id', str(layer_id)),
+                  ('operation', 'fw')]
+        data = OrderedDict([('requestArea', aoi.upper()),
+                            ('srs', 'EPSG:3301')])
+        # The server's error messages are short, checking the start of the response suffices
+        r = await self._request('POST', urljoin(self.base_url, 'flashconf.php'), params=params,
+                                data=data, check_bytes=2 ** 16)
+        return await _in_executor(_parse_layer_response, r.content, geometry)
+
+    @_retry
+    async def get_info(self, url):
+        """Fetch the content of a feature's information page."""
+        if 'metsad.ee' not in url:
+            url = urljoin(self.base_url, url)
+        r = await self._request('GET', url)
+        return _clean_info(r.text)
+
+    async def _parsed_info(self, url, parser):
+        info = await self.get_info(url)
+        return await _in_executor(_parse_info, parser, info)
+
+    async def _query_with_info(self, layer_ids, aoi, parser):
+        dfs = await _gather([self.query_layer(aoi, id) for id in layer_ids])
+        df = pd.concat(dfs)
+        if df.shape[0] == 0:
+            return df
+        infos = await _gather([self._parsed_info(url, parser) for url in df['url']])
+        records = RecordBuilder()
+        for id, info in zip(df.index, infos):
+            records.append(id, info)
+        return _merge_info(df, records.build())
+
+    async def query_forest_stands(self, aoi):
+        """Retrieves the forest stands (eraldised) and their information as a GeoDataFrame.
+
+        Parameters
+        ----------
+        aoi : str
+            A WKT string of the area of interest.
+
+        Returns
+        -------
+        geopandas.GeoDataFrame
+        """
+        return await self._query_with_info(FOREST_STAND_LAYERS, aoi, _inventory_record)
+
+    async def query_forest_notifications(self, aoi):
+        """Retrieves the forest notifications (metsateatised) and their information as a
+        GeoDataFrame.
+
+        Parameters
+        ----------
+        aoi : str
+            A WKT string of the area of interest.
+
+        Returns
+        -------
+        geopandas.GeoDataFrame
+        """
+        return await self._query_with_info(FOREST_NOTIFICATION_LAYERS, aoi,
+                                           _forest_notification_record)
+
+
+# The clients of the module-level functions by event loop, as their connections and semaphore
+# are bound to the loop they were created in
+_default_clients = weakref.WeakKeyDictionary()
+
+
+def default_client():
+    """The client shared by the module-level functions in the running event loop, created on
+    first use. Close it with `close_default_client` before closing the loop."""
+    loop = asyncio.get_event_loop()
+    client = _default_clients.get(loop)
+    if client is None:
+        client = _default_clients[loop] = AsyncClient()
+    return client
+
+
+async def close_default_client():
+    """Close the connections of the running event loop's default client, if it has one."""
+    client = _default_clients.pop(asyncio.get_event_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+async def get_layers(refresh=False):
+    """Returns the list of available layers as a dictionary of layer name -> layer ID.
+
+    See `AsyncClient.get_layers`.
+    """
+    return await default_client().get_layers(refresh)
+
+
+async def query_layer(aoi, layer_id=10):
+    """Return the features of the given layer that intersect with the given area of interest.
+
+    See `AsyncClient.query_layer`.
+    """
+    return await default_client().query_layer(aoi, layer_id)
+
+
+async def get_info(url):
+    """Fetch the content of a feature's information page.
+
+    See `AsyncClient.get_info`.
+    """
+    return await default_client().get_info(url)
+
+
+async def query_forest_stands(aoi):
+    """Retrieves the forest stands (eraldised) and their information as a GeoDataFrame.
+
+    See `AsyncClient.query_forest_stands`.
+    """
+    return await default_client().query_forest_stands(aoi)
+
+
+async def query_forest_notifications(aoi):
+    """Retrieves the forest notifications (metsateatised) and their information as a
+    GeoDataFrame.
+
+    See `AsyncClient.query_forest_notifications`.
+    """
+    return await default_client().query_forest_notifications(aoi)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+"""
+Reading and preparing areas of interest for the layer queries.
+
+`read_aoi` and `read_aois` read the areas of interest from vector files. Only the columns needed
+are read, with pyogrio and Arrow when they are installed, the areas are reprojected to the
+L-EST97 coordinate system used by the server and merged with the vectorized union of Shapely 2.
+
+The server parses the WKT of the area of interest sent with every layer query, which for detailed
+boundaries can be megabytes. `AOIPreprocessor` sends a simplified version of the area with its
+coordinates rounded, or just its bounding box, instead. The area sent always contains the original
+one, so the server returns all of the features the original area would have, and the result is
+then filtered down to the features intersecting the original area locally.
+"""
+
+from ._lazy import lazy_import
+from .writers import EPSG
+
+gpd = lazy_import('geopandas')
+np = lazy_import('numpy')
+shapely = lazy_import('shapely')
+
+
+def _read_file(path, columns, bbox=None):
+    """Read the given attribute columns and the geometries of a vector file."""
+    try:
+        import pyogrio
+    except ImportError:
+        return gpd.read_file(path, bbox=bbox)
+    fields = list(pyogrio.read_info(path)['fields'])
+    missing = [column for column in columns if column not in fields]
+    if missing:
+        raise ValueError("no column named '{}' in {}".format(missing[0], path))
+    try:
+        import pyarrow  # noqa: F401
+        use_arrow = True
+    except ImportError:
+        use_arrow = False
+    return pyogrio.read_dataframe(path, columns=list(columns), bbox=bbox, use_arrow=use_arrow)
+
+
+def _to_lest97(gdf):
+    """Reproject the GeoDataFrame to L-EST97 unless it is already in it or has no CRS."""
+    if gdf.crs is None or gdf.crs == 'EPSG:{}'.format(EPSG):
+        return gdf
+    return gdf.to_crs(epsg=EPSG)
+
+
+def union(geometries):
+    """Merge the geometries into one."""
+    geometries = [g for g in geometries if g is not None]
+    if hasattr(shapely, 'union_all'):  # Shapely >= 2.0
+        return shapely.union_all(np.asarray(geometries, dtype=object))
+    return shapely.ops.unary_union(geometries)
+
+
+def read_aoi(path, bbox=None):
+    """
+    Read an area of interest from a vector file, merging all of its features.
+
+    Parameters
+    ----------
+    path : str
+        Path of the vector file. Reprojected to L-EST97 if it is in some other CRS.
+    bbox : tuple of float, optional
+        Only read the features intersecting this (minx, miny, maxx, maxy) bounding box, given in
+        the file's CRS.
+
+    Returns
+    -------
+    str
+        The area of interest as a WKT string.
+    """
+    gdf = _to_lest97(_read_file(path, [], bbox))
+    return union(gdf.geometry).wkt
+
+
+def read_aois(path, id_column=None, bbox=None):
+    """
+    Read several areas of interest from a vector file.
+
+    Parameters
+    ----------
+    path : str
+        Path of the vector file. Reprojected to L-EST97 if it is in some other CRS.
+    id_column : str, optional
+        The attribute identifying the areas of interest. The features with the same ID are
+        merged into a single area. By default each feature is kept as a separate area identified
+        by its position in the file.
+    bbox : tuple of float, optional
+        Only read the features intersecting this (minx, miny, maxx, maxy) bounding box, given in
+        the file's CRS.
+
+    Returns
+    -------
+    list of (str, str)
+        The ID and WKT string of each area of interest, in the order they first appear in the
+        file.
+
+    Raises
+    ------
+    ValueError
+        If the file has no column named `id_column`.
+    """
+    gdf = _read_file(path, [id_column] if id_column is not None else [], bbox)
+    if id_column is not None and id_column not in gdf.columns:
+        raise ValueError("no column named '{}' in {}".format(id_column, path))
+    gdf = _to_lest97(gdf)
+    if id_column is None:
+        return [(str(i), g.wkt) for i, g in enumerate(gdf.geometry)]
+    return [(str(id), union(group.geometry).wkt)
+            for id, group in gdf.groupby(id_column, sort=False)]
+
+
+class AOIPreprocessor(object):
+    """
+    Simplifies the areas of interest sent to the server and filters the results by the original
+    areas.
+
+    Parameters
+    ----------
+    tolerance : float
+        Maximum distance in metres the simplified boundary may deviate from the original one.
+    precision : int
+        Number of decimals the coordinates are rounded to. The coordinates of L-EST97 are in
+        metres.
+    bbox : bool
+        Send the bounding box of the area of interest instead of a simplified version of it.
+    """
+
+    def __init__(self, tolerance=1.0, precision=1, bbox=False):
+        self.tolerance = tolerance
+        self.precision = precision
+        self.bbox = bbox
+
+    def prepare(self, aoi):
+        """
+        Prepare an area of interest for a layer query.
+
+        Parameters
+        ----------
+        aoi : str
+            A WKT string of the area of interest.
+
+        Returns
+        -------
+        request_aoi : str
+            A WKT string of an area containing the area of interest, to send to the server.
+        geometry : shapely.geometry.base.BaseGeometry or None
+            The area of interest to filter the result with, or None if the area of interest is
+            sent as it is.
+        """
+        geometry = shapely.wkt.loads(aoi)
+        if geometry.is_empty or geometry.geom_type not in ('Polygon', 'MultiPolygon'):
+            return aoi, None
+        # Grow the area by the maximum deviation caused by the simplification and rounding, so
+        # that the area sent still covers all of the original one
+        rounding = 10.0 ** -self.precision
+        if self.bbox:
+            minx, miny, maxx, maxy = geometry.bounds
+            request = shapely.geometry.box(minx - rounding, miny - rounding, maxx + rounding,
+                                           maxy + rounding)
+        else:
+            request = geometry.buffer(self.tolerance + rounding, join_style=2).simplify(
+                self.tolerance, preserve_topology=True)
+        request_aoi = shapely.wkt.dumps(request, rounding_precision=self.precision, trim=True)
+        if len(request_aoi) >= len(aoi):
+            return aoi, None
+        if not shapely.prepared.prep(shapely.wkt.loads(request_aoi)).contains(geometry):
+            return aoi, None
+        return request_aoi, geometry
+
+    @staticmethod
+    def filter(gdf, geometry):
+        """Keep the features intersecting the area of interest returned by `prepare`."""
+        if geometry is None or len(gdf) == 0:
+            return gdf
+        return gdf[gdf.intersects(geometry)]
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+"""Querying the forest stands and notifications of many areas of interest at once."""
+
+from collections import OrderedDict
+
+from ._lazy import lazy_import
+from .metsaregister import (FOREST_NOTIFICATION_LAYERS, FOREST_STAND_LAYERS, _merge_info,
+                            _forest_notification_record, _inventory_record, default_client)
+
+pd = lazy_import('pandas')
+
+
+def _batch(layer_ids, aois, parser, wait, concurrency, max_rps, parse_workers, checkpoint,
+           client):
+    client = client or default_client()
+    if hasattr(aois, 'items'):
+        aois = aois.items()
+    parts = OrderedDict((aoi_id, client._query_layers(layer_ids, aoi)) for aoi_id, aoi in aois)
+
+    # Overlapping AOIs share features, fetch the information of each of them only once
+    found = [df for df in parts.values() if df.shape[0] > 0]
+    if not found:
+        return parts
+    features = pd.concat(found)
+    features = features[~features['url'].duplicated()]
+    info_df = client._fetch_info_df(features, parser, wait, concurrency, max_rps, parse_workers,
+                                    checkpoint)
+    info_df.index = list(features['url'])
+
+    results = OrderedDict()
+    for aoi_id, df in parts.items():
+        if df.shape[0] == 0:
+            results[aoi_id] = df
+            continue
+        info = info_df.loc[list(df['url'])]
+        info.index = list(df.index)
+        results[aoi_id] = _merge_info(df, info)
+    return results
+
+
+def batch_forest_stands(aois, wait=None, concurrency=1, max_rps=None, parse_workers=None,
+                        checkpoint=None, client=None):
+    """
+    Retrieve the forest stands and their information for each of several areas of interest.
+
+    The layers are queried separately for each AOI, but the information page of a stand lying
+    in several overlapping AOIs is only fetched once.
+
+    Parameters
+    ----------
+    aois : dict or iterable of (id, str) tuples
+        WKT strings of the areas of interest by their IDs.
+    wait, concurrency, max_rps, parse_workers, checkpoint
+        As in `query_forest_stands`.
+    client : metsaregister.Client, optional
+        The client to query the server with. Defaults to the module's default client.
+
+    Returns
+    -------
+    OrderedDict
+        The forest stands of each AOI as a GeoDataFrame by the AOI's ID.
+    """
+    return _batch(FOREST_STAND_LAYERS, aois, _inventory_record, wait, concurrency, max_rps,
+                  parse_workers, checkpoint, client)
+
+
+def batch_forest_notifications(aois, wait=None, concurrency=1, max_rps=None, parse_workers=None,
+                               checkpoint=None, client=None):
+    """
+    Retrieve the forest notifications and their information for each of several areas of
+    interest.
+
+    The layers are queried separately for each AOI, but the information page of a notification
+    lying in several overlapping AOIs is only fetched once.
+
+    Parameters
+    ----------
+    aois : dict or iterable of (id, str) tuples
+        WKT strings of the areas of interest by their IDs.
+    wait, concurrency, max_rps, parse_workers, checkpoint
+        As in `query_forest_notifications`.
+    client : metsaregister.Client, optional
+        The client to query the server with. Defaults to the module's default client.
+
+    Returns
+    -------
+    OrderedDict
+        The forest notifications of each AOI as a GeoDataFrame by the AOI's ID.
+    """
+    return _batch(FOREST_NOTIFICATION_LAYERS, aois, _forest_notification_record, wait,
+                  concurrency, max_rps, parse_workers, checkpoint, client)
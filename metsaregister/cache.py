@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+"""Persistent on-disk cache for the responses of the forest registry server."""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+DEFAULT_TTL = {
+    'layers': 7 * 24 * 3600,
+    'objects': 24 * 3600,
+    'info': 24 * 3600,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    url TEXT NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored REAL NOT NULL,
+    accessed REAL NOT NULL
+)
+"""
+
+
+def endpoint_of(url):
+    """Classify a request URL as one of the server's endpoints: 'layers', 'objects' or 'info'."""
+    if 'in=layers' in url:
+        return 'layers'
+    if 'in=objects' in url:
+        return 'objects'
+    return 'info'
+
+
+class CachedResponse(object):
+    """A response retrieved from the cache."""
+
+    def __init__(self, body, headers, fresh):
+        self.body = body
+        self.headers = headers
+        self.fresh = fresh
+
+    @property
+    def validators(self):
+        """Request headers for revalidating a stale response with the server."""
+        headers = {}
+        if 'ETag' in self.headers:
+            headers['If-None-Match'] = self.headers['ETag']
+        if 'Last-Modified' in self.headers:
+            headers['If-Modified-Since'] = self.headers['Last-Modified']
+        return headers
+
+
+class ResponseCache(object):
+    """
+    A SQLite-backed HTTP response cache keyed by request URL and body.
+
+    Parameters
+    ----------
+    path : str
+        Directory to store the cache database in. Created if it does not exist.
+    ttl : float or dict, optional
+        Time in seconds a response stays fresh. Either a single value for all endpoints or a
+        dictionary of endpoint ('layers', 'objects', 'info') -> seconds. Stale responses are
+        revalidated with the server if it provided an ETag or Last-Modified header.
+    max_bytes : int, optional
+        Size budget for the stored responses. The least recently used responses are evicted
+        once the budget is exceeded.
+    """
+
+    def __init__(self, path, ttl=None, max_bytes=None):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.path = path
+        self.ttl = dict(DEFAULT_TTL)
+        if isinstance(ttl, dict):
+            self.ttl.update(ttl)
+        elif ttl is not None:
+            self.ttl = {endpoint: ttl for endpoint in self.ttl}
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(path, 'responses.sqlite'),
+                                   check_same_thread=False)
+        self._db.execute(_SCHEMA)
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._db.commit()
+
+    @staticmethod
+    def key(method, url, body=None):
+        h = hashlib.sha1((method.upper() + ' ' + url).encode('utf8'))
+        if body:
+            h.update(b'\n')
+            h.update(body if isinstance(body, bytes) else body.encode('utf8'))
+        return h.hexdigest()
+
+    def get(self, key):
+        """Return the cached response for the key or None if there is none."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT endpoint, headers, body, stored FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            endpoint, headers, body, stored = row
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        fresh = time.time() - stored < self.ttl.get(endpoint, 0)
+        return CachedResponse(zlib.decompress(body), json.loads(headers), fresh)
+
+    def put(self, key, url, body, headers):
+        """Store a response body and its headers."""
+        now = time.time()
+        blob = zlib.compress(body)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint_of(url), url, json.dumps(dict(headers)), sqlite3.Binary(blob),
+                 len(blob), now, now)
+            )
+            self._evict()
+            self._db.commit()
+
+    def touch(self, key):
+        """Mark a stale response as fresh again after the server confirmed it is unchanged."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("UPDATE responses SET stored = ?, accessed = ? WHERE key = ?",
+                             (now, now, key))
+            self._db.commit()
+
+    def size(self):
+        """Total size of the stored responses in bytes."""
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute(
+            "SELECT key, size FROM responses ORDER BY accessed, rowid"
+        ).fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", evicted)
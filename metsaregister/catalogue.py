@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+"""
+The catalogue of the server's layers, for resolving layer names to their IDs.
+
+The list of layers rarely changes, so it is fetched once per process and kept in a JSON file in
+the user's cache directory between runs. A list older than the time-to-live is still used, but a
+fresh one is fetched in the background.
+"""
+
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from six import string_types
+
+DEFAULT_TTL = 7 * 24 * 3600
+
+# Number of servers whose layer lists are kept in the file, the most recently fetched ones
+MAX_ENTRIES = 4
+
+
+def default_path():
+    """The catalogue file in the user's cache directory, $XDG_CACHE_HOME or ~/.cache."""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'),
+                                                                   '.cache')
+    return os.path.join(cache_home, 'metsaregister', 'layers.json')
+
+
+class LayerCatalogue(object):
+    """
+    The layer lists of the servers, by the URL of their API.
+
+    Parameters
+    ----------
+    path : str or False, optional
+        The JSON file to keep the layer lists in between runs. Defaults to `default_path()`.
+        False keeps them in memory only.
+    ttl : float, optional
+        Time in seconds after which a layer list is refreshed. Defaults to a week.
+    """
+
+    def __init__(self, path=None, ttl=None):
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self.configure(path, ttl)
+
+    def configure(self, path=None, ttl=None):
+        """Change the file and time-to-live of the catalogue, forgetting the loaded lists."""
+        with self._lock:
+            self.path = default_path() if path is None else path
+            self.ttl = DEFAULT_TTL if ttl is None else ttl
+            self._entries = None
+
+    def _load(self):
+        # Called with the lock held
+        if self._entries is not None:
+            return
+        self._entries = {}
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with io.open(self.path, encoding='utf8') as f:
+                entries = json.load(f, object_pairs_hook=OrderedDict)
+        except (IOError, OSError, ValueError):
+            return
+        for base_url, entry in entries.items():
+            self._entries[base_url] = (entry['stored'], OrderedDict(entry['layers']))
+
+    def _save(self):
+        # Called with the lock held
+        if not self.path:
+            return
+        now = time.time()
+        fresh = sorted(((stored, base_url, layers)
+                        for base_url, (stored, layers) in self._entries.items()
+                        if now - stored < self.ttl), reverse=True)[:MAX_ENTRIES]
+        entries = OrderedDict(
+            (base_url, OrderedDict([('stored', stored), ('layers', list(layers.items()))]))
+            for stored, base_url, layers in sorted(fresh, key=lambda entry: entry[1])
+        )
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        try:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            with io.open(tmp_path, 'w', encoding='utf8') as f:
+                f.write(json.dumps(entries, ensure_ascii=False))
+            getattr(os, 'replace', os.rename)(tmp_path, self.path)
+        except (IOError, OSError):
+            # Not being able to persist the catalogue only costs a request in the next run
+            pass
+
+    def _update(self, base_url, fetch):
+        layers = fetch()
+        self.put(base_url, layers)
+        return layers
+
+    def put(self, base_url, layers):
+        """Store the layers of a server fetched by the caller."""
+        with self._lock:
+            self._load()
+            self._entries[base_url] = (time.time(), OrderedDict(layers))
+            self._save()
+
+    def cached(self, base_url):
+        """Return the layers of a server if they are in the catalogue and have not expired,
+        otherwise None."""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(base_url)
+        if entry is None or time.time() - entry[0] >= self.ttl:
+            return None
+        return OrderedDict(entry[1])
+
+    def _refresh_in_background(self, base_url, fetch):
+        with self._lock:
+            if base_url in self._refreshing:
+                return
+            self._refreshing.add(base_url)
+
+        def refresh():
+            try:
+                self._update(base_url, fetch)
+            except Exception:
+                # Keep using the stale list
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard(base_url)
+
+        thread = threading.Thread(target=refresh)
+        thread.daemon = True
+        thread.start()
+
+    def get(self, base_url, fetch, refresh=False):
+        """
+        Return the layers of a server as a dictionary of layer name -> layer ID.
+
+        Parameters
+        ----------
+        base_url : str
+            URL of the server's API.
+        fetch : callable
+            Function fetching the server's list of layers, if it is not in the catalogue yet or
+            has expired.
+        refresh : bool
+            Fetch the list of layers even if it is in the catalogue.
+
+        Returns
+        -------
+        OrderedDict
+        """
+        with self._lock:
+            self._load()
+            entry = self._entries.get(base_url)
+        if entry is None or refresh:
+            return OrderedDict(self._update(base_url, fetch))
+        stored, layers = entry
+        if time.time() - stored >= self.ttl:
+            self._refresh_in_background(base_url, fetch)
+        return OrderedDict(layers)
+
+    def resolve(self, base_url, fetch, layer):
+        """
+        Return the ID of a layer given by its ID or name.
+
+        Raises
+        ------
+        ValueError
+            If there is no layer of that name.
+        """
+        if not isinstance(layer, string_types) or layer.isdigit():
+            return int(layer)
+        layers = self.get(base_url, fetch)
+        if layer not in layers:
+            # The layer may have been added since the catalogue was last refreshed
+            layers = self.get(base_url, fetch, refresh=True)
+        if layer not in layers:
+            raise ValueError('Unknown layer: {}. See get_layers() for the available '
+                             'layers.'.format(layer))
+        return layers[layer]
+
+    def clear(self):
+        """Forget all layer lists, also removing the catalogue file."""
+        with self._lock:
+            self._entries = {}
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+"""Append-only checkpoint files for resuming interrupted information page scraping jobs."""
+
+import io
+import json
+import os
+from collections import OrderedDict
+
+from .records import json_default
+
+
+class Checkpoint(object):
+    """
+    A JSON Lines file of parsed information records, one feature per line.
+
+    The records already in the file are loaded on creation and new records are appended and
+    flushed to disk as soon as they are added, so that the progress survives crashes. A last line
+    left incomplete by a crash is discarded.
+
+    Parameters
+    ----------
+    path : str
+        Path of the checkpoint file. Created if it does not exist.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = OrderedDict()
+        self._load()
+        self._file = io.open(path, 'a', encoding='utf8')
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        offset = 0
+        with io.open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line.decode('utf8'), object_pairs_hook=OrderedDict)
+                except ValueError:
+                    break
+                self.records[record['id']] = record['info']
+                offset += len(line)
+        if offset < os.path.getsize(self.path):
+            with io.open(self.path, 'r+b') as f:
+                f.truncate(offset)
+
+    def __contains__(self, id):
+        return id in self.records
+
+    def __getitem__(self, id):
+        return self.records[id]
+
+    def __setitem__(self, id, info):
+        record = OrderedDict([('id', id), ('info', OrderedDict(info.items()))])
+        line = json.dumps(record, default=json_default, ensure_ascii=False)
+        self._file.write(u'{}\n'.format(line))
+        self._file.flush()
+        self.records[id] = info
+
+    def close(self):
+        self._file.close()
@@ -4,24 +4,145 @@
 
 from __future__ import print_function
 
+import io
+import json
+import os
+
 import click
-import geopandas as gpd
-from shapely.ops import cascaded_union
 
 import metsaregister
+from metsaregister._lazy import lazy_import
+from metsaregister.aoi import read_aoi, read_aois
+from metsaregister.metrics import metrics
+from metsaregister.writers import EXTENSIONS, FORMATS, open_writer
+
+# Only loaded by the commands that need them, to keep the start-up fast
+gpd = lazy_import('geopandas')
+pd = lazy_import('pandas')
 
 
 def _read_aoi(aoi_path):
-    gdf = gpd.read_file(aoi_path)
-    return cascaded_union(list(gdf.geometry)).wkt
+    return read_aoi(aoi_path)
+
+
+def _read_aois(aoi_path, id_column):
+    try:
+        return read_aois(aoi_path, id_column)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='ID_COLUMN')
+
+
+def _resolve_layer(layer, param_hint):
+    try:
+        return metsaregister.default_client()._resolve_layer(layer)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint=param_hint)
+
+
+def _save(gdf, out_path, out_format):
+    with open_writer(out_path, out_format) as writer:
+        writer.write(gdf)
+
+
+def _checkpoint_path(out_path, resume):
+    path = out_path + '.checkpoint.jsonl'
+    if not resume and os.path.exists(path):
+        os.remove(path)
+    return path
+
+
+def _enable_cache(ctx, param, value):
+    if value is not None:
+        metsaregister.enable_cache(value)
+    return value
+
+
+cache_option = click.option(
+    '--cache-dir', type=click.Path(file_okay=False), default=None, expose_value=False,
+    callback=_enable_cache,
+    help="Cache the server's responses in this directory and reuse them on later runs."
+)
+
+
+def _enable_store(ctx, param, value):
+    if value is not None:
+        metsaregister.enable_store(value)
+    return value
+
+
+store_option = click.option(
+    '--store-dir', type=click.Path(file_okay=False), default=None, expose_value=False,
+    callback=_enable_store,
+    help="Store the queried features in this directory and answer later queries of areas that "
+         "have already been covered from it."
+)
+
+
+def _enable_aoi_preprocessing(ctx, param, value):
+    if value is None:
+        return value
+    if value == 'bbox':
+        metsaregister.enable_aoi_preprocessing(bbox=True)
+        return value
+    try:
+        tolerance = float(value)
+    except ValueError:
+        raise click.BadParameter("must be a tolerance in metres or 'bbox'")
+    metsaregister.enable_aoi_preprocessing(tolerance)
+    return value
+
+
+simplify_option = click.option(
+    '--simplify-aoi', metavar='TOLERANCE|bbox', default=None, expose_value=False,
+    callback=_enable_aoi_preprocessing,
+    help="Send the AOI to the server simplified within this tolerance in metres, or as its "
+         "bounding box with 'bbox', and filter the features by the exact AOI locally. Makes the "
+         "requests of detailed AOIs smaller without changing the result."
+)
+
+
+format_option = click.option(
+    '--format', 'out_format', type=click.Choice(FORMATS), default=None,
+    help="Output file format. Guessed from the extension of OUT_PATH by default, falling back to "
+         "GeoJSON."
+)
+
+
+def _print_stats(ctx, param, value):
+    if value:
+        metrics.reset()
+        ctx.call_on_close(lambda: click.echo(metrics.format_table(), err=True))
+    return value
 
 
-def _add_crs(json):
-    return json.replace(
-        '{',
-        '{\n"crs": { "type": "name", "properties": { "name": "urn:ogc:def:crs:EPSG::3301" } }, ',
-        1
-    )
+def _save_metrics(ctx, param, value):
+    def save():
+        if os.path.splitext(value)[1].lower() in ('.prom', '.txt'):
+            text = metrics.to_prometheus()
+        else:
+            text = metrics.to_json()
+        with io.open(value, 'w', encoding='utf8') as f:
+            f.write(text)
+
+    if value is not None:
+        metrics.reset()
+        ctx.call_on_close(save)
+    return value
+
+
+stats_option = click.option(
+    '--stats', is_flag=True, expose_value=False, callback=_print_stats,
+    help="Print a breakdown of the time spent in each stage, the bytes received, retries and "
+         "cache hits to stderr when done."
+)
+
+
+metrics_option = click.option(
+    '--metrics-path', type=click.Path(dir_okay=False), default=None, expose_value=False,
+    callback=_save_metrics,
+    help="Save the timings and counters to this file, in the Prometheus text format if its "
+         "extension is .prom or .txt and as JSON otherwise."
+)
 
 
 @click.group()
@@ -30,6 +151,9 @@ def cli():
 
 
 @cli.command(name="list", help="List available layers and their IDs")
+@cache_option
+@stats_option
+@metrics_option
 def list_layers():
     layers = metsaregister.get_layers()
     for name, id in layers.items():
@@ -38,53 +162,259 @@ def list_layers():
 
 @cli.command(help="""Get any layer's features intersecting with a given AOI.
 
-Takes a vector file containing the area of interest as input. Must be in L-EST97 CRS.
+Takes a vector file containing the area of interest as input, reprojected to L-EST97 if it is in
+another CRS.
+
+The layer can be given by its ID or name. For a list of available layers and their IDs see the
+'list' command.
+
+The result is saved as a GeoJSON, GeoParquet, FlatGeobuf or GeoPackage file.""")
+@click.argument('aoi', type=str)
+@click.argument('layer_id', type=str)
+@click.argument('out_path', type=str)
+@click.option('--tile-size', default=None, type=float,
+              help="Query the AOI as a grid of tiles of this size in metres. Tiles with too many "
+                   "features or failing queries are subdivided further.")
+@click.option('--concurrency', default=4, type=int,
+              help="Number of tiles to query in parallel when using --tile-size. Defaults to 4.")
+@format_option
+@cache_option
+@store_option
+@simplify_option
+@stats_option
+@metrics_option
+def get_layer(aoi, layer_id, out_path, tile_size, concurrency, out_format):
+    aoi = _read_aoi(aoi)
+    layer_id = _resolve_layer(layer_id, 'LAYER_ID')
+    if tile_size:
+        chunks = [metsaregister.query_layer_tiled(aoi, layer_id, tile_size,
+                                                  concurrency=concurrency)]
+    else:
+        chunks = metsaregister.iter_layer(aoi, layer_id)
+    with open_writer(out_path, out_format) as writer:
+        for gdf in chunks:
+            writer.write(gdf)
+
+
+@cli.command(help="""Get the features of several layers intersecting with a given AOI.
+
+Takes a vector file containing the area of interest as input, reprojected to L-EST97 if it is in
+another CRS. The layers can be given by their IDs or names and are queried in parallel.
 
 For a list of available layers and their IDs see the 'list' command.
 
-The result is saved as a GeoJSON file.""")
+The features of all layers are saved to a single GeoJSON, GeoParquet, FlatGeobuf or GeoPackage
+file with the layer's ID in a 'layer_id' column, or with --split to a separate file for each
+layer in the OUT_PATH directory.""")
 @click.argument('aoi', type=str)
-@click.argument('layer_id', type=int)
 @click.argument('out_path', type=str)
-def get_layer(aoi, layer_id, out_path):
+@click.argument('layers', type=str, nargs=-1, required=True)
+@click.option('--split', is_flag=True,
+              help="Save the features of each layer to a separate file in the OUT_PATH "
+                   "directory.")
+@click.option('--concurrency', default=None, type=int,
+              help="Number of layers to query in parallel. All of them by default.")
+@format_option
+@cache_option
+@store_option
+@simplify_option
+@stats_option
+@metrics_option
+def get_layers(aoi, out_path, layers, split, concurrency, out_format):
     aoi = _read_aoi(aoi)
-    gdf = metsaregister.query_layer(aoi, layer_id)
-    with open(out_path, 'w', encoding='utf8') as f:
-        f.write(_add_crs(gdf.to_json()))
+    layers = [_resolve_layer(layer, 'LAYERS') for layer in layers]
+    results = metsaregister.query_layers(aoi, layers, concurrency, split)
+    if split:
+        if not os.path.isdir(out_path):
+            os.makedirs(out_path)
+        extension = EXTENSIONS[out_format or 'geojson']
+        for layer_id, gdf in results.items():
+            _save(gdf, os.path.join(out_path, str(layer_id) + extension), out_format)
+    else:
+        _save(results, out_path, out_format)
 
 
 @cli.command(help="""Fetch and save forest stands' information for a given AOI.
 
-Takes a vector file containing the area of interest as input. Must be in L-EST97 CRS.
+Takes a vector file containing the area of interest as input, reprojected to L-EST97 if it is in
+another CRS.
 
-The result is saved as a GeoJSON file.""")
+The result is saved as a GeoJSON, GeoParquet, FlatGeobuf or GeoPackage file.""")
 @click.argument('aoi', type=str)
 @click.argument('out_path', type=str)
-@click.option('--wait', default=0.5, type=float,
-              help="Time to wait in seconds between querying each stand's information "
-                   "to not overload the server. Defaults to 0.5 s.")
-def forest_stands(aoi, out_path, wait):
+@click.option('--wait', default=None, type=float,
+              help="Fixed time to wait in seconds between querying each feature's information. "
+                   "By default the request rate is adapted to the server's response times and "
+                   "errors.")
+@click.option('--concurrency', default=4, type=int,
+              help="Number of information pages to fetch in parallel. Defaults to 4. The adaptive "
+                   "throttling also limits the number of concurrent requests to the server.")
+@click.option('--max-rps', default=None, type=float,
+              help="Maximum number of information page requests per second across all parallel "
+                   "fetches. Overrides --wait.")
+@click.option('--parse-workers', default=None, type=int,
+              help="Number of processes to parse the information pages in while fetching "
+                   "continues. By default the pages are parsed as they are fetched.")
+@click.option('--resume', is_flag=True,
+              help="Continue an interrupted run from the checkpoint file kept next to OUT_PATH "
+                   "instead of starting over.")
+@format_option
+@cache_option
+@store_option
+@simplify_option
+@stats_option
+@metrics_option
+def forest_stands(aoi, out_path, wait, concurrency, max_rps, parse_workers, resume, out_format):
     aoi = _read_aoi(aoi)
-    gdf = metsaregister.query_forest_stands(aoi, wait)
-    with open(out_path, 'w', encoding='utf8') as f:
-        f.write(_add_crs(gdf.to_json()))
+    checkpoint = _checkpoint_path(out_path, resume)
+    gdf = metsaregister.query_forest_stands(aoi, wait, concurrency, max_rps, parse_workers,
+                                            checkpoint)
+    _save(gdf, out_path, out_format)
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
 
 
 @cli.command(help="""Fetch and save forest notifications' information for a given AOI.
 
-Takes a vector file containing the area of interest as input. Must be in L-EST97 CRS.
+Takes a vector file containing the area of interest as input, reprojected to L-EST97 if it is in
+another CRS.
 
-The result is saved as a GeoJSON file.""")
+The result is saved as a GeoJSON, GeoParquet, FlatGeobuf or GeoPackage file.""")
 @click.argument('aoi', type=str)
 @click.argument('out_path', type=str)
-@click.option('--wait', default=0.5, type=float,
-              help="Time to wait in seconds between querying each stand's information "
-                   "to not overload the server. Defaults to 0.5 s.")
-def forest_notifications(aoi, out_path, wait):
+@click.option('--wait', default=None, type=float,
+              help="Fixed time to wait in seconds between querying each feature's information. "
+                   "By default the request rate is adapted to the server's response times and "
+                   "errors.")
+@click.option('--concurrency', default=4, type=int,
+              help="Number of information pages to fetch in parallel. Defaults to 4. The adaptive "
+                   "throttling also limits the number of concurrent requests to the server.")
+@click.option('--max-rps', default=None, type=float,
+              help="Maximum number of information page requests per second across all parallel "
+                   "fetches. Overrides --wait.")
+@click.option('--parse-workers', default=None, type=int,
+              help="Number of processes to parse the information pages in while fetching "
+                   "continues. By default the pages are parsed as they are fetched.")
+@click.option('--resume', is_flag=True,
+              help="Continue an interrupted run from the checkpoint file kept next to OUT_PATH "
+                   "instead of starting over.")
+@format_option
+@cache_option
+@store_option
+@simplify_option
+@stats_option
+@metrics_option
+def forest_notifications(aoi, out_path, wait, concurrency, max_rps, parse_workers, resume,
+                         out_format):
     aoi = _read_aoi(aoi)
-    gdf = metsaregister.query_forest_notifications(aoi, wait)
-    with open(out_path, 'w', encoding='utf8') as f:
-        f.write(_add_crs(gdf.to_json()))
+    checkpoint = _checkpoint_path(out_path, resume)
+    gdf = metsaregister.query_forest_notifications(aoi, wait, concurrency, max_rps,
+                                                   parse_workers, checkpoint)
+    _save(gdf, out_path, out_format)
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+
+@cli.command(help="""Update a previously saved forest_stands or forest_notifications result.
+
+Queries the AOI again and only fetches the information of the features that are new or whose
+geometry has changed since the PREVIOUS file was saved. PREVIOUS can be the same as OUT_PATH.
+
+Prints the number of added, removed and modified features.""")
+@click.argument('dataset', type=click.Choice(['forest_stands', 'forest_notifications']))
+@click.argument('aoi', type=str)
+@click.argument('previous', type=click.Path(exists=True, dir_okay=False))
+@click.argument('out_path', type=str)
+@click.option('--diff-path', default=None, type=str,
+              help="Save the IDs of the added, removed and modified features to this JSON file.")
+@click.option('--wait', default=None, type=float,
+              help="Fixed time to wait in seconds between querying each feature's information. "
+                   "By default the request rate is adapted to the server's response times and "
+                   "errors.")
+@click.option('--concurrency', default=4, type=int,
+              help="Number of information pages to fetch in parallel. Defaults to 4. The adaptive "
+                   "throttling also limits the number of concurrent requests to the server.")
+@click.option('--max-rps', default=None, type=float,
+              help="Maximum number of information page requests per second across all parallel "
+                   "fetches. Overrides --wait.")
+@click.option('--parse-workers', default=None, type=int,
+              help="Number of processes to parse the information pages in while fetching "
+                   "continues. By default the pages are parsed as they are fetched.")
+@format_option
+@cache_option
+@store_option
+@simplify_option
+@stats_option
+@metrics_option
+def sync(dataset, aoi, previous, out_path, diff_path, wait, concurrency, max_rps, parse_workers,
+         out_format):
+    aoi = _read_aoi(aoi)
+    sync_func = getattr(metsaregister, 'sync_' + dataset)
+    gdf, changes = sync_func(previous, aoi, wait, concurrency, max_rps, parse_workers)
+    _save(gdf, out_path, out_format)
+    if diff_path:
+        with open(diff_path, 'w', encoding='utf8') as f:
+            json.dump(changes, f, indent=2)
+    for change, ids in changes.items():
+        print(change, len(ids), sep='\t')
+
+
+@cli.command(help="""Fetch and save the forest stands or notifications of many AOIs at once.
+
+Takes a vector file containing the areas of interest as input, identified by the values of its
+ID_COLUMN attribute. Features with the same ID are merged into a single AOI. Reprojected to
+L-EST97 if it is in another CRS. The information of features shared by overlapping AOIs is only
+fetched once.
+
+The results of all AOIs are saved to OUT_PATH with the AOI's ID in an 'aoi_id' column. With
+--split, OUT_PATH is a directory that each AOI's result is saved to as a separate file named after
+its ID.""")
+@click.argument('dataset', type=click.Choice(['forest_stands', 'forest_notifications']))
+@click.argument('aois', type=str)
+@click.argument('id_column', type=str)
+@click.argument('out_path', type=str)
+@click.option('--split', is_flag=True,
+              help="Save the result of each AOI to a separate file in the OUT_PATH directory.")
+@click.option('--wait', default=None, type=float,
+              help="Fixed time to wait in seconds between querying each feature's information. "
+                   "By default the request rate is adapted to the server's response times and "
+                   "errors.")
+@click.option('--concurrency', default=4, type=int,
+              help="Number of information pages to fetch in parallel. Defaults to 4. The adaptive "
+                   "throttling also limits the number of concurrent requests to the server.")
+@click.option('--max-rps', default=None, type=float,
+              help="Maximum number of information page requests per second across all parallel "
+                   "fetches. Overrides --wait.")
+@click.option('--parse-workers', default=None, type=int,
+              help="Number of processes to parse the information pages in while fetching "
+                   "continues. By default the pages are parsed as they are fetched.")
+@click.option('--resume', is_flag=True,
+              help="Continue an interrupted run from the checkpoint file kept next to OUT_PATH "
+                   "instead of starting over.")
+@format_option
+@cache_option
+@store_option
+@simplify_option
+@stats_option
+@metrics_option
+def batch(dataset, aois, id_column, out_path, split, wait, concurrency, max_rps, parse_workers,
+          resume, out_format):
+    aois = _read_aois(aois, id_column)
+    batch_func = getattr(metsaregister, 'batch_' + dataset)
+    checkpoint = _checkpoint_path(out_path.rstrip('/\\'), resume)
+    results = batch_func(aois, wait, concurrency, max_rps, parse_workers, checkpoint)
+    if split:
+        if not os.path.isdir(out_path):
+            os.makedirs(out_path)
+        extension = EXTENSIONS[out_format or 'geojson']
+        for aoi_id, gdf in results.items():
+            _save(gdf, os.path.join(out_path, aoi_id + extension), out_format)
+    else:
+        tagged = [gdf.assign(aoi_id=aoi_id) for aoi_id, gdf in results.items() if gdf.shape[0]]
+        gdf = pd.concat(tagged) if tagged else gpd.GeoDataFrame()
+        _save(gdf, out_path, out_format)
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
 
 
 if __name__ == "__main__":
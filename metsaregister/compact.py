@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""
+A compact in-memory representation of layer query results.
+
+By default every attribute of a feature is kept as a Python string in an object column. A compact
+result instead has integer feature IDs, its attributes with few distinct values as categoricals
+and the other strings as Arrow strings if pyarrow is installed. The 'url' column, which usually
+just repeats the feature ID after a fixed prefix, is dropped and its template kept in the
+GeoDataFrame's ``attrs`` instead. Use `feature_urls` to get the URLs of a result of either kind.
+"""
+
+import re
+
+from ._lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+# Columns with at most this share of distinct values are stored as categoricals
+CATEGORICAL_RATIO = 0.5
+
+# IDs with more digits may not fit into a 64-bit integer
+_int_id_re = re.compile(r'^\d{1,18}$')
+
+
+def _string_dtype():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return None
+    return pd.StringDtype('pyarrow')
+
+
+def _is_text(dtype):
+    """Whether the dtype is that of Python strings, or the default string dtype of pandas 3."""
+    return dtype == object or isinstance(dtype, pd.StringDtype)
+
+
+def _url_template(urls, ids):
+    """The template the URLs are made of the IDs with, or None if there is no single one."""
+    if len(urls) == 0 or urls.isnull().any():
+        return None
+    first_url, first_id = urls.iloc[0], str(ids[0])
+    if not first_url.endswith(first_id):
+        return None
+    prefix = first_url[:-len(first_id)]
+    if not (urls.values == (prefix + ids.astype(str)).values).all():
+        return None
+    return prefix.replace('{', '{{').replace('}', '}}') + '{}'
+
+
+def compact_features(gdf):
+    """
+    Convert a layer query result to the compact representation.
+
+    Parameters
+    ----------
+    gdf : geopandas.GeoDataFrame
+        A layer query result, compact or not.
+
+    Returns
+    -------
+    geopandas.GeoDataFrame
+    """
+    if len(gdf) == 0:
+        return gdf
+    gdf = gdf.copy(deep=False)
+    index = gdf.index
+    if _is_text(index.dtype) and index.astype(str).str.match(_int_id_re).all():
+        gdf.index = index.astype('int64').rename(index.name)
+    if 'url' in gdf.columns:
+        gdf.attrs.pop('url', None)
+        template = _url_template(gdf['url'], gdf.index)
+        if template is not None:
+            gdf = gdf.drop('url', axis=1)
+            gdf.attrs['url'] = template
+    string_dtype = _string_dtype()
+    for column in gdf.columns:
+        values = gdf[column]
+        # Categoricals concatenated with different categories become objects and are converted
+        # again here
+        if column == gdf.geometry.name or not _is_text(values.dtype):
+            continue
+        if values.nunique() <= CATEGORICAL_RATIO * len(values):
+            gdf[column] = values.astype('category')
+        elif (string_dtype is not None and values.dtype == object and
+              pd.api.types.infer_dtype(values) == 'string'):
+            gdf[column] = values.astype(string_dtype)
+    return gdf
+
+
+def concat_features(gdfs):
+    """Concatenate compact layer query results into one."""
+    templates = set(gdf.attrs.get('url') for gdf in gdfs)
+    if len(templates) > 1:
+        # The URLs of the results cannot be made of a single template
+        gdfs = [gdf if 'url' in gdf.columns else gdf.assign(url=feature_urls(gdf))
+                for gdf in gdfs]
+    gdf = pd.concat(gdfs)
+    if 'url' not in gdf.columns:
+        gdf.attrs['url'] = templates.pop()
+    return compact_features(gdf)
+
+
+def feature_urls(gdf):
+    """
+    The information page URLs of the features of a layer query result, compact or not.
+
+    Returns
+    -------
+    pandas.Series
+    """
+    if 'url' in gdf.columns or 'url' not in gdf.attrs:
+        return gdf['url']
+    template = gdf.attrs['url']
+    return pd.Series([template.format(id) for id in gdf.index], index=gdf.index, dtype=object)
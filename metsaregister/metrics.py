@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+"""
+Timing and counting of the stages of the queries.
+
+The global `metrics` registry records a latency histogram for each of the stages in `STAGES` and
+counters of the bytes received, requests, retries and cache hits. The recorded values can be
+exported in the Prometheus text format or as a JSON summary, and forwarded to OpenTelemetry as
+they are recorded with `OpenTelemetryExporter`.
+
+Information pages parsed in a separate process pool (``parse_workers``) are not timed.
+"""
+
+import functools
+import json
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    from time import monotonic
+except ImportError:  # Python 2
+    from time import time as monotonic
+
+STAGES = OrderedDict([
+    ('layer_list_request', 'Fetching the list of layers'),
+    ('layer_request', 'Layer query requests, including the download of the response'),
+    ('xml_parse', 'Parsing the features from layer query responses'),
+    ('wkt_decode', 'Decoding the WKT geometries of the features'),
+    ('info_request', 'Information page requests'),
+    ('throttle_wait', 'Waiting for the rate limits and the adaptive throttling'),
+    ('html_parse', 'Parsing the information pages'),
+    ('merge', 'Joining the information to the features'),
+    ('write', 'Writing the output file'),
+])
+
+COUNTERS = OrderedDict([
+    ('requests', 'Requests sent to the server'),
+    ('layer_bytes', 'Bytes of layer query responses received'),
+    ('info_bytes', 'Bytes of information pages received'),
+    ('retries', 'Failed requests that were retried'),
+    ('cache_hits', 'Responses served from the response cache'),
+    ('cache_misses', 'Requests not answered by the response cache'),
+    ('store_hits', 'Layer queries answered from the local feature store'),
+    ('store_misses', 'Layer queries that needed the server despite the local feature store'),
+])
+
+# Upper bounds of the histogram buckets in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class Histogram(object):
+    """Counts of observed durations in cumulative buckets, along with their sum and maximum."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative_counts(self):
+        """The number of observations in each bucket and below, the last one being +Inf."""
+        total = 0
+        result = []
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+
+class Metrics(object):
+    """
+    A thread-safe registry of stage duration histograms and counters.
+
+    Listeners added with `add_listener` get every recorded value through their ``observe(stage,
+    seconds)`` and ``increment(name, value)`` methods.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.reset()
+
+    def reset(self):
+        """Forget all recorded values."""
+        with self._lock:
+            self.histograms = OrderedDict()
+            self.counters = OrderedDict((name, 0) for name in COUNTERS)
+            self._started = monotonic()
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def observe(self, stage, seconds):
+        """Record a duration of the given stage."""
+        with self._lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = Histogram(self.buckets)
+            self.histograms[stage].observe(seconds)
+        for listener in self._listeners:
+            listener.observe(stage, seconds)
+
+    def increment(self, name, value=1):
+        """Add to a counter."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        for listener in self._listeners:
+            listener.increment(name, value)
+
+    @contextmanager
+    def time(self, stage):
+        """Context manager recording the duration of its block as a duration of the stage."""
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.observe(stage, monotonic() - start)
+
+    def timed(self, stage):
+        """Decorator recording the durations of a function's calls as durations of the stage."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self):
+        """
+        The recorded values as a dictionary of plain values.
+
+        Returns
+        -------
+        OrderedDict
+            The 'elapsed' wall time since the last reset, the 'count', 'total', 'mean' and
+            'max' duration of each stage in 'stages', the 'counters' and the 'cache_hit_rate'.
+        """
+        with self._lock:
+            stages = OrderedDict()
+            for stage in _ordered(self.histograms, STAGES):
+                h = self.histograms[stage]
+                stages[stage] = OrderedDict([
+                    ('count', h.count),
+                    ('total', h.sum),
+                    ('mean', h.sum / h.count),
+                    ('max', h.max),
+                ])
+            counters = OrderedDict(self.counters)
+            elapsed = monotonic() - self._started
+        lookups = counters.get('cache_hits', 0) + counters.get('cache_misses', 0)
+        result = OrderedDict()
+        result['elapsed'] = elapsed
+        result['stages'] = stages
+        result['counters'] = counters
+        result['cache_hit_rate'] = (counters.get('cache_hits', 0) / float(lookups) if lookups else
+                                    None)
+        return result
+
+    def to_json(self, indent=2):
+        """The `summary` as a JSON string."""
+        return json.dumps(self.summary(), indent=indent)
+
+    def to_prometheus(self, prefix='metsaregister'):
+        """The recorded values in the Prometheus text exposition format."""
+        lines = []
+        name = prefix + '_stage_duration_seconds'
+        lines.append('# HELP {} Time spent in each stage of the queries.'.format(name))
+        lines.append('# TYPE {} histogram'.format(name))
+        with self._lock:
+            for stage in _ordered(self.histograms, STAGES):
+                h = self.histograms[stage]
+                bounds = [_format_float(b) for b in h.buckets] + ['+Inf']
+                for bound, count in zip(bounds, h.cumulative_counts()):
+                    lines.append('{}_bucket{{stage="{}",le="{}"}} {}'.format(name, stage, bound,
+                                                                           count))
+                lines.append('{}_sum{{stage="{}"}} {}'.format(name, stage, _format_float(h.sum)))
+                lines.append('{}_count{{stage="{}"}} {}'.format(name, stage, h.count))
+            counters = list(self.counters.items())
+        for counter, value in counters:
+            name = '{}_{}_total'.format(prefix, counter)
+            lines.append('# HELP {} {}.'.format(name, COUNTERS.get(counter, counter)))
+            lines.append('# TYPE {} counter'.format(name))
+            lines.append('{} {}'.format(name, value))
+        return '\n'.join(lines) + '\n'
+
+    def format_table(self):
+        """A human-readable breakdown of the time spent in each stage and the counters."""
+        summary = self.summary()
+        lines = ['{:<20} {:>8} {:>10} {:>10} {:>10}'.format('stage', 'count', 'total (s)',
+                                                             'mean (ms)', 'max (ms)')]
+        for stage, s in summary['stages'].items():
+            lines.append('{:<20} {:>8} {:>10.2f} {:>10.1f} {:>10.1f}'.format(
+                stage, s['count'], s['total'], 1000 * s['mean'], 1000 * s['max']))
+        lines.append('')
+        for counter, value in summary['counters'].items():
+            lines.append('{:<20} {:>8}'.format(counter, value))
+        if summary['cache_hit_rate'] is not None:
+            lines.append('{:<20} {:>8.1%}'.format('cache_hit_rate', summary['cache_hit_rate']))
+        lines.append('{:<20} {:>8.2f}'.format('elapsed (s)', summary['elapsed']))
+        return '\n'.join(lines)
+
+
+def _ordered(names, order):
+    """The names in the given order first, followed by the others in their original order."""
+    return [n for n in order if n in names] + [n for n in names if n not in order]
+
+
+def _format_float(value):
+    return repr(float(value))
+
+
+class OpenTelemetryExporter(object):
+    """
+    Forwards the recorded values to OpenTelemetry instruments: a histogram of the stage
+    durations with a 'stage' attribute and a counter for each counter. Requires the
+    opentelemetry-api package.
+
+    Parameters
+    ----------
+    meter : opentelemetry.metrics.Meter, optional
+        The meter to create the instruments with. Defaults to the global meter provider's
+        'metsaregister' meter.
+
+    Examples
+    --------
+    >>> metrics.add_listener(OpenTelemetryExporter())
+    """
+
+    def __init__(self, meter=None):
+        if meter is None:
+            from opentelemetry import metrics as otel_metrics
+            meter = otel_metrics.get_meter('metsaregister')
+        self._meter = meter
+        self._histogram = meter.create_histogram(
+            'metsaregister.stage.duration', unit='s', description='Time spent in each stage of '
+                                                                  'the queries')
+        self._counters = {}
+
+    def observe(self, stage, seconds):
+        self._histogram.record(seconds, {'stage': stage})
+
+    def increment(self, name, value):
+        if name not in self._counters:
+            self._counters[name] = self._meter.create_counter(
+                'metsaregister.' + name, description=COUNTERS.get(name, name))
+        self._counters[name].add(value)
+
+
+metrics = Metrics()
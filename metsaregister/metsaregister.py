@@ -1,23 +1,42 @@
 # -*- coding: utf-8 -*-
 
+import itertools
 import re
-import warnings
-from collections import OrderedDict
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
 from time import sleep
 
-import geopandas as gpd
-import pandas as pd
-import pygeoif.geometry
+try:
+    from time import monotonic
+except ImportError:  # Python 2
+    from time import time as monotonic
+
 import requests
-import shapely.wkt
-import xmltodict
-from babel.numbers import parse_decimal
-from bs4 import BeautifulSoup
 from lxml import etree
-from retrying import retry
-from six import StringIO
 from six.moves.urllib.parse import unquote, urljoin
-from tqdm import tqdm
+
+from ._lazy import lazy_import
+from .aoi import AOIPreprocessor
+from .cache import ResponseCache, endpoint_of
+from .catalogue import LayerCatalogue
+from .checkpoint import Checkpoint
+from .compact import compact_features, concat_features, feature_urls
+from .metrics import metrics
+from .records import RecordBuilder
+from .schema import FOREST_NOTIFICATIONS, FULL_INVENTORY, SHORT_INVENTORY
+from .store import FeatureStore
+from .tables import parse_decimal, parse_tables, read_key_values, read_table, table_text
+from .throttle import ServerError, add_wait, configure_throttle, retry, throttle_for
+from .tiling import grid_tiles, split_tile
+
+gpd = lazy_import('geopandas')
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+pygeoif = lazy_import('pygeoif')
+shapely = lazy_import('shapely')
+tqdm = lazy_import('tqdm')
 
 species_codes = {
     # Trees
@@ -55,179 +74,427 @@ species_codes = {
     'TP': 'teised põõsaliigid'
 }
 
-session = requests.Session()
+BASE_URL = 'http://register.metsad.ee/avalik/'
+CRS = {'init': 'epsg:3301'}
+
+FOREST_STAND_LAYERS = [
+    11,  # Eraldised Eramets: osaline kirjeldus
+    14,  # Eraldised Eramets: täiskirjeldus
+    12  # Eraldised RMK
+]
+FOREST_NOTIFICATION_LAYERS = [10]
 
-session.headers.update({
+DEFAULT_HEADERS = {
     'Pragma': 'no-cache',
     'Origin': 'http://register.metsad.ee',
     'Accept-Encoding': 'gzip, deflate',
     'Accept-Language': 'en-US,en;q=0.8,et;q=0.6',
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/59.0.3071.115 Safari/537.36',
+    'User-Agent': ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                   '(KHTML, like Gecko) Chrome/59.0.3071.115 Safari/537.36'),
     'Content-Type': 'application/x-www-form-urlencoded',
     'Accept': '*/*',
     'Cache-Control': 'no-cache',
     'X-Requested-With': 'ShockwaveFlash/26.0.0.131',
     'Connection': 'keep-alive',
     'Referer': 'http://register.metsad.ee/avalik/flash/map.swf',
-})
+}
+
+
+_cache = None
+
+
+def enable_cache(path, ttl=None, max_bytes=None):
+    """
+    Cache the server's responses on disk, so that repeated queries cost little network I/O.
+
+    Parameters
+    ----------
+    path : str
+        Directory to store the cache in.
+    ttl : float or dict, optional
+        Time in seconds a cached response is used without contacting the server. Either a single
+        value or a dictionary of endpoint -> seconds for the 'layers', 'objects' and 'info'
+        endpoints. Defaults to a week for the layer list and a day for everything else.
+    max_bytes : int, optional
+        Maximum size of the cache. Least recently used responses are evicted beyond that.
+
+    Returns
+    -------
+    metsaregister.cache.ResponseCache
+    """
+    global _cache
+    disable_cache()
+    _cache = ResponseCache(path, ttl=ttl, max_bytes=max_bytes)
+    return _cache
+
+
+def disable_cache():
+    """Stop caching the server's responses."""
+    global _cache
+    if _cache is not None:
+        _cache.close()
+    _cache = None
 
 
-def get_layers():
-    """Returns the list of available layers as a dictionary of layer name -> layer ID."""
-    layers = OrderedDict()
-    r = session.get("http://register.metsad.ee/avalik/flashconf.php?in=layers")
-    r.raise_for_status()
-    if 'Error' in r.text:
-        raise RuntimeError('Server raised an error: ' + r.text[:1000])
-    root = etree.fromstring(r.content)
-    for layer in root.xpath('//layer'):
-        layers[layer.get('name')] = int(layer.get('Lid'))
-    return layers
+_store = None
 
 
-@retry(wait_exponential_multiplier=1000, stop_max_delay=30000)
-def query_layer(aoi, layer_id=10):
+def enable_store(path, ttl=None):
     """
-    Return the features of the given layer that intersect with the given area of interest.
+    Store the features returned by layer queries locally, so that queries of areas that have
+    already been covered are answered without the server.
 
     Parameters
     ----------
-    aoi : str
-        A WKT string specifying the area of interest.
-    layer_id
-        ID number of the layer.
+    path : str
+        Directory to store the features in.
+    ttl : float, optional
+        Time in seconds the features of a covered area are used without querying the server
+        again. Defaults to a day.
 
     Returns
     -------
-    geopandas.GeoDataFrame
+    metsaregister.store.FeatureStore
     """
-    params = [('in', 'objects'),
-              ('layer_id', str(layer_id)),
-              ('operation', 'fw')]
-    data = [('requestArea', aoi.upper()),
-            ('srs', 'EPSG:3301')]
-    r = session.post('http://register.metsad.ee/avalik/flashconf.php', params=params, data=data)
-    r.raise_for_status()
-    if 'Error' in r.text:
-        raise RuntimeError('Server raised an error: ' + r.text[:1000])
-
-    crs = {'init': 'epsg:3301'}
-    if ">0 objects<" in r.text:
-        return gpd.GeoDataFrame(crs=crs)
-    features = xmltodict.parse(r.text)['objects']['obj']
-    if not isinstance(features, list):
-        features = [features]
-    df = pd.DataFrame(features).set_index('@id')
+    global _store
+    disable_store()
+    _store = FeatureStore(path, ttl=ttl)
+    return _store
+
+
+def disable_store():
+    """Stop storing the features of layer queries."""
+    global _store
+    if _store is not None:
+        _store.close()
+    _store = None
+
+
+_preprocessor = None
+
+
+def enable_aoi_preprocessing(tolerance=1.0, precision=1, bbox=False):
+    """
+    Send simplified areas of interest with rounded coordinates, or just their bounding boxes, to
+    the server and filter the results by the original areas locally. Makes the requests smaller
+    without changing the results.
+
+    Parameters
+    ----------
+    tolerance : float
+        Maximum distance in metres the simplified boundary may deviate from the original one.
+    precision : int
+        Number of decimals the coordinates are rounded to.
+    bbox : bool
+        Send the bounding boxes of the areas of interest instead.
+
+    Returns
+    -------
+    metsaregister.aoi.AOIPreprocessor
+    """
+    global _preprocessor
+    _preprocessor = AOIPreprocessor(tolerance, precision, bbox)
+    return _preprocessor
+
+
+def disable_aoi_preprocessing():
+    """Send the areas of interest to the server as they are."""
+    global _preprocessor
+    _preprocessor = None
+
+
+_catalogue = LayerCatalogue()
+
+
+def configure_catalogue(path=None, ttl=None):
+    """
+    Set where and for how long the lists of layers used by `get_layers` and for resolving layer
+    names are kept.
+
+    Parameters
+    ----------
+    path : str or False, optional
+        The JSON file to keep the layer lists in between runs. Defaults to layers.json in the
+        user's cache directory. False keeps them in memory only.
+    ttl : float, optional
+        Time in seconds after which a layer list is refreshed in the background. Defaults to a
+        week.
+
+    Returns
+    -------
+    metsaregister.catalogue.LayerCatalogue
+    """
+    _catalogue.configure(path, ttl)
+    return _catalogue
+
+
+def _cached_response(cached, url):
+    r = requests.Response()
+    r.status_code = 200
+    r.url = url
+    r.headers.update(cached.headers)
+    r.encoding = requests.utils.get_encoding_from_headers(r.headers)
+    r._content = cached.body
+    # The body is already read, iter_content() yields it instead of reading the missing stream
+    r._content_consumed = True
+    return r
+
+
+class RateLimiter(object):
+    """
+    A thread-safe token bucket limiting the rate at which requests are sent to the server.
+
+    Parameters
+    ----------
+    max_rps : float or None
+        Maximum number of requests per second. None disables the limit.
+    burst : int
+        Number of requests that may be sent back-to-back before the rate limit kicks in.
+    """
+
+    def __init__(self, max_rps, burst=1):
+        self.max_rps = max_rps
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        if not self.max_rps:
+            return
+        delay = self.reserve()
+        # Recorded along with the wait for the throttle of the request
+        add_wait(delay)
+        if delay > 0:
+            sleep(delay)
+
+    def reserve(self):
+        """Take a token without blocking and return the time in seconds to wait before sending
+        the request."""
+        if not self.max_rps:
+            return 0.0
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.max_rps)
+            self._last = now
+            # Reserve a token even if the bucket is empty and wait until it has been refilled
+            self._tokens -= 1
+            return max(-self._tokens / self.max_rps, 0.0)
+
+
+def _iter_objects(chunks):
+    """Incrementally parse the <obj> elements of a layer query response into dictionaries."""
+    parser = etree.XMLPullParser(events=('end',), tag='obj')
+    # Time spent parsing, excluding the time spent receiving the chunks and by the consumer
+    elapsed = 0.0
+    for chunk in chunks:
+        start = monotonic()
+        parser.feed(chunk)
+        for _, elem in parser.read_events():
+            obj = OrderedDict(('@' + k, v) for k, v in elem.attrib.items())
+            for child in elem:
+                obj[child.tag] = (child.text or '').strip() or None
+            # Free the memory taken by the already processed elements
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+            elapsed += monotonic() - start
+            yield obj
+            start = monotonic()
+        elapsed += monotonic() - start
+    parser.close()
+    metrics.observe('xml_parse', elapsed)
+
+
+def _metered_download(chunks, elapsed):
+    """Pass on the chunks of a streamed layer query response, recording the time taken to
+    receive them, on top of the given time until the response started, and their size."""
+    n_bytes = 0
+    while True:
+        start = monotonic()
+        chunk = next(chunks, None)
+        elapsed += monotonic() - start
+        if chunk is None:
+            break
+        n_bytes += len(chunk)
+        yield chunk
+    metrics.observe('layer_request', elapsed)
+    metrics.increment('layer_bytes', n_bytes)
+
+
+_linestring_re = re.compile(r'LINESTRING\s*\(([^)]+\))(?:,\s*)?')
+
+
+def _wkt_to_geometry(wkt):
+    if wkt.startswith('GEOMETRYCOLLECTION'):
+        # GeometryCollection type seems to be more of a bug in the dataset
+        # With erroneous LineString objects appearing inside it.
+        # It's better to convert it to a MultiPolygon.
+        wkt = (_linestring_re.sub('', wkt)
+               .replace('POLYGON', '')
+               .replace('GEOMETRYCOLLECTION', 'MULTIPOLYGON'))
+    try:
+        return shapely.wkt.loads(wkt)
+    except Exception:
+        # A workaround for cases like
+        # IllegalArgumentException: Points of LinearRing do not form a closed linestring
+        # that Shapely refuses to handle.
+        return shapely.geometry.shape(pygeoif.from_wkt(wkt))
+
+
+def wkt_to_geometries(wkts):
+    """
+    Convert the WKT strings returned by the server to Shapely geometries.
+
+    With Shapely 2 the strings are parsed in a single vectorized call and only the ones that fail
+    to parse are repaired row by row.
+
+    Parameters
+    ----------
+    wkts : pandas.Series
+        WKT strings.
+
+    Returns
+    -------
+    numpy.ndarray
+        An object array of Shapely geometries.
+    """
+    from_wkt = getattr(shapely, 'from_wkt', None)  # Shapely >= 2.0
+    if from_wkt is None:
+        geometries = np.empty(len(wkts), dtype=object)
+        for i, wkt in enumerate(wkts):
+            geometries[i] = _wkt_to_geometry(wkt)
+        return geometries
+    wkts = pd.Series(wkts, dtype=object).reset_index(drop=True)
+    collections = wkts.str.startswith('GEOMETRYCOLLECTION')
+    if collections.any():
+        # See _wkt_to_geometry()
+        wkts[collections] = (wkts[collections]
+                             .str.replace(_linestring_re, '', regex=True)
+                             .str.replace('POLYGON', '', regex=False)
+                             .str.replace('GEOMETRYCOLLECTION', 'MULTIPOLYGON', regex=False))
+    geometries = from_wkt(wkts.values, on_invalid='ignore')
+    for i in np.flatnonzero(pd.isnull(geometries)):
+        geometries[i] = shapely.geometry.shape(pygeoif.from_wkt(wkts[i]))
+    return geometries
+
+
+def _objects_to_gdf(objects):
+    df = pd.DataFrame(objects).set_index('@id')
     df.index.name = 'id'
     if '@label' in list(df):
         df = df.drop('@label', axis=1)
     if 'url' in list(df):
         df.loc[df['url'].notnull(), 'url'] = df['url'].dropna().map(unquote)
 
-    geometries = []
-    for wkt in df['wkt']:
-        if wkt.startswith('GEOMETRYCOLLECTION'):
-            # GeometryCollection type seems to be more of a bug in the dataset
-            # With erroneous LineString objects appearing inside it.
-            # It's better to convert it to a MultiPolygon.
-            wkt = (re.sub(r'LINESTRING\s*\(([^)]+\))(?:,\s*)?', '', wkt)
-                   .replace('POLYGON', '')
-                   .replace('GEOMETRYCOLLECTION', 'MULTIPOLYGON'))
-        try:
-            geometries.append(shapely.wkt.loads(wkt))
-        except:
-            # A workaround for cases like
-            # IllegalArgumentException: Points of LinearRing do not form a closed linestring
-            # that Shapely refuses to handle.
-            geometries.append(
-                shapely.geometry.geo.shape(pygeoif.geometry.from_wkt(wkt))
-            )
+    with metrics.time('wkt_decode'):
+        geometries = wkt_to_geometries(df['wkt'])
     df = df.drop('wkt', axis=1)
-    gdf = gpd.GeoDataFrame(df, crs=crs, geometry=geometries)
-    return gdf
+    return gpd.GeoDataFrame(df, crs=CRS, geometry=geometries)
 
 
-@retry(wait_exponential_multiplier=1000, stop_max_delay=30000)
-def get_info(url):
-    """Fetch the content of a feature's information page."""
-    if 'metsad.ee' not in url:
-        url = urljoin('http://register.metsad.ee/avalik/', url)
-    r = session.get(url)
-    r.raise_for_status()
-    txt = r.text
-    if 'Error' in txt:
-        raise RuntimeError('Server raised an error: ' + r.text[:1000])
-    txt = txt.replace('\r\n', '\n').strip()
-    txt = re.sub('\s*<script[^>]*>.+</script>\s*', '', txt, flags=re.DOTALL)
-    txt = txt.replace("""
-	<tr>
-		<th colspan="2" id="grpHeader"><a class="button1" href="#"
-			onclick="window.print();"><span>Prindi</span></a></th>
-	</tr>""", "")
-    txt = txt.replace(' onload="resizeWinTo(\'content\');"', '')
-    return txt
+def _idxmax(values):
+    """Index of the first largest value, ignoring NaNs."""
+    return max((i for i, v in enumerate(values) if v == v), key=lambda i: values[i])
 
 
-def _extract_tables(info):
-    soup = BeautifulSoup(info, "lxml")
-    tables = soup.find_all('table')
-    for th in soup.find_all('th'):
-        # Remove unnecessary headers
-        if th.get('colspan') == '2':
-            th.extract()
-    for tbl in tables[::-1]:
-        # Make nested tables independent
-        tbl.extract()
-    return tables
+def _weighted_mean(values, weights):
+    # Summed with numpy to get the exact same results as pandas would
+    return np.nansum(np.asarray(values, dtype=float) * np.asarray(weights, dtype=float)) / 100
 
 
-def parse_full_inventory_info(info):
-    tables = _extract_tables(info)
-    txt = tables[0].text
+def _add_first_level(d, species, shares, heights, ages):
+    """Add the main species, the mean height and age and the per-species values of the first
+    tree level."""
+    d['Pealiik'] = species[_idxmax(shares)]
+    d['Kõrgus'] = _weighted_mean(heights, shares)
+    d['Vanus'] = _weighted_mean(ages, shares)
+    for liik, share, height, age in zip(species, shares, heights, ages):
+        d[liik + ' %'] = share
+        d[liik + ' H'] = height
+        d[liik + ' A'] = age
+
+
+_katastritunnus_re = re.compile(r'katastritunnus ([^,\s]+)')
+_eraldis_re = re.compile(r'eraldis ([^,\s]+)')
+_kvartal_re = re.compile(r'kvartal ([^,\s]+)')
+_spaces_re = re.compile(r'\s+')
+_work_re = re.compile(r'(\D+) +(\d+) +tm(?: +\(seemnepuud +(\d+) +tk\))?')
+_script_re = re.compile(r'\s*<script[^>]*>.+</script>\s*', flags=re.DOTALL)
+
+
+def _full_inventory_record(info):
+    tables = parse_tables(info)
+    txt = table_text(tables[0])
     d = OrderedDict()
-    d['Katastritunnus'] = re.search(r'katastritunnus ([^,\s]+)', txt).group(1)
-    d['Eraldise nr.'] = int(re.search(r'eraldis ([^,\s]+)', txt).group(1))
-    m = re.search(r'kvartal ([^,\s]+)', txt)
+    d['Katastritunnus'] = _katastritunnus_re.search(txt).group(1)
+    d['Eraldise nr.'] = int(_eraldis_re.search(txt).group(1))
+    m = _kvartal_re.search(txt)
     if m:
         d['Kvartali nr.'] = m.group(1)
     else:
         d['Kvartali nr.'] = '-'
     for l in txt.splitlines():
-        l = l.strip()
-        l = re.sub(r'\s+', ' ', l)
+        l = _spaces_re.sub(' ', l.strip())
         parts = l.split(': ', 1)
         if len(parts) != 2:
             continue
         key = parts[0]
         value = parts[1].replace(' ha', '')
-        try:
-            value = float(parse_decimal(value, 'et_ee'))
-        except:
-            pass
         if 'pindala' in key.lower():
             key += ' (ha)'
+        field = FULL_INVENTORY.get(key)
+        if field is not None:
+            value = field.convert(value)
+        else:
+            number = parse_decimal(value)
+            if number is not None:
+                value = number
         d[key] = value
-    s = pd.Series(d)
-    s['Täiskirjeldusega'] = True
+    d['Täiskirjeldusega'] = True
 
-    kooslus = pd.read_html(StringIO(str(tables[2])), header=0, thousands=' ', decimal=',')[0]
-    kooslus = kooslus.loc[kooslus['Rinne'].str.endswith('Esimene')]
-    s['Pealiik'] = kooslus.loc[kooslus['%'].idxmax(), 'Puuliik'].lower()
-    s['Kõrgus'] = (kooslus['H'] * kooslus['%']).sum() / 100
-    s['Vanus'] = (kooslus['Vanus'] * kooslus['%']).sum() / 100
-    for idx, row in kooslus.iterrows():
-        liik = row['Puuliik'].lower()
-        s[liik + ' %'] = row['%']
-        s[liik + ' H'] = row['H']
-        s[liik + ' A'] = row['Vanus']
+    kooslus = read_table(tables[2])
+    first = [i for i, rinne in enumerate(kooslus['Rinne'])
+             if isinstance(rinne, str) and rinne.endswith('Esimene')]
+    _add_first_level(d,
+                     [kooslus['Puuliik'][i].lower() for i in first],
+                     [kooslus['%'][i] for i in first],
+                     [kooslus['H'][i] for i in first],
+                     [kooslus['Vanus'][i] for i in first])
+    return d
 
-    return s
+
+def _short_inventory_record(info):
+    tables = parse_tables(info)
+    d = read_key_values(tables[0], SHORT_INVENTORY)
+    d['Täiskirjeldusega'] = False
+
+    if len(tables) > 1:
+        kooslus = read_table(tables[1])
+        if kooslus and len(kooslus['Liik']) > 0:
+            _add_first_level(d,
+                             [species_codes[liik] for liik in kooslus['Liik']],
+                             kooslus['%'], kooslus['H'], kooslus['A'])
+    return d
+
+
+def _inventory_record(info):
+    if u'Üldised takseerandmed' in info:
+        return _short_inventory_record(info)
+    else:
+        return _full_inventory_record(info)
+
+
+def parse_full_inventory_info(info):
+    return pd.Series(_full_inventory_record(info), dtype=object)
 
 
 def parse_short_inventory_info(info):
     """
     Parse the information returned for forest stands.
-    Returns the main information for the stands and the information of the first tree level by species.
+    Returns the main information for the stands and the information of the first tree level by
+    species.
 
     Parameters
     ----------
@@ -238,35 +505,14 @@ def parse_short_inventory_info(info):
     -------
     pandas.Series
     """
-    tables = _extract_tables(info)
-    s = (pd.read_html(StringIO(str(tables[0])), thousands=' ', decimal=',')[0]
-         .set_index(0)
-         .iloc[:, 0])
-    s.name = None
-    s.index.name = None
-    s['Täiskirjeldusega'] = False
-
-    if len(tables) == 1:
-        return s
-    kooslus = pd.read_html(StringIO(str(tables[1])), header=0, thousands=' ', decimal=',')[0]
-    if len(kooslus) == 0:
-        return s
-    s['Pealiik'] = species_codes[kooslus.loc[kooslus['%'].idxmax(), 'Liik']]
-    s['Kõrgus'] = (kooslus['H'] * kooslus['%']).sum() / 100
-    s['Vanus'] = (kooslus['A'] * kooslus['%']).sum() / 100
-    for idx, row in kooslus.iterrows():
-        liik = species_codes[row['Liik']]
-        s[liik + ' %'] = row['%']
-        s[liik + ' H'] = row['H']
-        s[liik + ' A'] = row['A']
-
-    return s
+    return pd.Series(_short_inventory_record(info), dtype=object)
 
 
 def parse_inventory_info(info):
     """
     Parse the information returned for forest stands (eraldised).
-    Returns the main information for the stands and the information of the first tree level by species.
+    Returns the main information for the stands and the information of the first tree level by
+    species.
 
     Parameters
     ----------
@@ -277,10 +523,7 @@ def parse_inventory_info(info):
     -------
     pandas.Series
     """
-    if u'Üldised takseerandmed' in info:
-        return parse_short_inventory_info(info)
-    else:
-        return parse_full_inventory_info(info)
+    return pd.Series(_inventory_record(info), dtype=object)
 
 
 def parse_forest_notifications(info):
@@ -298,99 +541,740 @@ def parse_forest_notifications(info):
     -------
     pandas.Series
     """
-    tables = _extract_tables(info)
-    general_s = (pd.read_html(StringIO(str(tables[0])), thousands=' ', decimal=',')[0]
-                 .set_index(0)
-                 .iloc[:, 0])
-    for row in tables[1].find_all('tr'):
+    return pd.Series(_forest_notification_record(info), dtype=object)
+
+
+def _forest_notification_record(info):
+    tables = parse_tables(info)
+    general = read_key_values(tables[0], FOREST_NOTIFICATIONS)
+    for row in list(tables[1].iter('tr')):
         # Extract the single highlighted row
-        if row.get('class') != ['selected_row'] and not row.find('th'):
-            row.extract()
-    works_s = (pd.read_html(StringIO(str(tables[1])), header=0, thousands=' ', decimal=',',
-                            converters={'Kvartal': lambda x: x})[0]
-               .iloc[0])
+        if row.get('class', '').split() != ['selected_row'] and row.find('.//th') is None:
+            row.getparent().remove(row)
+    works = OrderedDict((name, values[0]) for name, values in
+                        read_table(tables[1], schema=FOREST_NOTIFICATIONS).items())
     # Make the Töö field more useful by extracting the amount and number of seed trees left
-    work = works_s['Töö']
-    works_s['Maht (tm)'] = float('nan')
-    works_s['Seemnepuid'] = float('nan')
+    work = works['Töö']
+    works['Maht (tm)'] = float('nan')
+    works['Seemnepuid'] = float('nan')
     if ' tm' in work:
-        m = re.search(r'(\D+) +(\d+) +tm(?: +\(seemnepuud +(\d+) +tk\))?', work)
+        m = _work_re.search(work)
         work_type, amount, seed_trees = m.groups()
-        works_s['Töö'] = work_type
-        works_s['Maht (tm)'] = float(amount)
+        works['Töö'] = work_type
+        works['Maht (tm)'] = float(amount)
         if seed_trees:
-            works_s['Seemnepuid'] = float(seed_trees)
+            works['Seemnepuid'] = float(seed_trees)
 
     # Avoid abbreviations
-    works_s.rename({'Er': 'Eraldis', 'P': 'Pindala (ha)'}, inplace=True)
-
-    return general_s.append(works_s)
-
-
-def _query_with_info(layer_ids, aoi, parser, wait):
-    dfs = []
-    for id in layer_ids:
-        dfs.append(query_layer(aoi, id))
-    df = pd.concat(dfs)
-    if df.shape[0] == 0:
-        return df
-    infos = {}
-    for id, url in tqdm(list(df.url.iteritems())):
-        txt = get_info(url)
-        infos[id] = parser(txt)
-        sleep(wait)
-    info_df = pd.concat(infos.values(), axis=1).transpose()
-    info_df.index = list(infos)
-    info_df[info_df == '-'] = float('nan')
+    renames = {'Er': 'Eraldis', 'P': 'Pindala (ha)'}
+    for key, value in works.items():
+        general[renames.get(key, key)] = value
+    return general
+
+
+@metrics.timed('merge')
+def _merge_info(df, info_df):
     merged = df.join(info_df)
     merged.index.name = 'id'
-    merged.reset_index().drop(['url'], axis=1)
-    with warnings.catch_warnings():
-        # Not converting the numeric values from objects to numeric will cause issues when
-        # writing the GeoDataFrame to file.
-        # There is no good substitute for the deprecated convert_objects() right now.
-        # A future pandas release will have a suitable .infer_objects() method.
-        warnings.simplefilter("ignore", category=DeprecationWarning)
-        merged = merged.convert_objects()
     return merged
 
 
-def query_forest_stands(aoi, wait=0.5):
-    """Retrieves the forest stands (eraldised) and their information as a GeoDataFrame.
+def _clean_info(txt):
+    txt = txt.replace('\r\n', '\n').strip()
+    txt = _script_re.sub('', txt)
+    txt = txt.replace("""
+	<tr>
+		<th colspan="2" id="grpHeader"><a class="button1" href="#"
+			onclick="window.print();"><span>Prindi</span></a></th>
+	</tr>""", "")
+    txt = txt.replace(' onload="resizeWinTo(\'content\');"', '')
+    return txt
 
-    Parameters
-    ----------
-    aoi : str
-        A WKT string of the area of interest.
-    wait : float
-        Time to wait between running a subquery for each forest stand. This acts as a rate limit
-        to not overly stress the server.
 
-    Returns
-    -------
-    geopandas.GeoDataFrame
+def _ordered_map(executor, func, items, window):
+    """
+    Like ``executor.map``, but only submits the calls up to `window` items ahead of the result
+    being waited for. The calls that have not started yet are cancelled if a call fails or the
+    caller stops early, instead of all of the remaining items being processed first.
     """
-    layer_ids = [
-        11,  # Eraldised Eramets: osaline kirjeldus
-        14,  # Eraldised Eramets: täiskirjeldus
-        12  # Eraldised RMK
-    ]
-    return _query_with_info(layer_ids, aoi, parse_inventory_info, wait)
+    items = iter(items)
+    futures = deque(executor.submit(func, item) for item in itertools.islice(items, window))
+    try:
+        while futures:
+            result = futures.popleft().result()
+            for item in itertools.islice(items, 1):
+                futures.append(executor.submit(func, item))
+            yield result
+    finally:
+        for future in futures:
+            future.cancel()
 
 
-def query_forest_notifications(aoi, wait=0.5):
-    """Retrieves the forest notifications (metsateatised) and their information as a GeoDataFrame.
+# The metrics stages and byte counters of the requests to each endpoint
+_request_stages = {'layers': 'layer_list_request', 'objects': 'layer_request',
+                   'info': 'info_request'}
+_byte_counters = {'layers': 'layer_bytes', 'objects': 'layer_bytes', 'info': 'info_bytes'}
+
+
+class Client(object):
+    """
+    A client for the forest registry server with its own HTTP session.
 
     Parameters
     ----------
-    aoi : str
-        A WKT string of the area of interest.
-    wait : float
-        Time to wait between running a subquery for each forest stand. This acts as a rate limit
-        to not overly stress the server.
+    base_url : str, optional
+        URL of the server's public API. Defaults to `BASE_URL`.
+    pool_size : int
+        Maximum number of connections kept open to the server. Should be at least the number of
+        requests sent in parallel.
+    keep_alive : bool
+        Reuse the connections between requests.
+    timeout : float or tuple, optional
+        Connect and read timeouts in seconds, either as a single value or a (connect, read)
+        tuple. None waits forever.
+    compression : bool
+        Ask the server to compress its responses.
+    transport : requests.adapters.BaseAdapter, optional
+        Transport adapter to send the requests with, e.g.
+        ``metsaregister.transports.HTTPXAdapter(http2=True)`` for HTTP/2. By default a
+        connection-pooling ``requests.adapters.HTTPAdapter`` of `pool_size` is used.
+    cache : metsaregister.cache.ResponseCache, optional
+        Response cache of the client. Defaults to the cache set up with `enable_cache`, if any.
+    store : metsaregister.store.FeatureStore, optional
+        Local feature store of the client. Defaults to the store set up with `enable_store`, if
+        any.
+    preprocessor : metsaregister.aoi.AOIPreprocessor, optional
+        Simplifies the areas of interest of the layer queries. Defaults to the one set up with
+        `enable_aoi_preprocessing`, if any.
+    headers : dict, optional
+        Additional headers to send with every request.
+    """
 
-    Returns
-    -------
-    geopandas.GeoDataFrame
+    def __init__(self, base_url=None, pool_size=10, keep_alive=True, timeout=(10, 120),
+                 compression=True, transport=None, cache=None, headers=None, store=None,
+                 preprocessor=None):
+        self._base_url = base_url
+        self.timeout = timeout
+        self.cache = cache
+        self.store = store
+        self.preprocessor = preprocessor
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        if not keep_alive:
+            self.session.headers['Connection'] = 'close'
+        if not compression:
+            self.session.headers['Accept-Encoding'] = 'identity'
+        if headers:
+            self.session.headers.update(headers)
+        if transport is None:
+            transport = requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                                      pool_maxsize=pool_size)
+        self.session.mount('http://', transport)
+        self.session.mount('https://', transport)
+
+    @property
+    def base_url(self):
+        return self._base_url or BASE_URL
+
+    def close(self):
+        """Close the connections of the client's session."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _active_cache(self):
+        return self.cache if self.cache is not None else _cache
+
+    def _active_store(self):
+        return self.store if self.store is not None else _store
+
+    def _active_preprocessor(self):
+        return self.preprocessor if self.preprocessor is not None else _preprocessor
+
+    def _request(self, method, url, params=None, data=None, stream=False):
+        """
+        Send a request to the server, going through the response cache if it is enabled.
+
+        Responses are only streamed if the cache is disabled. The body of a streamed response is
+        not checked for error messages, that is left to the caller, as is recording the time
+        taken and the bytes received.
+
+        Requests sent to the server are paced by the adaptive throttle of its host.
+        """
+        session = self.session
+        request = session.prepare_request(requests.Request(method, url, params=params, data=data))
+        endpoint = endpoint_of(request.url)
+        cache = self._active_cache()
+        key = cached = None
+        if cache is not None:
+            key = cache.key(method, request.url, request.body)
+            cached = cache.get(key)
+            if cached is not None:
+                if cached.fresh:
+                    metrics.increment('cache_hits')
+                    return _cached_response(cached, request.url)
+                request.headers.update(cached.validators)
+        stream = stream and cache is None
+        settings = session.merge_environment_settings(request.url, {}, stream, None, None)
+        with throttle_for(request.url).request(endpoint):
+            metrics.increment('requests')
+            start = monotonic()
+            r = session.send(request, timeout=self.timeout, **settings)
+            if cached is not None and r.status_code == 304:
+                cache.touch(key)
+                metrics.increment('cache_hits')
+                return _cached_response(cached, request.url)
+            if cache is not None:
+                metrics.increment('cache_misses')
+            r.raise_for_status()
+            if stream:
+                return r
+            metrics.observe(_request_stages[endpoint], monotonic() - start)
+            metrics.increment(_byte_counters[endpoint], len(r.content))
+            if 'Error' in r.text:
+                raise ServerError('Server raised an error: ' + r.text[:1000])
+        if cache is not None:
+            headers = {k: r.headers[k] for k in ('Content-Type', 'ETag', 'Last-Modified')
+                       if k in r.headers}
+            cache.put(key, request.url, r.content, headers)
+        return r
+
+    def get_layers(self, refresh=False):
+        """
+        Returns the list of available layers as a dictionary of layer name -> layer ID.
+
+        The list is fetched from the server once and then kept in the layer catalogue, see
+        `configure_catalogue`.
+
+        Parameters
+        ----------
+        refresh : bool
+            Fetch the list from the server even if it is in the catalogue.
+
+        Returns
+        -------
+        OrderedDict
+        """
+        return _catalogue.get(self.base_url, self._fetch_layers, refresh)
+
+    def _fetch_layers(self):
+        layers = OrderedDict()
+        r = self._request('GET', urljoin(self.base_url, 'flashconf.php?in=layers'))
+        root = etree.fromstring(r.content)
+        for layer in root.xpath('//layer'):
+            layers[layer.get('name')] = int(layer.get('Lid'))
+        return layers
+
+    def _request_objects(self, aoi, layer_id):
+        """
+        Send a layer query and return an iterator over the chunks of the response body.
+
+        Not retried itself: `query_layer` retries the whole query and `iter_layer` this request.
+        """
+        params = [('in', 'objects'),
+                  ('layer_id', str(layer_id)),
+                  ('operation', 'fw')]
+        data = [('requestArea', aoi.upper()),
+                ('srs', 'EPSG:3301')]
+        r = self._request('POST', urljoin(self.base_url, 'flashconf.php'), params=params,
+                          data=data, stream=True)
+        chunks = r.iter_content(chunk_size=2 ** 16)
+        if self._active_cache() is None:
+            # Streamed, the download is only timed while the response is being parsed
+            chunks = _metered_download(chunks, r.elapsed.total_seconds())
+        first = next(chunks, b'')
+        # The server's error messages are short, checking the first chunk of the response
+        # suffices
+        if b'Error' in first:
+            throttle_for(r.url).backoff()
+            raise ServerError('Server raised an error: ' + first[:1000].decode('utf8', 'replace'))
+        return itertools.chain([first], chunks)
+
+    def iter_layer(self, aoi, layer_id=10, chunk_size=10000, compact=False):
+        """
+        Return the features of the given layer that intersect with the given area of interest
+        in chunks of a fixed size.
+
+        The server's response is parsed as it is being received, so that the memory used does
+        not grow with the size of the response. That is not the case if a feature store is
+        enabled, see `query_layer`. Chunks can be smaller than `chunk_size` if the areas of
+        interest are preprocessed, see `enable_aoi_preprocessing`.
+
+        Parameters
+        ----------
+        aoi : str
+            A WKT string specifying the area of interest.
+        layer_id
+            ID number or name of the layer.
+        chunk_size : int
+            Maximum number of features in each chunk.
+        compact : bool
+            Return the chunks in the compact representation, see `query_layer`.
+
+        Yields
+        ------
+        geopandas.GeoDataFrame
+        """
+        layer_id = self._resolve_layer(layer_id)
+        if self._active_store() is not None:
+            gdf = self.query_layer(aoi, layer_id, compact)
+            for start in range(0, len(gdf), chunk_size):
+                yield gdf.iloc[start:start + chunk_size]
+        else:
+            # Chunks already yielded cannot be taken back, so only the request is retried
+            request = retry(self._request_objects)
+            for gdf in self._iter_server(aoi, layer_id, chunk_size, compact, request):
+                yield gdf
+
+    def _iter_server(self, aoi, layer_id, chunk_size=10000, compact=False, request=None):
+        if request is None:
+            request = self._request_objects
+        preprocessor = self._active_preprocessor()
+        if preprocessor is None:
+            geometry = None
+        else:
+            aoi, geometry = preprocessor.prepare(aoi)
+
+        def to_gdf(objects):
+            gdf = AOIPreprocessor.filter(_objects_to_gdf(objects), geometry)
+            return compact_features(gdf) if compact else gdf
+
+        objects = []
+        for obj in _iter_objects(request(aoi, layer_id)):
+            objects.append(obj)
+            if len(objects) == chunk_size:
+                gdf = to_gdf(objects)
+                if len(gdf) > 0:
+                    yield gdf
+                objects = []
+        if objects:
+            gdf = to_gdf(objects)
+            if len(gdf) > 0:
+                yield gdf
+
+    @retry
+    def query_layer(self, aoi, layer_id=10, compact=False):
+        """
+        Return the features of the given layer that intersect with the given area of interest.
+
+        If a feature store is enabled, the features in the parts of the area covered by earlier
+        queries are taken from the store and only the rest of the area is queried from the
+        server.
+
+        For large results, `compact` reduces the memory used several times over. The feature IDs
+        are then integers, the attributes with few distinct values categoricals and the 'url'
+        column is replaced by a template in the ``attrs`` of the result if the URLs only differ
+        by the feature ID, see `metsaregister.compact.feature_urls`.
+
+        Parameters
+        ----------
+        aoi : str
+            A WKT string specifying the area of interest.
+        layer_id
+            ID number or name of the layer.
+        compact : bool
+            Return the features in the compact representation.
+
+        Returns
+        -------
+        geopandas.GeoDataFrame
+        """
+        layer_id = self._resolve_layer(layer_id)
+        store = self._active_store()
+        if store is None:
+            return self._query_server(aoi, layer_id, compact)
+        geometry = shapely.wkt.loads(aoi)
+        remainder = store.uncovered(layer_id, geometry)
+        if remainder is None:
+            metrics.increment('store_hits')
+        else:
+            metrics.increment('store_misses')
+            store.put(layer_id, remainder, self._query_server(remainder.wkt, layer_id))
+        gdf = store.query(layer_id, geometry, crs=CRS)
+        return compact_features(gdf) if compact else gdf
+
+    def _query_server(self, aoi, layer_id, compact=False):
+        chunks = list(self._iter_server(aoi, layer_id, compact=compact))
+        if not chunks:
+            return gpd.GeoDataFrame(crs=CRS)
+        if len(chunks) == 1:
+            return chunks[0]
+        return concat_features(chunks) if compact else pd.concat(chunks)
+
+    def _resolve_layer(self, layer):
+        """The ID of a layer given by its ID or name, see `get_layers`."""
+        return _catalogue.resolve(self.base_url, self._fetch_layers, layer)
+
+    def _resolve_layers(self, layers):
+        return [self._resolve_layer(layer) for layer in layers]
+
+    def _query_each(self, aoi, layer_ids, concurrency=None):
+        """Query the layers in parallel, returning the results in the order of the IDs."""
+        if len(layer_ids) <= 1 or concurrency == 1:
+            return [self.query_layer(aoi, id) for id in layer_ids]
+        with ThreadPoolExecutor(max_workers=concurrency or len(layer_ids)) as executor:
+            return list(executor.map(lambda id: self.query_layer(aoi, id), layer_ids))
+
+    def query_layers(self, aoi, layers, concurrency=None, split=False):
+        """
+        Return the features of several layers that intersect with the given area of interest.
+
+        The layers are queried in parallel.
+
+        Parameters
+        ----------
+        aoi : str
+            A WKT string specifying the area of interest.
+        layers : list
+            ID numbers or names of the layers, see `get_layers`.
+        concurrency : int, optional
+            Maximum number of layers to query in parallel. All of them by default. The adaptive
+            throttling also limits the number of concurrent requests to the server.
+        split : bool
+            Return the features of each layer separately.
+
+        Returns
+        -------
+        geopandas.GeoDataFrame or OrderedDict
+            The features of all layers with their layer's ID in a 'layer_id' column or, if
+            `split` is set, a dictionary of layer ID -> GeoDataFrame.
+        """
+        layer_ids = self._resolve_layers(layers)
+        results = OrderedDict(zip(layer_ids, self._query_each(aoi, layer_ids, concurrency)))
+        if split:
+            return results
+        tagged = [gdf.assign(layer_id=id) for id, gdf in results.items() if gdf.shape[0] > 0]
+        if not tagged:
+            return gpd.GeoDataFrame(crs=CRS)
+        return pd.concat(tagged)
+
+    def query_layer_tiled(self, aoi, layer_id=10, tile_size=5000, max_features=5000, max_depth=3,
+                          concurrency=4, max_rps=None):
+        """
+        Return the features of the given layer that intersect with the given area of interest,
+        querying the area as a grid of smaller tiles.
+
+        Tiles whose query fails or returns at least `max_features` features are split into
+        quadrants and queried again, up to `max_depth` times. Features crossing tile borders are
+        only included once.
+
+        The order the server returns the features in cannot be restored from the tiles, so the
+        features are sorted by their IDs. The result equals that of `query_layer` sorted with
+        ``sort_index()``.
+
+        Parameters
+        ----------
+        aoi : str
+            A WKT string specifying the area of interest.
+        layer_id
+            ID number or name of the layer.
+        tile_size : float
+            Size of the initial grid cells in metres.
+        max_features : int
+            Tiles whose response contains at least this many features are subdivided.
+        max_depth : int
+            Maximum number of times a tile can be subdivided.
+        concurrency : int
+            Number of tiles to query in parallel.
+        max_rps : float, optional
+            Maximum number of requests per second.
+
+        Returns
+        -------
+        geopandas.GeoDataFrame
+        """
+        geometry = shapely.wkt.loads(aoi)
+        layer_id = self._resolve_layer(layer_id)
+        limiter = RateLimiter(max_rps)
+
+        def query_tile(tile, splittable):
+            limiter.acquire()
+            try:
+                gdf = self.query_layer(tile.wkt, layer_id)
+            except Exception:
+                if not splittable:
+                    raise
+                return None
+            if splittable and len(gdf) >= max_features:
+                return None
+            return gdf
+
+        results = []
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pending = {}
+
+            def submit(tile, depth):
+                pending[executor.submit(query_tile, tile, depth < max_depth)] = (tile, depth)
+
+            for tile in grid_tiles(geometry, tile_size):
+                submit(tile, 0)
+            while pending:
+                done, _ = wait_futures(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    tile, depth = pending.pop(future)
+                    gdf = future.result()
+                    if gdf is None:
+                        for subtile in split_tile(tile):
+                            submit(subtile, depth + 1)
+                    elif len(gdf) > 0:
+                        results.append(gdf)
+
+        if not results:
+            return gpd.GeoDataFrame(crs=CRS)
+        gdf = pd.concat(results)
+        gdf = gdf[~gdf.index.duplicated()]
+        # Sorted by ID regardless of which tiles finished first
+        return gdf.sort_index(kind='mergesort')
+
+    @retry
+    def get_info(self, url):
+        """Fetch the content of a feature's information page."""
+        if 'metsad.ee' not in url:
+            url = urljoin(self.base_url, url)
+        return _clean_info(self._request('GET', url).text)
+
+    def _iter_infos(self, urls, parser, concurrency=1, max_rps=None, parse_workers=None):
+        """
+        Fetch and parse the information pages of the given URLs, yielding the results in the
+        order of the URLs as soon as they are available.
+
+        If `parse_workers` is set, the pages are parsed in a separate process pool (or the given
+        executor) while the next pages are being fetched.
+        """
+        limiter = RateLimiter(max_rps)
+
+        def fetch(url):
+            limiter.acquire()
+            return self.get_info(url)
+
+        def fetch_and_parse(url):
+            info = fetch(url)
+            with metrics.time('html_parse'):
+                return parser(info)
+
+        if isinstance(parse_workers, Executor):
+            parse_executor = parse_workers
+        elif parse_workers:
+            parse_executor = ProcessPoolExecutor(max_workers=parse_workers)
+        else:
+            parse_executor = None
+
+        if parse_executor is None:
+            if concurrency <= 1:
+                for url in tqdm.tqdm(urls):
+                    yield fetch_and_parse(url)
+                return
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                infos = _ordered_map(executor, fetch_and_parse, urls, 2 * concurrency)
+                for info in tqdm.tqdm(infos, total=len(urls)):
+                    yield info
+            return
+
+        fetch_executor = ThreadPoolExecutor(max_workers=concurrency) if concurrency > 1 else None
+        futures = deque()
+        try:
+            if fetch_executor is not None:
+                pages = _ordered_map(fetch_executor, fetch, urls, 2 * concurrency)
+            else:
+                pages = (fetch(url) for url in urls)
+            for page in tqdm.tqdm(pages, total=len(urls)):
+                futures.append(parse_executor.submit(parser, page))
+                while futures and futures[0].done():
+                    yield futures.popleft().result()
+            while futures:
+                yield futures.popleft().result()
+        finally:
+            # Do not wait for the pages still queued for parsing if stopped early
+            for future in futures:
+                future.cancel()
+            if fetch_executor is not None:
+                fetch_executor.shutdown()
+            if parse_executor is not parse_workers:
+                parse_executor.shutdown()
+
+    def _query_layers(self, layer_ids, aoi):
+        return pd.concat(self._query_each(aoi, layer_ids))
+
+    def _fetch_info_df(self, df, parser, wait, concurrency=1, max_rps=None, parse_workers=None,
+                       checkpoint=None):
+        """Fetch and parse the information pages of the features in a layer query result."""
+        if max_rps is None and wait:
+            max_rps = 1.0 / wait
+        ids, urls = list(df.index), list(feature_urls(df))
+        done = Checkpoint(checkpoint) if checkpoint is not None else {}
+        try:
+            todo = [(id, url) for id, url in zip(ids, urls) if id not in done]
+            parsed = self._iter_infos([url for _, url in todo], parser, concurrency, max_rps,
+                                      parse_workers)
+            for (id, _), info in zip(todo, parsed):
+                done[id] = info
+        finally:
+            if checkpoint is not None:
+                done.close()
+        records = RecordBuilder()
+        for id in ids:
+            records.append(id, done[id])
+        return records.build()
+
+    def _query_with_info(self, layer_ids, aoi, parser, wait, concurrency=1, max_rps=None,
+                         parse_workers=None, checkpoint=None):
+        df = self._query_layers(layer_ids, aoi)
+        if df.shape[0] == 0:
+            return df
+        info_df = self._fetch_info_df(df, parser, wait, concurrency, max_rps, parse_workers,
+                                      checkpoint)
+        return _merge_info(df, info_df)
+
+    def query_forest_stands(self, aoi, wait=None, concurrency=1, max_rps=None,
+                            parse_workers=None, checkpoint=None):
+        """Retrieves the forest stands (eraldised) and their information as a GeoDataFrame.
+
+        Parameters
+        ----------
+        aoi : str
+            A WKT string of the area of interest.
+        wait : float, optional
+            Fixed time to wait between running a subquery for each feature. Ignored if `max_rps`
+            is set. By default the rate is only limited by the adaptive throttling, which adjusts
+            it to the server's response times and errors.
+        concurrency : int
+            Number of information pages to fetch in parallel.
+        max_rps : float, optional
+            Maximum number of information page requests per second, shared by all parallel
+            fetches. Defaults to ``1 / wait`` if `wait` is set.
+        parse_workers : int or concurrent.futures.Executor, optional
+            Number of processes to parse the information pages in while the following pages are
+            being fetched, or an executor to submit the parsing to. By default the pages are
+            parsed right after fetching them.
+        checkpoint : str, optional
+            Path of a JSON Lines file to append every parsed information record to as soon as it
+            is available. Features already recorded in the file are not fetched again, which
+            allows resuming an interrupted query.
+
+        Returns
+        -------
+        geopandas.GeoDataFrame
+        """
+        return self._query_with_info(FOREST_STAND_LAYERS, aoi, _inventory_record, wait,
+                                     concurrency, max_rps, parse_workers, checkpoint)
+
+    def query_forest_notifications(self, aoi, wait=None, concurrency=1, max_rps=None,
+                                   parse_workers=None, checkpoint=None):
+        """Retrieves the forest notifications (metsateatised) and their information as a
+        GeoDataFrame.
+
+        Parameters
+        ----------
+        aoi : str
+            A WKT string of the area of interest.
+        wait : float, optional
+            Fixed time to wait between running a subquery for each feature. Ignored if `max_rps`
+            is set. By default the rate is only limited by the adaptive throttling, which adjusts
+            it to the server's response times and errors.
+        concurrency : int
+            Number of information pages to fetch in parallel.
+        max_rps : float, optional
+            Maximum number of information page requests per second, shared by all parallel
+            fetches. Defaults to ``1 / wait`` if `wait` is set.
+        parse_workers : int or concurrent.futures.Executor, optional
+            Number of processes to parse the information pages in while the following pages are
+            being fetched, or an executor to submit the parsing to. By default the pages are
+            parsed right after fetching them.
+        checkpoint : str, optional
+            Path of a JSON Lines file to append every parsed information record to as soon as it
+            is available. Features already recorded in the file are not fetched again, which
+            allows resuming an interrupted query.
+
+        Returns
+        -------
+        geopandas.GeoDataFrame
+        """
+        return self._query_with_info(FOREST_NOTIFICATION_LAYERS, aoi, _forest_notification_record,
+                                     wait, concurrency, max_rps, parse_workers, checkpoint)
+
+
+_default_client = Client()
+# The default client's session, kept for backwards compatibility
+session = _default_client.session
+
+
+def default_client():
+    """The client used by the module-level functions."""
+    return _default_client
+
+
+def get_layers(refresh=False):
+    """Returns the list of available layers as a dictionary of layer name -> layer ID.
+
+    See `Client.get_layers`.
+    """
+    return _default_client.get_layers(refresh)
+
+
+def iter_layer(aoi, layer_id=10, chunk_size=10000, compact=False):
+    """Return the features of the given layer that intersect with the given area of interest
+    in chunks of a fixed size.
+
+    See `Client.iter_layer`.
+    """
+    return _default_client.iter_layer(aoi, layer_id, chunk_size, compact)
+
+
+def query_layer(aoi, layer_id=10, compact=False):
+    """Return the features of the given layer that intersect with the given area of interest.
+
+    See `Client.query_layer`.
+    """
+    return _default_client.query_layer(aoi, layer_id, compact)
+
+
+def query_layers(aoi, layers, concurrency=None, split=False):
+    """Return the features of several layers that intersect with the given area of interest.
+
+    See `Client.query_layers`.
+    """
+    return _default_client.query_layers(aoi, layers, concurrency, split)
+
+
+def query_layer_tiled(aoi, layer_id=10, tile_size=5000, max_features=5000, max_depth=3,
+                      concurrency=4, max_rps=None):
+    """Return the features of the given layer that intersect with the given area of interest,
+    querying the area as a grid of smaller tiles.
+
+    See `Client.query_layer_tiled`.
+    """
+    return _default_client.query_layer_tiled(aoi, layer_id, tile_size, max_features, max_depth,
+                                             concurrency, max_rps)
+
+
+def get_info(url):
+    """Fetch the content of a feature's information page.
+
+    See `Client.get_info`.
+    """
+    return _default_client.get_info(url)
+
+
+def query_forest_stands(aoi, wait=None, concurrency=1, max_rps=None, parse_workers=None,
+                        checkpoint=None):
+    """Retrieves the forest stands (eraldised) and their information as a GeoDataFrame.
+
+    See `Client.query_forest_stands`.
+    """
+    return _default_client.query_forest_stands(aoi, wait, concurrency, max_rps, parse_workers,
+                                               checkpoint)
+
+
+def query_forest_notifications(aoi, wait=None, concurrency=1, max_rps=None, parse_workers=None,
+                               checkpoint=None):
+    """Retrieves the forest notifications (metsateatised) and their information as a
+    GeoDataFrame.
+
+    See `Client.query_forest_notifications`.
     """
-    return _query_with_info([10], aoi, parse_forest_notifications, wait)
+    return _default_client.query_forest_notifications(aoi, wait, concurrency, max_rps,
+                                                      parse_workers, checkpoint)
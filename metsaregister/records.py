@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+"""
+Columnar accumulation of the parsed information records.
+
+The parsers return the information of each feature as a plain dictionary. `RecordBuilder` collects
+the values of each field into a list and converts every column to its type once all records are
+in, instead of building a Series per feature and transposing an object DataFrame of them.
+"""
+
+from collections import OrderedDict
+
+from ._lazy import lazy_import
+from .schema import field
+from .tables import parse_decimal
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+_MISSING = ('', '-')
+
+
+def _is_missing(value):
+    return value is None or value != value or (isinstance(value, str) and value in _MISSING)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_))
+
+
+def _to_number(value):
+    if _is_number(value):
+        return value
+    if isinstance(value, str):
+        number = parse_decimal(value)
+        if number is not None:
+            return number
+    raise ValueError('Not a number: {!r}'.format(value))
+
+
+def _to_str(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return value if isinstance(value, str) else str(value)
+
+
+def _convert(values, type):
+    """Convert a column's values to a typed array. Raises ValueError if a value does not fit."""
+    present = [not _is_missing(v) for v in values]
+    complete = all(present)
+    if type == 'str':
+        return np.array([_to_str(v) if p else np.nan for v, p in zip(values, present)],
+                        dtype=object)
+    if type == 'bool':
+        if not complete or not all(isinstance(v, (bool, np.bool_)) for v in values):
+            raise ValueError('Not a boolean column')
+        return np.array(values, dtype=bool)
+    numbers = [_to_number(v) if p else np.nan for v, p in zip(values, present)]
+    if type == 'int':
+        if not all(float(n).is_integer() for n, p in zip(numbers, present) if p):
+            raise ValueError('Not an integer column')
+        if complete:
+            return np.array(numbers, dtype=np.int64)
+    return np.array(numbers, dtype=float)
+
+
+def _infer(values):
+    """Convert a column's values like pandas would infer their type: numbers to ints or floats,
+    booleans to bools and anything else to objects."""
+    present = [v for v in values if not _is_missing(v)]
+    if present and all(_is_number(v) for v in present):
+        return _convert(values, 'int' if all(float(v).is_integer() for v in present) else 'float')
+    if present and len(present) == len(values) and all(isinstance(v, (bool, np.bool_))
+                                                       for v in present):
+        return np.array(values, dtype=bool)
+    return np.array([v if not _is_missing(v) else np.nan for v in values], dtype=object)
+
+
+def json_default(value):
+    """
+    Serialize the values `json.dumps` cannot, for use as its ``default`` argument.
+
+    The values of the typed columns are numpy scalars, which are converted to the equivalent
+    Python values.
+    """
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(value).__name__))
+
+
+class RecordBuilder(object):
+    """
+    Collects information records into typed columns.
+
+    Fields missing from a record are treated as missing values. '-' and empty strings count as
+    missing as well.
+
+    Parameters
+    ----------
+    schema : OrderedDict, optional
+        The schema of the records (see `metsaregister.schema`) to take the types of the columns
+        from. Defaults to all known fields. The types of the other columns are inferred.
+    """
+
+    def __init__(self, schema=None):
+        self.schema = schema
+        self._ids = []
+        self._columns = OrderedDict()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def append(self, id, record):
+        """Add the record of the feature with the given ID."""
+        n = len(self._ids)
+        for name, value in record.items():
+            column = self._columns.get(name)
+            if column is None:
+                column = self._columns[name] = [None] * n
+            column.append(value)
+        self._ids.append(id)
+        if len(record) < len(self._columns):
+            for column in self._columns.values():
+                if len(column) == n:
+                    column.append(None)
+
+    def build(self):
+        """
+        Convert the collected records to a DataFrame indexed by the feature IDs, with the
+        columns in the order the fields were first seen.
+
+        Returns
+        -------
+        pandas.DataFrame
+        """
+        data = OrderedDict()
+        for name, values in self._columns.items():
+            f = field(name, self.schema)
+            type = f.type if f is not None else None
+            try:
+                data[name] = _convert(values, type) if type else _infer(values)
+            except ValueError:
+                # A value that does not fit the field's type, keep them all as they are
+                data[name] = _infer(values)
+        return pd.DataFrame(data, index=self._ids, columns=list(self._columns))
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+"""
+The known fields of the forest stand and notification information pages.
+
+Each schema maps the name of a field to its type and a converter from the text of its value on
+the page. The parsers convert the values of the known fields with their converter and fall back
+to inferring the type of the value for any other field. `RecordBuilder` converts the columns of
+the collected records to the fields' types and `dtypes` gives the resulting column dtypes.
+"""
+
+import re
+from collections import OrderedDict, namedtuple
+
+from .tables import NA_VALUES, convert_value, parse_decimal
+
+Field = namedtuple('Field', ['name', 'type', 'convert'])
+Field.__doc__ = """A field of an information page: its name, type ('str', 'int', 'float' or
+'bool') and a function converting the text of a value to the type."""
+
+# The dtypes of the columns of each field type. Integer columns with missing values are floats.
+DTYPES = {'str': 'object', 'int': 'int64', 'float': 'float64', 'bool': 'bool'}
+
+_nan = float('nan')
+
+
+def _to_str(text):
+    return _nan if text in NA_VALUES else text
+
+
+def _to_float(text):
+    number = parse_decimal(text.replace(' ', ''))
+    if number is not None:
+        return number
+    return _nan if text in NA_VALUES or text == '-' else text
+
+
+def _to_int(text):
+    number = _to_float(text)
+    if isinstance(number, float) and number.is_integer():
+        return int(number)
+    return number
+
+
+def _to_bool(text):
+    return {'True': True, 'False': False}.get(text, text)
+
+
+_converters = {'str': _to_str, 'int': _to_int, 'float': _to_float, 'bool': _to_bool}
+
+
+def _schema(fields):
+    return OrderedDict((name, Field(name, type, _converters[type])) for name, type in fields)
+
+
+# The stand information pages of a full forest inventory (täiskirjeldusega eraldis)
+FULL_INVENTORY = _schema([
+    ('Katastritunnus', 'str'),
+    ('Eraldise nr.', 'int'),
+    ('Kvartali nr.', 'str'),
+    ('Maakond', 'str'),
+    ('Vald', 'str'),
+    ('Üksus', 'str'),
+    ('Korraldaja', 'str'),
+    ('Taks. kpv', 'str'),
+    ('Otsuse kpv', 'str'),
+    ('Pindala (ha)', 'float'),
+    ('Baaskõrgus', 'float'),
+    ('Boniteet', 'str'),
+    ('Kuivendatud', 'str'),
+    ('Kasvukoht', 'str'),
+    ('Kaitsealuse ala pindala (ha)', 'float'),
+    ('Kõlviku liik', 'str'),
+    ('Kaitse põhjus', 'str'),
+    ('Arenguklass', 'str'),
+    ('Tuleohu klass', 'str'),
+    ('Täiskirjeldusega', 'bool'),
+    ('Pealiik', 'str'),
+    ('Kõrgus', 'float'),
+    ('Vanus', 'float'),
+])
+
+# The stand information pages of the general inventory data (üldised takseerandmed)
+SHORT_INVENTORY = _schema([
+    ('Maakond', 'str'),
+    ('Vald', 'str'),
+    ('Majandusüksus', 'str'),
+    ('Omandivorm', 'str'),
+    ('Katastritunnus', 'str'),
+    ('Kvartali nr.', 'str'),
+    ('Eraldise nr.', 'int'),
+    ('Pindala (ha)', 'float'),
+    ('Kaitsealuse ala pindala (ha)', 'float'),
+    ('Kasvukohatüüp', 'str'),
+    ('Korraldaja', 'str'),
+    ('Taks. aeg', 'str'),
+    ('Otsuse kpv', 'str'),
+    ('Täiskirjeldusega', 'bool'),
+    ('Pealiik', 'str'),
+    ('Kõrgus', 'float'),
+    ('Vanus', 'float'),
+])
+
+# The fields of both kinds of stand information pages
+FOREST_STANDS = OrderedDict(FULL_INVENTORY)
+FOREST_STANDS.update((name, field) for name, field in SHORT_INVENTORY.items()
+                     if name not in FULL_INVENTORY)
+
+FOREST_NOTIFICATIONS = _schema([
+    ('Maakond', 'str'),
+    ('Vald', 'str'),
+    ('Majandusüksus', 'str'),
+    ('Reg. nr.', 'str'),
+    ('Registreeritud kpv', 'str'),
+    ('Kehtiv alates', 'str'),
+    ('Katastri nr', 'str'),
+    ('Kvartal', 'str'),
+    ('Eraldis', 'int'),
+    ('Pindala (ha)', 'float'),
+    ('Töö', 'str'),
+    ('Luba', 'str'),
+    ('Maht (tm)', 'float'),
+    ('Seemnepuid', 'float'),
+])
+
+# The share, height and age of each tree species of the first tree level, e.g. 'kask %'
+SPECIES_FIELD_RE = re.compile(r' [%HA]$')
+
+_all_fields = OrderedDict(FOREST_STANDS)
+_all_fields.update(FOREST_NOTIFICATIONS)
+_species_field = Field(None, 'float', _to_float)
+
+
+def field(name, schema=None):
+    """
+    Look up a field by its name.
+
+    Parameters
+    ----------
+    name : str
+        The name of the field.
+    schema : OrderedDict, optional
+        The schema to look the field up in. Defaults to all known fields.
+
+    Returns
+    -------
+    Field or None
+        None if the field is not known, in which case its type is inferred from its values.
+    """
+    result = (_all_fields if schema is None else schema).get(name)
+    if result is None and SPECIES_FIELD_RE.search(name):
+        result = _species_field._replace(name=name)
+    return result
+
+
+def convert(name, text, schema=None):
+    """Convert the text of a field's value with the field's converter or, if the field is not
+    known, like `metsaregister.tables.convert_value` does."""
+    f = field(name, schema)
+    return f.convert(text) if f is not None else convert_value(text)
+
+
+def dtypes(schema):
+    """The dtypes of the columns of a schema's fields in a DataFrame built by `RecordBuilder`."""
+    return OrderedDict((name, DTYPES[f.type]) for name, f in schema.items())
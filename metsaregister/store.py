@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+"""
+A local store of the features of previously queried areas.
+
+Every layer query result is stored along with the area it covers. A later query of an area that
+has already been covered within the time-to-live is answered from the store by spatial filtering
+and only the part of the area that has not been covered yet is queried from the server.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from ._lazy import lazy_import
+from .records import json_default
+
+gpd = lazy_import('geopandas')
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+shapely = lazy_import('shapely')
+
+DEFAULT_TTL = 24 * 3600
+
+# Parts of an area left uncovered by previous queries that are smaller than this many square
+# metres are considered covered. Such slivers are left over from floating point inaccuracies of
+# the geometry operations.
+MIN_AREA = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS features (
+    layer_id INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    attributes TEXT NOT NULL,
+    geometry BLOB NOT NULL,
+    stored REAL NOT NULL,
+    PRIMARY KEY (layer_id, id)
+);
+CREATE TABLE IF NOT EXISTS coverage (
+    layer_id INTEGER NOT NULL,
+    area BLOB NOT NULL,
+    stored REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS coverage_layer ON coverage (layer_id, stored);
+"""
+
+
+def _polygonal(geometry):
+    """The polygons of a geometry, dropping any points and lines."""
+    if geometry.geom_type in ('Polygon', 'MultiPolygon'):
+        return geometry
+    parts = [g for g in getattr(geometry, 'geoms', [])
+             if g.geom_type in ('Polygon', 'MultiPolygon')]
+    return shapely.ops.unary_union(parts) if parts else shapely.geometry.Polygon()
+
+
+class _Layer(object):
+    """The fresh stored features of a layer with a spatial index and the area they cover."""
+
+    def __init__(self, ids, attributes, geometries, covered, expires):
+        self.ids = ids
+        self.attributes = attributes
+        self.geometries = geometries
+        self.covered = covered
+        self.expires = expires
+        self.tree = shapely.strtree.STRtree(geometries)
+
+    def intersecting(self, geometry):
+        """Positions of the features intersecting the geometry, in the order they were stored."""
+        if not hasattr(shapely, 'from_wkb'):  # Shapely < 2.0
+            candidates = self.tree.query(geometry)
+            ids = set(id(g) for g in candidates if g.intersects(geometry))
+            return [i for i, g in enumerate(self.geometries) if id(g) in ids]
+        return sorted(self.tree.query(geometry, predicate='intersects'))
+
+
+class FeatureStore(object):
+    """
+    A SQLite-backed store of layer query results and the areas they cover.
+
+    Parameters
+    ----------
+    path : str
+        Directory to store the database in. Created if it does not exist.
+    ttl : float, optional
+        Time in seconds the features of a covered area are used without querying the server
+        again. Defaults to a day.
+    """
+
+    def __init__(self, path, ttl=None):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.path = path
+        self.ttl = DEFAULT_TTL if ttl is None else ttl
+        self._lock = threading.RLock()
+        self._layers = {}
+        self._db = sqlite3.connect(os.path.join(path, 'features.sqlite'),
+                                   check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    def _layer(self, layer_id):
+        with self._lock:
+            layer = self._layers.get(layer_id)
+            if layer is not None and layer.expires > time.time():
+                return layer
+            since = time.time() - self.ttl
+            areas = self._db.execute(
+                "SELECT area, stored FROM coverage WHERE layer_id = ? AND stored > ?",
+                (layer_id, since)
+            ).fetchall()
+            rows = self._db.execute(
+                "SELECT id, attributes, geometry FROM features WHERE layer_id = ? "
+                "ORDER BY rowid", (layer_id,)
+            ).fetchall()
+        covered = shapely.ops.unary_union([shapely.wkb.loads(bytes(area)) for area, _ in areas])
+        # Reload once the oldest covered area expires
+        expires = min(stored for _, stored in areas) + self.ttl if areas else float('inf')
+        geometries = np.empty(len(rows), dtype=object)
+        for i, row in enumerate(rows):
+            geometries[i] = shapely.wkb.loads(bytes(row[2]))
+        layer = _Layer([row[0] for row in rows],
+                       [json.loads(row[1], object_pairs_hook=OrderedDict) for row in rows],
+                       geometries, covered, expires)
+        with self._lock:
+            self._layers[layer_id] = layer
+        return layer
+
+    def uncovered(self, layer_id, geometry):
+        """
+        The part of an area that has not been covered by fresh layer queries.
+
+        Parameters
+        ----------
+        layer_id : int
+            ID number of the layer.
+        geometry : shapely.geometry.base.BaseGeometry
+            The area of interest.
+
+        Returns
+        -------
+        shapely.geometry.base.BaseGeometry or None
+            None if the whole area has been covered.
+        """
+        covered = self._layer(layer_id).covered
+        remainder = _polygonal(geometry.difference(covered)) if not covered.is_empty else geometry
+        if remainder.is_empty or remainder.area < MIN_AREA:
+            return None
+        return remainder
+
+    def query(self, layer_id, geometry, crs=None):
+        """
+        Return the stored features of the layer that intersect with the area.
+
+        Parameters
+        ----------
+        layer_id : int
+            ID number of the layer.
+        geometry : shapely.geometry.base.BaseGeometry
+            The area of interest.
+        crs : optional
+            Coordinate reference system of the returned GeoDataFrame.
+
+        Returns
+        -------
+        geopandas.GeoDataFrame
+        """
+        layer = self._layer(layer_id)
+        found = layer.intersecting(geometry)
+        if not found:
+            return gpd.GeoDataFrame(crs=crs)
+        df = pd.DataFrame([layer.attributes[i] for i in found],
+                          index=pd.Index([layer.ids[i] for i in found], name='id'))
+        return gpd.GeoDataFrame(df, crs=crs, geometry=layer.geometries[found])
+
+    def put(self, layer_id, geometry, gdf):
+        """
+        Store the result of a layer query covering the given area.
+
+        Previously stored features intersecting the area that are missing from the result are
+        removed.
+
+        Parameters
+        ----------
+        layer_id : int
+            ID number of the layer.
+        geometry : shapely.geometry.base.BaseGeometry
+            The area that was queried.
+        gdf : geopandas.GeoDataFrame
+            The features returned by the server for the area.
+        """
+        now = time.time()
+        layer = self._layer(layer_id)
+        current = set(gdf.index)
+        removed = [(layer_id, layer.ids[i]) for i in layer.intersecting(geometry)
+                   if layer.ids[i] not in current]
+        rows = []
+        if len(gdf) > 0:
+            attributes = pd.DataFrame(gdf.drop(gdf.geometry.name, axis=1)).astype(object)
+            attributes = attributes.where(attributes.notnull(), None)
+            for id, values, g in zip(gdf.index, attributes.to_dict('records'), gdf.geometry):
+                rows.append((layer_id, str(id), json.dumps(values, default=json_default),
+                             sqlite3.Binary(g.wkb), now))
+        with self._lock:
+            self._db.executemany("DELETE FROM features WHERE layer_id = ? AND id = ?", removed)
+            self._db.executemany("INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.execute("DELETE FROM coverage WHERE layer_id = ? AND stored <= ?",
+                             (layer_id, now - self.ttl))
+            self._db.execute("INSERT INTO coverage VALUES (?, ?, ?)",
+                             (layer_id, sqlite3.Binary(geometry.wkb), now))
+            self._db.commit()
+            self._layers.pop(layer_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM features")
+            self._db.execute("DELETE FROM coverage")
+            self._db.commit()
+            self._layers.clear()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+"""Incremental updating of previously queried forest stands and notifications."""
+
+import hashlib
+from collections import OrderedDict
+
+from ._lazy import lazy_import
+from .metsaregister import (FOREST_NOTIFICATION_LAYERS, FOREST_STAND_LAYERS, _merge_info,
+                            _forest_notification_record, _inventory_record, default_client)
+from .records import RecordBuilder
+from .writers import guess_format
+
+gpd = lazy_import('geopandas')
+pd = lazy_import('pandas')
+shapely = lazy_import('shapely')
+
+# Number of decimals of the coordinates compared, in metres. File formats store the coordinates
+# with differing precision.
+PRECISION = 3
+
+
+def _normalized(geometry):
+    """The geometry in a canonical form that survives being saved to any of the output formats.
+
+    GeoPackage and FlatGeobuf files store all polygons as multipolygons, so single-part
+    multipolygons are converted to polygons, and the order of the rings and their vertices is
+    normalized."""
+    if geometry.geom_type.startswith('Multi') and len(geometry.geoms) == 1:
+        geometry = geometry.geoms[0]
+    if hasattr(geometry, 'normalize'):  # Shapely >= 2.0
+        geometry = geometry.normalize()
+    return geometry
+
+
+def geometry_hashes(geometries):
+    """Return a hash of each geometry's normalized WKT representation with the coordinates
+    rounded to `PRECISION` decimals."""
+    return [hashlib.sha1(shapely.wkt.dumps(_normalized(g), rounding_precision=PRECISION)
+                         .encode('ascii')).hexdigest() if g is not None else None
+            for g in geometries]
+
+
+def _read_previous(previous):
+    if isinstance(previous, gpd.GeoDataFrame):
+        return previous
+    if guess_format(previous) == 'geoparquet':
+        gdf = gpd.read_parquet(previous)
+    else:
+        gdf = gpd.read_file(previous)
+    if 'id' in gdf.columns:
+        gdf = gdf.set_index('id')
+    return gdf
+
+
+def _sync(layer_ids, previous, aoi, parser, wait, concurrency, max_rps, parse_workers, client):
+    client = client or default_client()
+    previous = _read_previous(previous)
+    previous.index = previous.index.astype(str)
+    current = client._query_layers(layer_ids, aoi)
+    current_hashes = dict(zip(current.index, geometry_hashes(current.geometry)))
+    previous_hashes = dict(zip(previous.index, geometry_hashes(previous.geometry)))
+
+    changes = OrderedDict()
+    changes['added'] = [id for id in current.index if id not in previous_hashes]
+    changes['removed'] = [id for id in previous.index if id not in current_hashes]
+    changes['modified'] = [id for id in current.index if id in previous_hashes and
+                           current_hashes[id] != previous_hashes[id]]
+    if current.shape[0] == 0:
+        return current, changes
+
+    unchanged = [id for id in current.index if previous_hashes.get(id) == current_hashes[id]]
+    info_columns = [c for c in previous.columns if c not in current.columns]
+    info_dfs = [previous.loc[unchanged, info_columns]]
+    changed = current.loc[changes['added'] + changes['modified']]
+    if changed.shape[0] > 0:
+        info_dfs.append(client._fetch_info_df(changed, parser, wait, concurrency, max_rps,
+                                              parse_workers))
+    # The columns read from a file may have lost their types, convert them again like
+    # `query_forest_stands` does
+    info_df = pd.concat(info_dfs)
+    records = RecordBuilder()
+    for id, record in zip(info_df.index, info_df.to_dict('records')):
+        records.append(id, record)
+    return _merge_info(current, records.build()), changes
+
+
+def sync_forest_stands(previous, aoi, wait=None, concurrency=1, max_rps=None,
+                       parse_workers=None, client=None):
+    """
+    Update a previous result of `query_forest_stands` for the given area of interest.
+
+    The information pages are only fetched for stands that are new or whose geometry has
+    changed since the previous query.
+
+    Parameters
+    ----------
+    previous : geopandas.GeoDataFrame or str
+        The previous result or the path of a file it was saved to.
+    aoi : str
+        A WKT string of the area of interest.
+    wait, concurrency, max_rps, parse_workers
+        As in `query_forest_stands`.
+    client : metsaregister.Client, optional
+        The client to query the server with. Defaults to the module's default client.
+
+    Returns
+    -------
+    merged : geopandas.GeoDataFrame
+        The up-to-date forest stands.
+    changes : OrderedDict
+        The IDs of the 'added', 'removed' and 'modified' stands.
+    """
+    return _sync(FOREST_STAND_LAYERS, previous, aoi, _inventory_record, wait, concurrency,
+                 max_rps, parse_workers, client)
+
+
+def sync_forest_notifications(previous, aoi, wait=None, concurrency=1, max_rps=None,
+                              parse_workers=None, client=None):
+    """
+    Update a previous result of `query_forest_notifications` for the given area of interest.
+
+    The information pages are only fetched for notifications that are new or whose geometry has
+    changed since the previous query.
+
+    Parameters
+    ----------
+    previous : geopandas.GeoDataFrame or str
+        The previous result or the path of a file it was saved to.
+    aoi : str
+        A WKT string of the area of interest.
+    wait, concurrency, max_rps, parse_workers
+        As in `query_forest_notifications`.
+    client : metsaregister.Client, optional
+        The client to query the server with. Defaults to the module's default client.
+
+    Returns
+    -------
+    merged : geopandas.GeoDataFrame
+        The up-to-date forest notifications.
+    changes : OrderedDict
+        The IDs of the 'added', 'removed' and 'modified' notifications.
+    """
+    return _sync(FOREST_NOTIFICATION_LAYERS, previous, aoi, _forest_notification_record, wait,
+                 concurrency, max_rps, parse_workers, client)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+"""
+Reading of the HTML tables on the server's information pages.
+
+The values are converted the same way ``pandas.read_html(..., thousands=' ', decimal=',')`` would
+convert them, but the page is only parsed once and no DataFrames are built in the process.
+"""
+
+import re
+from collections import OrderedDict
+
+import lxml.html
+
+# Strings pandas treats as missing values by default
+NA_VALUES = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+             '1.#QNAN', 'N/A', 'NA', 'NULL', 'NaN', 'n/a', 'nan', 'null'}
+
+_whitespace_re = re.compile(r'[\r\n]+|\s{2,}')
+# Anything but the characters that can make up a number with ' ' and ',' as the thousands and
+# decimal separators
+_non_numeric_re = re.compile(r'[^-0-9 ,]')
+_int_re = re.compile(r'[+-]?\d+$')
+_float_re = re.compile(r'[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?$')
+
+
+def parse_tables(info):
+    """Parse an information page and return all of its tables in document order."""
+    root = lxml.html.fromstring(info)
+    return list(root.iter('table'))
+
+
+def _is_skipped(elem):
+    # Nested tables are read separately and the colspan="2" headers only contain group titles
+    return (elem.tag == 'table' or not isinstance(elem.tag, str) or
+            (elem.tag == 'th' and elem.get('colspan') == '2'))
+
+
+def table_text(elem):
+    """Return the text content of an element, excluding any nested tables, group headers and
+    comments."""
+    parts = [elem.text or '']
+    for child in elem:
+        if not _is_skipped(child):
+            parts.append(table_text(child))
+        parts.append(child.tail or '')
+    return ''.join(parts)
+
+
+def _cell_text(cell):
+    if len(cell) == 0:
+        text = cell.text or ''
+    else:
+        text = table_text(cell)
+    return _whitespace_re.sub(' ', text.strip())
+
+
+def table_rows(table):
+    """Return the text of the cells of the table's own rows, skipping empty rows."""
+    rows = []
+    for child in table:
+        if child.tag == 'tr':
+            trs = [child]
+        elif child.tag in ('thead', 'tbody', 'tfoot'):
+            trs = [tr for tr in child if tr.tag == 'tr']
+        else:
+            continue
+        for tr in trs:
+            row = [_cell_text(cell) for cell in tr
+                   if cell.tag in ('td', 'th') and not _is_skipped(cell)]
+            if len(row) > 1 or (len(row) == 1 and row[0]):
+                rows.append(row)
+    return rows
+
+
+def _normalize_number(value):
+    if (' ' in value or ',' in value) and not _non_numeric_re.search(value):
+        return value.replace(' ', '').replace(',', '.')
+    return value
+
+
+def convert_column(values, infer=True):
+    """
+    Convert the text values of a table column to Python values the way pandas would.
+
+    Missing values become NaN. If `infer` is set and all of the other values are numbers, they are
+    converted to ints or, if there are missing values or fractions, to floats.
+    """
+    nan = float('nan')
+    values = [None if v is None or v in NA_VALUES else _normalize_number(v) for v in values]
+    if infer:
+        present = [v for v in values if v is not None]
+        if len(present) == len(values) and all(_int_re.match(v) for v in present):
+            return [int(v) for v in values]
+        if all(_float_re.match(v) for v in present):
+            return [nan if v is None else float(v) for v in values]
+    return [nan if v is None else v for v in values]
+
+
+def convert_value(value):
+    """Convert the text of a single value the way `convert_column` would."""
+    return convert_column([value])[0]
+
+
+def read_key_values(table, schema=None):
+    """
+    Read a two-column table of keys and values into a dictionary.
+
+    Without a `schema` the values are converted like a table column. Otherwise the values of the
+    fields in the schema (see `metsaregister.schema`) are converted with the fields' converters and
+    the others one by one with `convert_value`.
+    """
+    rows = table_rows(table)
+    if schema is None:
+        keys = [row[0] for row in rows]
+        values = convert_column([row[1] if len(row) > 1 else None for row in rows])
+        return OrderedDict(zip(keys, values))
+    result = OrderedDict()
+    for row in rows:
+        key = row[0]
+        text = row[1] if len(row) > 1 else None
+        field = schema.get(key)
+        if field is None or text is None:
+            result[key] = convert_value(text)
+        else:
+            result[key] = field.convert(text)
+    return result
+
+
+def read_table(table, raw_columns=(), schema=None):
+    """
+    Read a table with a header row into a dictionary of column name -> list of values.
+
+    Values in the columns listed in `raw_columns` are kept as strings. The values of the columns
+    in `schema` are converted with the fields' converters.
+    """
+    rows = table_rows(table)
+    if not rows:
+        return OrderedDict()
+    header, rows = rows[0], rows[1:]
+    columns = OrderedDict()
+    for i, name in enumerate(header):
+        values = [row[i] if i < len(row) else None for row in rows]
+        field = schema.get(name) if schema is not None else None
+        if field is not None:
+            columns[name] = [convert_value(v) if v is None else field.convert(v) for v in values]
+        else:
+            columns[name] = convert_column(values, infer=name not in raw_columns)
+    return columns
+
+
+def parse_decimal(value):
+    """Parse a number formatted in the Estonian locale, e.g. '25,5'. Returns None for
+    anything but a number."""
+    value = value.replace(u'\xa0', '').replace(',', '.')
+    if _float_re.match(value):
+        return float(value)
+    return None
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+"""
+Adaptive request throttling and retrying.
+
+Every host gets an `AdaptiveThrottle` that limits the number of concurrent requests and paces
+them at a rate adapted to the server's health in AIMD fashion: the rate grows additively while
+responses arrive quickly and is cut multiplicatively on server errors, timeouts and slow
+responses. Retry-After headers pause all requests to the host for the requested time.
+"""
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import mktime_tz, parsedate_tz
+
+import requests
+from six.moves.urllib.parse import urlsplit
+
+from .metrics import metrics
+
+try:
+    from time import monotonic
+except ImportError:
+    from time import time as monotonic
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Differences between response times shorter than this are just noise
+_MIN_LATENCY = 0.1
+
+# Weight of the latest response time in the moving average of the response times
+_LATENCY_SMOOTHING = 0.1
+
+# Time the current thread has waited for other limits before its next request
+_pending_wait = threading.local()
+
+
+def add_wait(seconds):
+    """Count time spent waiting for another limit, e.g. a `metsaregister.RateLimiter`, towards
+    the 'throttle_wait' of the current thread's next request, which is recorded once the request
+    has passed its throttle."""
+    _pending_wait.seconds = getattr(_pending_wait, 'seconds', 0.0) + seconds
+
+
+class ServerError(RuntimeError):
+    """The server responded with an error message instead of the requested data."""
+
+
+def is_retryable(exc):
+    """Whether an error is a temporary failure that a later retry could fix."""
+    if isinstance(exc, requests.HTTPError):
+        return exc.response is not None and exc.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(exc, (ServerError, requests.ConnectionError, requests.Timeout,
+                            requests.exceptions.ChunkedEncodingError))
+
+
+def retry_after(exc):
+    """The delay in seconds requested by the Retry-After header of an error response, if any."""
+    response = getattr(exc, 'response', None)
+    if response is None or 'Retry-After' not in response.headers:
+        return None
+    value = response.headers['Retry-After'].strip()
+    if value.isdigit():
+        return float(value)
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    return max(0.0, mktime_tz(date) - time.time())
+
+
+class AdaptiveThrottle(object):
+    """
+    Limits the rate and concurrency of the requests sent to a single host.
+
+    Parameters
+    ----------
+    initial_rps : float
+        Requests per second to start with.
+    min_rps, max_rps : float
+        Bounds of the adapted rate.
+    max_concurrency : int
+        Maximum number of requests in flight at the same time.
+    increase : float
+        Requests per second added to the rate after each fast successful response.
+    decrease : float
+        Factor the rate is multiplied by after a failure or a slow response.
+    slow_factor : float
+        Responses taking longer than this many times the moving average of the recent response
+        times of the same kind count as a sign of an overloaded server.
+    """
+
+    def __init__(self, initial_rps=2.0, min_rps=0.1, max_rps=20.0, max_concurrency=4,
+                 increase=0.1, decrease=0.5, slow_factor=4.0):
+        self.rate = initial_rps
+        self.min_rps = min_rps
+        self.max_rps = max_rps
+        self.max_concurrency = max_concurrency
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_factor = slow_factor
+        self._cond = threading.Condition()
+        self._active = 0
+        self._next = monotonic()
+        self._typical_latency = {}
+        self._last_decrease = None
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        start = monotonic()
+        self._acquire()
+        waited = monotonic() - start + getattr(_pending_wait, 'seconds', 0.0)
+        _pending_wait.seconds = 0.0
+        metrics.observe('throttle_wait', waited)
+
+    def _acquire(self):
+        with self._cond:
+            while self._active >= self.max_concurrency:
+                self._cond.wait()
+            delay = self._reserve()
+        if delay > 0:
+            try:
+                time.sleep(delay)
+            except BaseException:
+                self.release()
+                raise
+
+    def _reserve(self):
+        # Called with the lock held
+        self._active += 1
+        now = monotonic()
+        start = max(now, self._next)
+        self._next = start + 1.0 / self.rate
+        return start - now
+
+    def try_acquire(self):
+        """
+        Take a request slot without blocking, for callers that cannot block such as the
+        asynchronous API. The slot is given back with `release`.
+
+        Returns
+        -------
+        float or None
+            The time in seconds to wait before sending the request or None if `max_concurrency`
+            requests are in flight already.
+        """
+        with self._cond:
+            if self._active >= self.max_concurrency:
+                return None
+            return self._reserve()
+
+    def release(self, latency=None, error=None, kind=None):
+        """Report the outcome of a request of the given kind started with `acquire`."""
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+            if error is not None:
+                if is_retryable(error):
+                    self._backoff(retry_after(error))
+            elif latency is not None:
+                # Compared with an exponentially weighted moving average rather than the fastest
+                # response, which ordinary jitter would exceed several times over
+                typical = self._typical_latency.get(kind, latency)
+                self._typical_latency[kind] = typical + _LATENCY_SMOOTHING * (latency - typical)
+                if latency > self.slow_factor * max(typical, _MIN_LATENCY):
+                    self._backoff()
+                else:
+                    self.rate = min(self.max_rps, self.rate + self.increase)
+
+    def backoff(self, retry_after=None):
+        """Slow down after a failure detected outside of `request`, e.g. in a response body."""
+        with self._cond:
+            self._backoff(retry_after)
+
+    def _backoff(self, delay=None):
+        now = monotonic()
+        if delay:
+            self._next = max(self._next, now + delay)
+        # A burst of failures from requests that were sent at the same time only counts once
+        if self._last_decrease is None or now - self._last_decrease > 1.0 / self.rate:
+            self.rate = max(self.min_rps, self.rate * self.decrease)
+            self._last_decrease = now
+
+    @contextmanager
+    def request(self, kind=None):
+        """Context manager wrapping a single request to the host. Latencies are only compared
+        between requests of the same kind."""
+        self.acquire()
+        start = monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.release(error=e, kind=kind)
+            raise
+        except BaseException:
+            # E.g. KeyboardInterrupt, give the slot back without judging the server by it
+            self.release(kind=kind)
+            raise
+        self.release(latency=monotonic() - start, kind=kind)
+
+
+_throttles = {}
+_throttle_settings = {}
+_throttles_lock = threading.Lock()
+
+
+def throttle_for(url):
+    """Return the shared throttle of the host of the given URL."""
+    host = urlsplit(url).netloc
+    with _throttles_lock:
+        if host not in _throttles:
+            _throttles[host] = AdaptiveThrottle(**_throttle_settings)
+        return _throttles[host]
+
+
+def configure_throttle(**settings):
+    """
+    Set the parameters of the adaptive throttling, see `AdaptiveThrottle` for the available
+    settings. Resets the state of the throttles of all hosts.
+    """
+    with _throttles_lock:
+        _throttle_settings.clear()
+        _throttle_settings.update(settings)
+        _throttles.clear()
+
+
+def retry(func=None, max_delay=30, initial_wait=1):
+    """
+    Decorator retrying a function with exponentially increasing waits, but only on errors for
+    which `is_retryable` holds. A Retry-After header of the error response overrides the wait.
+    Gives up once the next retry would start more than `max_delay` seconds after the first
+    attempt.
+    """
+    if func is None:
+        return functools.partial(retry, max_delay=max_delay, initial_wait=initial_wait)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = monotonic()
+        wait = initial_wait
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                delay = max(wait, retry_after(e) or 0)
+                if monotonic() - start + delay > max_delay:
+                    raise
+                metrics.increment('retries')
+                time.sleep(delay)
+                wait *= 2
+
+    return wrapper
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+"""Splitting of large areas of interest into smaller tiles, see `Client.query_layer_tiled`."""
+
+from ._lazy import lazy_import
+
+shapely = lazy_import('shapely')
+
+
+def _polygonal(geometry):
+    """Drop any points or lines left over from intersecting tiles with the AOI."""
+    if geometry.geom_type in ('Polygon', 'MultiPolygon'):
+        return geometry
+    parts = [g for g in getattr(geometry, 'geoms', [])
+             if g.geom_type in ('Polygon', 'MultiPolygon')]
+    # An empty polygon, not a degenerate one like box(0, 0, 0, 0), for tiles only touching the AOI
+    return shapely.ops.unary_union(parts) if parts else shapely.geometry.Polygon()
+
+
+def grid_tiles(geometry, tile_size):
+    """Split a geometry along a regular grid with the given cell size in metres."""
+    minx, miny, maxx, maxy = geometry.bounds
+    tiles = []
+    y = miny
+    while y < maxy:
+        x = minx
+        while x < maxx:
+            cell = shapely.geometry.box(x, y, x + tile_size, y + tile_size)
+            tile = _polygonal(cell.intersection(geometry))
+            if not tile.is_empty:
+                tiles.append(tile)
+            x += tile_size
+        y += tile_size
+    return tiles
+
+
+def split_tile(tile):
+    """Split a tile into quadrants."""
+    minx, miny, maxx, maxy = tile.bounds
+    midx = (minx + maxx) / 2
+    midy = (miny + maxy) / 2
+    box = shapely.geometry.box
+    quadrants = [box(minx, miny, midx, midy), box(midx, miny, maxx, midy),
+                 box(minx, midy, midx, maxy), box(midx, midy, maxx, maxy)]
+    tiles = [_polygonal(q.intersection(tile)) for q in quadrants]
+    return [t for t in tiles if not t.is_empty]
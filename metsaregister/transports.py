@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+"""
+Alternative transports for `metsaregister.Client`.
+
+`HTTPXAdapter` sends the requests of a requests session with httpx, which adds HTTP/2 support.
+httpx (and h2 for HTTP/2) is only required when the adapter is used.
+"""
+
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+@contextmanager
+def translate_errors(httpx, request=None):
+    """Raise httpx's connection and timeout errors as their requests counterparts."""
+    try:
+        yield
+    except httpx.ConnectTimeout as e:
+        raise requests.ConnectTimeout(e, request=request)
+    except httpx.TimeoutException as e:
+        raise requests.ReadTimeout(e, request=request)
+    except httpx.TransportError as e:
+        raise requests.ConnectionError(e, request=request)
+
+
+def to_requests_response(response, request=None):
+    """Convert the status and headers of an httpx response to a requests.Response."""
+    r = requests.Response()
+    r.status_code = response.status_code
+    r.reason = response.reason_phrase
+    r.headers = CaseInsensitiveDict(response.headers)
+    # httpx decodes the body itself
+    r.headers.pop('Content-Encoding', None)
+    r.encoding = get_encoding_from_headers(r.headers)
+    r.url = str(response.url)
+    r.request = request
+    return r
+
+
+class _StreamedBody(object):
+    """Exposes a streamed httpx response body the way requests expects a urllib3 response."""
+
+    def __init__(self, response):
+        self._response = response
+        self._chunks = None
+
+    def stream(self, chunk_size=2 ** 16, decode_content=True):
+        for chunk in self._response.iter_bytes(chunk_size):
+            yield chunk
+
+    def read(self, amt=None):
+        if amt is None:
+            return self._response.read()
+        if self._chunks is None:
+            self._chunks = self._response.iter_bytes(amt)
+        return next(self._chunks, b'')
+
+    def close(self):
+        self._response.close()
+
+    def release_conn(self):
+        self._response.close()
+
+
+class HTTPXAdapter(BaseAdapter):
+    """
+    A requests transport adapter sending the requests with an httpx client.
+
+    Parameters
+    ----------
+    http2 : bool
+        Use HTTP/2 if the server supports it. Requires the h2 package.
+    pool_size : int
+        Maximum number of connections kept open.
+    **kwargs
+        Further arguments for ``httpx.Client``.
+    """
+
+    def __init__(self, http2=True, pool_size=10, **kwargs):
+        import httpx
+        super(HTTPXAdapter, self).__init__()
+        self._httpx = httpx
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self.client = httpx.Client(http2=http2, limits=limits, **kwargs)
+
+    def _timeout(self, timeout):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return self._httpx.Timeout(read, connect=connect)
+        return self._httpx.Timeout(timeout)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        httpx = self._httpx
+        outgoing = self.client.build_request(request.method, request.url,
+                                             headers=dict(request.headers), content=request.body,
+                                             timeout=self._timeout(timeout))
+        with translate_errors(httpx, request):
+            response = self.client.send(outgoing, stream=stream)
+        r = to_requests_response(response, request)
+        r.connection = self
+        r.raw = _StreamedBody(response)
+        if not stream:
+            r._content = response.read()
+        return r
+
+    def close(self):
+        self.client.close()
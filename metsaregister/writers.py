@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+"""
+Writers for saving query results incrementally, one GeoDataFrame chunk at a time.
+
+GeoJSON is written by streaming the features one by one, GeoPackage with GeoDataFrame.to_file()
+in append mode and GeoParquet with pyarrow, which is only required for that format. FlatGeobuf
+files cannot be appended to, so the chunks are collected and written once the writer is closed.
+"""
+
+import io
+import json
+import os
+import warnings
+
+from ._lazy import lazy_import
+from .metrics import metrics
+from .records import json_default
+
+pd = lazy_import('pandas')
+
+FORMATS = ['geojson', 'geoparquet', 'flatgeobuf', 'gpkg']
+
+# The extension of newly created files of each format
+EXTENSIONS = {
+    'geojson': '.geojson',
+    'geoparquet': '.parquet',
+    'flatgeobuf': '.fgb',
+    'gpkg': '.gpkg',
+}
+
+_extensions = {
+    '.geojson': 'geojson',
+    '.json': 'geojson',
+    '.parquet': 'geoparquet',
+    '.geoparquet': 'geoparquet',
+    '.fgb': 'flatgeobuf',
+    '.gpkg': 'gpkg',
+}
+
+_drivers = {
+    'flatgeobuf': 'FlatGeobuf',
+    'gpkg': 'GPKG',
+}
+
+# Drivers that do not support appending to an existing file
+_no_append = {'FlatGeobuf'}
+
+# The server only uses the L-EST97 coordinate system
+EPSG = 3301
+
+
+def guess_format(path):
+    """Guess the output format from a file name, defaulting to GeoJSON."""
+    return _extensions.get(os.path.splitext(path)[1].lower(), 'geojson')
+
+
+def open_writer(path, format=None):
+    """
+    Open a writer for saving GeoDataFrames to a file chunk by chunk.
+
+    Parameters
+    ----------
+    path : str
+        The output file.
+    format : str, optional
+        One of 'geojson', 'geoparquet', 'flatgeobuf' or 'gpkg'. Guessed from the file extension
+        by default.
+
+    Returns
+    -------
+    GeoJSONWriter or GeoParquetWriter or OGRWriter
+        A writer with `write(gdf)` and `close()` methods, usable as a context manager.
+    """
+    if format is None:
+        format = guess_format(path)
+    if format == 'geojson':
+        return GeoJSONWriter(path)
+    if format == 'geoparquet':
+        return GeoParquetWriter(path)
+    if format in _drivers:
+        return OGRWriter(path, _drivers[format])
+    raise ValueError('Unknown output format: {}. Must be one of {}.'.format(
+        format, ', '.join(FORMATS)))
+
+
+class _Writer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class GeoJSONWriter(_Writer):
+    """Streams features to a GeoJSON FeatureCollection without building it in memory."""
+
+    def __init__(self, path):
+        self._file = io.open(path, 'w', encoding='utf8')
+        self._file.write(u'{"type": "FeatureCollection", "crs": {"type": "name", "properties": '
+                         u'{"name": "urn:ogc:def:crs:EPSG::%d"}}, "features": [' % EPSG)
+        self._first = True
+
+    @metrics.timed('write')
+    def write(self, gdf):
+        for feature in gdf.iterfeatures(na='null'):
+            if not self._first:
+                self._file.write(u',\n')
+            self._first = False
+            self._file.write(json.dumps(feature, default=json_default, ensure_ascii=False))
+
+    @metrics.timed('write')
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.write(u']}\n')
+        self._file.close()
+
+
+class OGRWriter(_Writer):
+    """Writes chunks to a file in any format supported by GeoDataFrame.to_file(), appending
+    them one by one if the format allows it."""
+
+    def __init__(self, path, driver):
+        self.path = path
+        self.driver = driver
+        self._written = False
+        self._pending = []
+
+    @metrics.timed('write')
+    def write(self, gdf):
+        if len(gdf) == 0:
+            return
+        if self.driver in _no_append:
+            self._pending.append(gdf)
+        else:
+            self._write(gdf)
+
+    def _write(self, gdf):
+        gdf.reset_index().to_file(self.path, driver=self.driver,
+                                  mode='a' if self._written else 'w')
+        self._written = True
+
+    @metrics.timed('write')
+    def close(self):
+        if self._pending:
+            self._write(pd.concat(self._pending))
+            self._pending = []
+        if not self._written:
+            warnings.warn('No features to write, {} was not created'.format(self.path))
+
+
+class GeoParquetWriter(_Writer):
+    """Writes each chunk as a row group of a GeoParquet file with WKB-encoded geometries."""
+
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('pyarrow is required for writing GeoParquet files')
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.path = path
+        self._writer = None
+        self._schema = None
+
+    def _table(self, gdf):
+        pa = self._pa
+        geometry_column = gdf.geometry.name
+        df = gdf.drop(geometry_column, axis=1)
+        df[geometry_column] = [g.wkb if g is not None else None for g in gdf.geometry]
+        if self._schema is None:
+            table = pa.Table.from_pandas(df, preserve_index=True)
+            # Columns without any values in the first chunk can get strings later
+            fields = [pa.field(f.name, pa.string()) if f.type == pa.null() else f
+                      for f in table.schema]
+            self._schema = pa.schema(fields, metadata=self._metadata(table.schema.metadata,
+                                                                       geometry_column))
+        return pa.Table.from_pandas(df, schema=self._schema, preserve_index=True)
+
+    def _metadata(self, metadata, geometry_column):
+        import pyproj
+        geo = {
+            'version': '1.0.0',
+            'primary_column': geometry_column,
+            'columns': {
+                geometry_column: {
+                    'encoding': 'WKB',
+                    'geometry_types': [],
+                    'crs': pyproj.CRS.from_epsg(EPSG).to_json_dict(),
+                }
+            }
+        }
+        metadata = dict(metadata or {})
+        metadata[b'geo'] = json.dumps(geo).encode('utf8')
+        return metadata
+
+    @metrics.timed('write')
+    def write(self, gdf):
+        if len(gdf) == 0:
+            return
+        table = self._table(gdf)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self.path, self._schema)
+        self._writer.write_table(table)
+
+    @metrics.timed('write')
+    def close(self):
+        if self._writer is None:
+            warnings.warn('No features to write, {} was not created'.format(self.path))
+        else:
+            self._writer.close()
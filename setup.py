@@ -15,14 +15,11 @@ requirements = [
     'six',
     'click',
     'requests',
-    'retrying',
-    'beautifulsoup4',
     'lxml',
-    'xmltodict',
-    'babel',
     'tqdm',
     'geopandas',
     'pandas',
+    'numpy',
     'shapely',
     'pygeoif'
 ]
@@ -71,6 +68,9 @@ setup(
     tests_require=test_requirements,
     setup_requires=setup_requirements,
     extras_require={
-      'test': test_requirements
+      'test': test_requirements,
+      'geoparquet': ['pyarrow'],
+      'http2': ['httpx[http2]'],
+      'async': ['httpx']
     },
 )
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+"""Fixtures shared by the test modules."""
+
+import sys
+
+import pytest
+
+import metsaregister.metsaregister
+from metsaregister import configure_catalogue
+from tests.stub import StubServer
+
+# The asynchronous API needs the async/await syntax of Python 3.5
+collect_ignore = ['test_aio.py'] if sys.version_info < (3, 5) else []
+
+
+@pytest.fixture(autouse=True)
+def catalogue():
+    """Keep the layer lists in memory only, starting every test without any."""
+    yield configure_catalogue(False)
+    configure_catalogue(False)
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    """Serve the responses recorded in a cassette from a local HTTP server, see `StubServer`."""
+    server = StubServer()
+    monkeypatch.setattr(metsaregister.metsaregister, 'BASE_URL', server.url)
+    yield server
+    server.close()
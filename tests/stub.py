@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+"""
+Replaying the responses recorded in the test cassettes from a local HTTP server, used by the tests
+and, with scaled responses, the benchmarks.
+"""
+
+import os
+import threading
+
+import yaml
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.socketserver import ThreadingMixIn
+from six.moves.urllib.parse import urlsplit
+
+CASSETTES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cassettes')
+
+
+def load_cassette(name):
+    """Return the recorded (method, URL, response body) triples of a cassette."""
+    with open(os.path.join(CASSETTES, name + '.yaml')) as f:
+        interactions = yaml.safe_load(f)['interactions']
+    result = []
+    for interaction in interactions:
+        body = interaction['response']['body']['string']
+        if not isinstance(body, bytes):
+            body = body.encode('utf8')
+        result.append((interaction['request']['method'], interaction['request']['uri'], body))
+    return result
+
+
+class _StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    # The default backlog is too small for many parallel requests
+    request_queue_size = 128
+
+
+class StubServer(object):
+    """
+    A local server answering requests with the responses of the loaded cassettes, matched by path
+    and query string. The paths of the requests made are kept in `requests_made`.
+    """
+
+    def __init__(self):
+        self.responses = {}
+        self.requests_made = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.requests_made.append(self.path)
+                body = server.respond(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers['Content-Length']))
+                self.do_GET()
+
+            def log_message(self, *args):
+                pass
+
+        self._server = _StubServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        self.url = 'http://127.0.0.1:{}/avalik/'.format(self._server.server_address[1])
+
+    def load(self, cassette):
+        """Serve the responses recorded in a cassette."""
+        for method, url, body in load_cassette(cassette):
+            url = urlsplit(url)
+            self.responses[url.path + '?' + url.query] = body
+
+    def respond(self, path):
+        """The response body for the path of a request, or None to answer with a 404."""
+        return self.responses.get(path)
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
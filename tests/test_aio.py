@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the asynchronous API, only collected on Python 3.5+, see conftest.py."""
+
+import asyncio
+import time
+from os.path import abspath, dirname, join
+
+import pandas as pd
+import pytest
+
+import metsaregister.metsaregister
+from metsaregister import query_forest_notifications
+from metsaregister.cli import _read_aoi
+from metsaregister.throttle import configure_throttle, throttle_for
+
+aoi_notifications = _read_aoi(join(dirname(abspath(__file__)), 'fixtures',
+                                   'aoi_notifications.geojson'))
+
+
+def test_aio(stub_server):
+    pytest.importorskip('httpx')
+    from metsaregister.aio import AsyncClient
+    stub_server.load('test_forest_notifications')
+    expected = query_forest_notifications(aoi_notifications, 0)
+
+    async def query():
+        async with AsyncClient(max_concurrency=4) as client:
+            return await client.query_forest_notifications(aoi_notifications)
+
+    loop = asyncio.new_event_loop()
+    try:
+        result = loop.run_until_complete(query())
+    finally:
+        loop.close()
+    pd.testing.assert_frame_equal(expected, result)
+
+
+def test_aio_throttle_and_default_client(stub_server):
+    pytest.importorskip('httpx')
+    from metsaregister import aio
+    stub_server.load('test_forest_notifications')
+    url = metsaregister.metsaregister.BASE_URL
+    configure_throttle(initial_rps=1000, max_rps=1000, max_concurrency=2)
+    try:
+        throttle = throttle_for(url)
+
+        async def query():
+            assert aio.default_client() is aio.default_client()
+            gdf = await aio.query_forest_notifications(aoi_notifications)
+            await aio.close_default_client()
+            return gdf
+
+        # Each event loop gets a default client of its own
+        for _ in range(2):
+            loop = asyncio.new_event_loop()
+            try:
+                assert len(loop.run_until_complete(query())) > 0
+            finally:
+                loop.close()
+        assert not aio._default_clients
+        # All of the requests went through the shared throttle and released their slots
+        assert throttle.rate == 1000
+        assert throttle._active == 0
+
+        async def limited():
+            async with aio.AsyncClient(max_rps=20) as client:
+                start = time.monotonic()
+                await asyncio.gather(*[client.get_info('info_teatis.php?too_id=6046101701')
+                                       for _ in range(5)])
+                return time.monotonic() - start
+
+        loop = asyncio.new_event_loop()
+        try:
+            assert loop.run_until_complete(limited()) >= 0.19
+        finally:
+            loop.close()
+    finally:
+        configure_throttle()
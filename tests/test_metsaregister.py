@@ -1,16 +1,41 @@
 # -*- coding: utf-8 -*-
 
+import datetime
+import json
 import math
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import OrderedDict
 from os.path import abspath, dirname, join
 
 import pandas as pd
 import geopandas as gpd
 import pytest
+import requests
+import shapely.wkt
 from click.testing import CliRunner
-
-from metsaregister import cli, get_info, get_layers, parse_forest_notifications, \
-    query_forest_notifications, query_forest_stands, query_layer
+from shapely.geometry import Point, box
+
+from metsaregister import Client, RateLimiter, batch_forest_notifications, cli, \
+    configure_catalogue, disable_cache, enable_cache, get_info, get_layers, iter_layer, \
+    parse_forest_notifications, query_forest_notifications, query_forest_stands, query_layer, \
+    query_layer_tiled, query_layers, sync_forest_notifications, wkt_to_geometries
+from metsaregister import schema
+from metsaregister.aoi import AOIPreprocessor, read_aoi, read_aois
+from metsaregister.metsaregister import _wkt_to_geometry
+from metsaregister.cache import ResponseCache
+from metsaregister.catalogue import MAX_ENTRIES, LayerCatalogue
+from metsaregister.compact import compact_features, concat_features, feature_urls
 from metsaregister.cli import _read_aoi
+from metsaregister.metrics import Metrics, metrics
+from metsaregister.records import RecordBuilder
+from metsaregister.store import FeatureStore
+from metsaregister.tiling import grid_tiles, split_tile
+from metsaregister.throttle import AdaptiveThrottle, ServerError, configure_throttle, retry
+from metsaregister.writers import open_writer
 
 assert pytest.config.pluginmanager.hasplugin('vcr')
 
@@ -49,6 +74,79 @@ def test_get_layers():
     assert ret['Teatis'] == 10
 
 
+def test_response_cache(stub_server, tmpdir):
+    stub_server.load('test_get_layers')
+    enable_cache(str(tmpdir))
+    try:
+        first = get_layers()
+        assert len(stub_server.requests_made) == 1
+        second = get_layers(refresh=True)
+        assert len(stub_server.requests_made) == 1
+        assert first == second
+
+        # Layer query responses are streamed when not cached
+        stub_server.load('test_query_layer')
+        first = query_layer(empty_aoi, 10)
+        assert len(stub_server.requests_made) == 2
+        second = query_layer(empty_aoi, 10)
+        assert len(stub_server.requests_made) == 2
+        assert list(second.index) == list(first.index)
+    finally:
+        disable_cache()
+
+
+def test_layer_catalogue(stub_server, tmpdir):
+    stub_server.load('test_get_layers')
+    stub_server.load('test_query_layer')
+    path = str(tmpdir.join('layers.json'))
+    configure_catalogue(path)
+    try:
+        layers = get_layers()
+        assert get_layers() == layers
+        assert len(stub_server.requests_made) == 1
+
+        # Loaded from the file in a new process
+        configure_catalogue(path)
+        assert get_layers() == layers
+        assert len(query_layer(empty_aoi, 'Teatis')) > 0
+        assert len(stub_server.requests_made) == 2
+        with pytest.raises(ValueError):
+            query_layer(empty_aoi, 'nope')
+        assert len(stub_server.requests_made) == 3
+
+        # Expired lists are used while a fresh one is fetched in the background
+        configure_catalogue(path, ttl=0)
+        assert get_layers() == layers
+        for _ in range(100):
+            if len(stub_server.requests_made) == 4:
+                break
+            time.sleep(0.01)
+        assert len(stub_server.requests_made) == 4
+    finally:
+        configure_catalogue(False)
+
+
+def test_layer_catalogue_pruning(tmpdir):
+    path = str(tmpdir.join('layers.json'))
+    catalogue = LayerCatalogue(path)
+    for i in range(MAX_ENTRIES + 2):
+        catalogue.put('http://server{}/'.format(i), {'Teatis': 10})
+    with open(path) as f:
+        assert len(json.load(f)) == MAX_ENTRIES
+    assert LayerCatalogue(path).cached('http://server{}/'.format(MAX_ENTRIES + 1)) is not None
+    assert LayerCatalogue(path).cached('http://server0/') is None
+
+
+def test_response_cache_eviction(tmpdir):
+    cache = ResponseCache(str(tmpdir), max_bytes=2500)
+    for i in range(5):
+        cache.put(str(i), 'info.php?id=%d' % i, os.urandom(1000), {})
+    assert cache.size() <= 2500
+    assert cache.get('0') is None
+    assert cache.get('4').body is not None
+    cache.close()
+
+
 @pytest.mark.vcr
 def test_forest_stands():
     ret = query_forest_stands(aoi, 0.1)
@@ -92,6 +190,400 @@ def test_forest_notifications():
     assert not all(ret.dtypes == object)
 
 
+def test_record_builder():
+    records = RecordBuilder()
+    records.append('1', OrderedDict([('Eraldise nr.', 5), ('Pindala (ha)', '1,5'), ('kask %', 60),
+                                     ('Boniteet', 2.0), ('Muu', 'a')]))
+    records.append('2', OrderedDict([('Eraldise nr.', 7), ('Pindala (ha)', '-'), ('Muu', 'b'),
+                                     ('Lisa', 3)]))
+    df = records.build()
+    assert list(df.index) == ['1', '2']
+    assert list(df.columns) == ['Eraldise nr.', 'Pindala (ha)', 'kask %', 'Boniteet', 'Muu',
+                                'Lisa']
+    assert df['Eraldise nr.'].dtype == 'int64'
+    assert df['Pindala (ha)'].dtype == float
+    assert df['Pindala (ha)'].iloc[0] == 1.5
+    assert math.isnan(df['Pindala (ha)'].iloc[1])
+    assert df['kask %'].dtype == float
+    assert df['Boniteet'].tolist()[0] == '2'
+    assert df['Muu'].tolist() == ['a', 'b']
+    assert df['Lisa'].dtype == float
+
+    # Values that do not fit the field's type are kept as they are
+    records.append('3', OrderedDict([('Eraldise nr.', 'x')]))
+    assert records.build()['Eraldise nr.'].tolist() == [5, 7, 'x']
+
+
+def test_schema():
+    assert schema.field('Pindala (ha)').type == 'float'
+    assert schema.field('kask %').type == 'float'
+    assert schema.field('Muu') is None
+    assert schema.field('Eraldis', schema.FOREST_STANDS) is None
+    assert schema.convert('Eraldis', '12') == 12
+    assert schema.convert('Pindala (ha)', '1 234,5') == 1234.5
+    assert math.isnan(schema.convert('Maht (tm)', '-'))
+    assert schema.convert('Reg. nr.', '2940008401') == '2940008401'
+    assert schema.convert('Muu', '3,5') == 3.5
+    dtypes = schema.dtypes(schema.FOREST_NOTIFICATIONS)
+    assert dtypes['Eraldis'] == 'int64'
+    assert dtypes['Töö'] == 'object'
+
+
+def test_forest_notifications_concurrent(stub_server):
+    stub_server.load('test_forest_notifications')
+    sequential = query_forest_notifications(aoi_notifications, 0)
+    n_requests = len(stub_server.requests_made)
+    del stub_server.requests_made[:]
+    concurrent = query_forest_notifications(aoi_notifications, concurrency=4, max_rps=100)
+    assert len(stub_server.requests_made) == n_requests
+    assert sequential.shape[0] > 0
+    pd.testing.assert_frame_equal(sequential, concurrent)
+
+
+def test_forest_notifications_parse_workers(stub_server):
+    stub_server.load('test_forest_notifications')
+    sequential = query_forest_notifications(aoi_notifications, 0)
+    parallel = query_forest_notifications(aoi_notifications, 0, concurrency=2, parse_workers=2)
+    assert sequential.shape[0] > 0
+    pd.testing.assert_frame_equal(sequential, parallel)
+
+
+def test_forest_notifications_checkpoint(stub_server, tmpdir):
+    stub_server.load('test_forest_notifications')
+    checkpoint = str(tmpdir.join('checkpoint.jsonl'))
+    expected = query_forest_notifications(aoi_notifications, 0, checkpoint=checkpoint)
+    n_requests = len(stub_server.requests_made)
+    # Simulate a crash after 5 features, in the middle of writing the 6th one
+    with open(checkpoint, 'rb') as f:
+        lines = f.readlines()
+    with open(checkpoint, 'wb') as f:
+        f.writelines(lines[:5])
+        f.write(lines[5][:20])
+    del stub_server.requests_made[:]
+    resumed = query_forest_notifications(aoi_notifications, 0, checkpoint=checkpoint)
+    assert len(stub_server.requests_made) == n_requests - 5
+    pd.testing.assert_frame_equal(expected, resumed)
+    with open(checkpoint, 'rb') as f:
+        assert len(f.readlines()) == len(expected)
+
+
+def test_sync_forest_notifications(stub_server):
+    stub_server.load('test_forest_notifications')
+    expected = query_forest_notifications(aoi_notifications, 0)
+    previous = expected.drop(expected.index[:2])
+    previous.loc[expected.index[2], 'geometry'] = Point(0, 0).buffer(1)
+    previous = pd.concat([previous, expected.iloc[[3]].rename(index={expected.index[3]: 'old'})])
+    del stub_server.requests_made[:]
+    merged, changes = sync_forest_notifications(previous, aoi_notifications, 0)
+    assert changes['added'] == list(expected.index[:2])
+    assert changes['removed'] == ['old']
+    assert changes['modified'] == [expected.index[2]]
+    # The layer query and the information of the 3 new or modified notifications
+    assert len(stub_server.requests_made) == 4
+    pd.testing.assert_frame_equal(expected, merged, check_like=True)
+
+
+@pytest.mark.parametrize('extension', ['geojson', 'parquet', 'fgb', 'gpkg'])
+def test_sync_from_file(stub_server, tmpdir, extension):
+    if extension == 'parquet':
+        pytest.importorskip('pyarrow')
+    stub_server.load('test_forest_notifications')
+    expected = query_forest_notifications(aoi_notifications, 0)
+    path = str(tmpdir.join('previous.' + extension))
+    with open_writer(path) as writer:
+        writer.write(expected)
+    del stub_server.requests_made[:]
+    merged, changes = sync_forest_notifications(path, aoi_notifications, 0)
+    assert changes == {'added': [], 'removed': [], 'modified': []}
+    # Only the layer query
+    assert len(stub_server.requests_made) == 1
+    pd.testing.assert_frame_equal(expected, merged, check_like=True)
+
+
+def test_batch_forest_notifications(stub_server):
+    stub_server.load('test_forest_notifications')
+    expected = query_forest_notifications(aoi_notifications, 0)
+    del stub_server.requests_made[:]
+    # The stub server returns the same features for both AOIs
+    results = batch_forest_notifications([('a', aoi_notifications), ('b', aoi_notifications)], 0)
+    assert list(results) == ['a', 'b']
+    for gdf in results.values():
+        pd.testing.assert_frame_equal(expected, gdf)
+    # Two layer queries, but the information of every notification is only fetched once
+    assert len(stub_server.requests_made) == 2 + expected.shape[0]
+
+
+def test_batch_cli(stub_server, tmpdir):
+    stub_server.load('test_forest_notifications')
+    aois = gpd.read_file(aoi_notifications_path)
+    aois = gpd.GeoDataFrame(pd.concat([aois, aois]), crs=aois.crs)
+    aois['name'] = ['a', 'b']
+    aois_path = str(tmpdir.join('aois.gpkg'))
+    aois.to_file(aois_path, driver='GPKG')
+
+    runner = CliRunner()
+    result_path = str(tmpdir.join('result.geojson'))
+    r = runner.invoke(cli.cli, ['batch', 'forest_notifications', aois_path, 'name', result_path])
+    assert r.exit_code == 0, r.output
+    gdf = gpd.read_file(result_path)
+    assert sorted(set(gdf['aoi_id'])) == ['a', 'b']
+    assert (gdf['aoi_id'] == 'a').sum() == (gdf['aoi_id'] == 'b').sum()
+
+    split_dir = str(tmpdir.join('split'))
+    r = runner.invoke(cli.cli, ['batch', 'forest_notifications', aois_path, 'name', split_dir,
+                                '--split'])
+    assert r.exit_code == 0, r.output
+    assert sorted(os.listdir(split_dir)) == ['a.geojson', 'b.geojson']
+
+    r = runner.invoke(cli.cli, ['batch', 'forest_notifications', aois_path, 'nope', split_dir])
+    assert r.exit_code != 0
+
+
+@pytest.mark.parametrize('extension', ['geojson', 'parquet', 'fgb', 'gpkg'])
+def test_writers(tmpdir, extension):
+    if extension == 'parquet':
+        pytest.importorskip('pyarrow')
+    gdf = gpd.read_file(join(fixtures_dir, 'result_layer10.geojson')).set_index('id')
+    path = str(tmpdir.join('result.' + extension))
+    with open_writer(path) as writer:
+        writer.write(gdf.iloc[:10])
+        writer.write(gdf.iloc[10:])
+    if extension == 'parquet':
+        result = gpd.read_parquet(path)
+    else:
+        result = gpd.read_file(path).set_index('id')
+    result = result.loc[gdf.index]
+    assert list(result.columns) == list(gdf.columns)
+    assert (result['url'] == gdf['url']).all()
+    assert all(a.equals(b) for a, b in zip(result.geometry, gdf.geometry))
+
+
+def test_adaptive_throttle_releases_on_interrupt():
+    throttle = AdaptiveThrottle(max_concurrency=1)
+    with pytest.raises(KeyboardInterrupt):
+        with throttle.request():
+            raise KeyboardInterrupt()
+    assert throttle._active == 0
+    # Would block forever if the slot had leaked
+    assert throttle.try_acquire() is not None
+
+
+def test_throttle_wait_recorded_once(stub_server):
+    stub_server.load('test_forest_notifications')
+    metrics.reset()
+    with Client() as client:
+        list(client._iter_infos(['info_teatis.php?too_id=6046101701'] * 3,
+                                parse_forest_notifications, max_rps=100))
+    assert metrics.histograms['throttle_wait'].count == metrics.counters['requests'] == 3
+
+
+def test_adaptive_throttle():
+    throttle = AdaptiveThrottle(initial_rps=10, max_rps=12, increase=1)
+    for _ in range(3):
+        with throttle.request():
+            pass
+    assert throttle.rate == 12
+    response = requests.Response()
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    with pytest.raises(requests.HTTPError):
+        with throttle.request():
+            response.raise_for_status()
+    assert throttle.rate == 6
+    start = time.time()
+    throttle.acquire()
+    assert time.time() - start >= 0.9
+    # Errors that are not the server's fault do not slow down the requests
+    with pytest.raises(ValueError):
+        with throttle.request():
+            raise ValueError
+    assert throttle.rate == 6
+
+
+def test_adaptive_throttle_jitter(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr('metsaregister.throttle.monotonic', lambda: clock[0])
+    throttle = AdaptiveThrottle(initial_rps=2, max_rps=20)
+    rnd = random.Random(0)
+
+    def request(latency):
+        clock[0] += throttle.try_acquire()
+        clock[0] += latency
+        throttle.release(latency=latency)
+
+    # A healthy server answering in 100-600 ms, one request at a time
+    for _ in range(500):
+        request(rnd.uniform(0.1, 0.6))
+    assert throttle.rate == 20
+    # A sudden slowdown still counts
+    request(5.0)
+    assert throttle.rate == 10
+
+
+def test_retry():
+    calls = []
+
+    @retry(initial_wait=0.01)
+    def flaky(error):
+        calls.append(error)
+        if len(calls) < 3:
+            raise error
+        return len(calls)
+
+    assert flaky(ServerError('Error')) == 3
+    del calls[:]
+    with pytest.raises(ValueError):
+        flaky(ValueError())
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize('method', ['query_layer', 'iter_layer'])
+def test_layer_query_retried_once(monkeypatch, method):
+    clock = [0.0]
+    attempts = []
+
+    class FakeTime(object):
+        @staticmethod
+        def sleep(seconds):
+            clock[0] += seconds
+
+    class ErrorResponse(object):
+        url = 'http://localhost/flashconf.php'
+        elapsed = datetime.timedelta(0)
+
+        def iter_content(self, chunk_size):
+            return iter([b'Error: try again later'])
+
+    def request(self, method, url, params=None, data=None, stream=False):
+        attempts.append(clock[0])
+        return ErrorResponse()
+
+    monkeypatch.setattr('metsaregister.throttle.monotonic', lambda: clock[0])
+    monkeypatch.setattr('metsaregister.throttle.time', FakeTime)
+    monkeypatch.setattr(Client, '_request', request)
+    metrics.reset()
+    with Client() as client:
+        with pytest.raises(ServerError):
+            list(client.iter_layer(aoi, 10)) if method == 'iter_layer' else client.query_layer(aoi)
+    # Exponential waits of 1, 2, 4 and 8 s, the next one would pass the 30 s deadline
+    assert attempts == [0, 1, 3, 7, 15]
+    assert metrics.counters['retries'] == 4
+
+
+def test_metrics():
+    m = Metrics(buckets=(0.1, 1.0))
+    observed = []
+
+    class Listener(object):
+        def observe(self, stage, seconds):
+            observed.append((stage, seconds))
+
+        def increment(self, name, value):
+            observed.append((name, value))
+
+    m.add_listener(Listener())
+    m.observe('info_request', 0.05)
+    m.observe('info_request', 0.5)
+    m.observe('xml_parse', 2.0)
+    m.increment('cache_hits')
+    m.increment('cache_misses', 3)
+    assert observed == [('info_request', 0.05), ('info_request', 0.5), ('xml_parse', 2.0),
+                        ('cache_hits', 1), ('cache_misses', 3)]
+
+    summary = m.summary()
+    # In the order of the stages of a query
+    assert list(summary['stages']) == ['xml_parse', 'info_request']
+    assert summary['stages']['info_request']['count'] == 2
+    assert summary['stages']['info_request']['total'] == pytest.approx(0.55)
+    assert summary['stages']['xml_parse']['max'] == 2.0
+    assert summary['cache_hit_rate'] == 0.25
+    assert json.loads(m.to_json())['counters']['cache_misses'] == 3
+
+    prometheus = m.to_prometheus().splitlines()
+    bucket = 'metsaregister_stage_duration_seconds_bucket{{stage="{}",le="{}"}} {}'
+    assert bucket.format('info_request', '0.1', 1) in prometheus
+    assert bucket.format('info_request', '1.0', 2) in prometheus
+    assert bucket.format('xml_parse', '+Inf', 1) in prometheus
+    assert 'metsaregister_stage_duration_seconds_count{stage="xml_parse"} 1' in prometheus
+    assert 'metsaregister_cache_misses_total 3' in prometheus
+    assert 'info_request' in m.format_table()
+
+    m.reset()
+    assert m.summary()['stages'] == {}
+
+
+def test_query_metrics(stub_server):
+    stub_server.load('test_forest_notifications')
+    metrics.reset()
+    gdf = query_forest_notifications(aoi_notifications, 0)
+    summary = metrics.summary()
+    for stage in ['layer_request', 'xml_parse', 'wkt_decode', 'info_request', 'throttle_wait',
+                  'html_parse', 'merge']:
+        assert summary['stages'][stage]['count'] > 0, stage
+    assert summary['stages']['info_request']['count'] == len(gdf)
+    assert summary['counters']['requests'] == 1 + len(gdf)
+    assert summary['counters']['layer_bytes'] > 0
+    assert summary['counters']['info_bytes'] > 0
+
+
+def test_stats_cli(stub_server, tmpdir):
+    stub_server.load('test_get_layers')
+    metrics_path = str(tmpdir.join('metrics.prom'))
+    runner = CliRunner()
+    r = runner.invoke(cli.cli, ['list', '--stats', '--metrics-path', metrics_path])
+    assert r.exit_code == 0
+    assert 'layer_list_request' in r.output
+    with open(metrics_path) as f:
+        assert 'metsaregister_requests_total 1' in f.read().splitlines()
+
+
+def test_client(stub_server):
+    stub_server.load('test_forest_notifications')
+    expected = query_forest_notifications(aoi_notifications, 0)
+    with Client(pool_size=2, timeout=5, compression=False) as client:
+        result = client.query_forest_notifications(aoi_notifications, 0, concurrency=2)
+    pd.testing.assert_frame_equal(expected, result)
+
+
+def test_client_httpx_transport(stub_server):
+    pytest.importorskip('httpx')
+    from metsaregister.transports import HTTPXAdapter
+    stub_server.load('test_forest_notifications')
+    expected = query_forest_notifications(aoi_notifications, 0)
+    with Client(transport=HTTPXAdapter(http2=False)) as client:
+        result = client.query_forest_notifications(aoi_notifications, 0, concurrency=2)
+    pd.testing.assert_frame_equal(expected, result)
+
+
+@pytest.mark.parametrize('parse_workers', [None, 'executor'])
+def test_info_fetching_stops_on_error(stub_server, parse_workers):
+    from concurrent.futures import ThreadPoolExecutor
+    stub_server.load('test_forest_notifications')
+    configure_throttle(initial_rps=1000, max_rps=1000)
+    # Not a retryable error
+    urls = ['info_teatis.php?too_id=nope'] + ['info_teatis.php?too_id=6046101701'] * 200
+    executor = ThreadPoolExecutor(2) if parse_workers else None
+    try:
+        with Client() as client:
+            with pytest.raises(requests.HTTPError):
+                list(client._iter_infos(urls, parse_forest_notifications, concurrency=4,
+                                        parse_workers=executor))
+        # Only the requests submitted ahead of the failed one were sent
+        assert len(stub_server.requests_made) <= 10
+    finally:
+        configure_throttle()
+        if executor is not None:
+            executor.shutdown()
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(50)
+    start = time.time()
+    for _ in range(6):
+        limiter.acquire()
+    assert time.time() - start >= 0.09
+
+
 @pytest.mark.vcr
 def test_forest_notifications_empty_response():
     ret = query_forest_notifications(empty_aoi)
@@ -111,6 +603,207 @@ def test_query_layer():
     assert len(list(ret)) > 0
 
 
+def test_query_layers(stub_server):
+    stub_server.load('test_forest_stands')
+    stub_server.load('test_get_layers')
+    gdf = query_layers(aoi, [11, 'Eraldised RMK'])
+    expected = [query_layer(aoi, 11), query_layer(aoi, 12)]
+    assert len(gdf) == sum(len(e) for e in expected)
+    assert sorted(set(gdf['layer_id'])) == [11, 12]
+
+    split = query_layers(aoi, ['12', 11], concurrency=1, split=True)
+    assert list(split) == [12, 11]
+    assert list(split[11].index) == list(expected[0].index)
+    assert list(split[12].index) == list(expected[1].index)
+
+    with pytest.raises(ValueError):
+        query_layers(aoi, ['nope'])
+
+
+def test_query_layers_cli(stub_server, tmpdir):
+    stub_server.load('test_forest_stands')
+    stub_server.load('test_get_layers')
+    runner = CliRunner()
+    result_path = str(tmpdir.join('result.gpkg'))
+    r = runner.invoke(cli.cli, ['get_layers', aoi_path, result_path, '11', 'Eraldised RMK'])
+    assert r.exit_code == 0, r.output
+    assert sorted(set(gpd.read_file(result_path)['layer_id'])) == [11, 12]
+
+    split_dir = str(tmpdir.join('split'))
+    r = runner.invoke(cli.cli, ['get_layers', aoi_path, split_dir, '11', '12', '--split'])
+    assert r.exit_code == 0, r.output
+    assert sorted(os.listdir(split_dir)) == ['11.geojson', '12.geojson']
+
+    r = runner.invoke(cli.cli, ['get_layers', aoi_path, result_path, 'nope'])
+    assert r.exit_code != 0
+
+
+def test_aoi_preprocessor(stub_server):
+    stub_server.load('test_query_layer')
+    full = query_layer(empty_aoi, 10)
+    minx, miny, maxx, maxy = full.total_bounds
+    geometry = Point((minx + maxx) / 2, (miny + maxy) / 2).buffer((maxx - minx) / 4, 256)
+    aoi = geometry.wkt
+
+    request_aoi, filter_geometry = AOIPreprocessor(tolerance=5).prepare(aoi)
+    assert len(request_aoi) < len(aoi) / 4
+    assert shapely.wkt.loads(request_aoi).contains(geometry)
+    assert filter_geometry.equals(geometry)
+    request_aoi, _ = AOIPreprocessor(bbox=True).prepare(aoi)
+    assert len(shapely.wkt.loads(request_aoi).exterior.coords) == 5
+    assert shapely.wkt.loads(request_aoi).contains(geometry)
+
+    with Client(preprocessor=AOIPreprocessor(tolerance=5)) as client:
+        ret = client.query_layer(aoi, 10)
+        chunks = list(client.iter_layer(aoi, 10, chunk_size=3))
+    expected = full[full.intersects(geometry)]
+    assert 0 < len(ret) < len(full)
+    assert list(ret.index) == list(expected.index)
+    assert list(pd.concat(chunks).index) == list(expected.index)
+
+
+def test_read_aoi(tmpdir):
+    boxes = [box(0, 0, 10, 10), box(10, 0, 20, 10), box(0, 10, 10, 20)]
+    parcels = gpd.GeoDataFrame({'name': ['a', 'b', 'a']}, geometry=boxes, crs='EPSG:3301')
+    path = str(tmpdir.join('parcels.gpkg'))
+    parcels.to_file(path, driver='GPKG')
+    assert shapely.wkt.loads(read_aoi(path)).equals(parcels.unary_union)
+    aois = read_aois(path, 'name')
+    assert [id for id, _ in aois] == ['a', 'b']
+    assert shapely.wkt.loads(aois[0][1]).equals(box(0, 0, 10, 20))
+    assert [id for id, _ in read_aois(path)] == ['0', '1', '2']
+    with pytest.raises(ValueError):
+        read_aois(path, 'nope')
+
+    # Reprojected to L-EST97
+    wgs84_path = str(tmpdir.join('aoi.gpkg'))
+    gpd.read_file(aoi_path).to_crs(epsg=4326).to_file(wgs84_path, driver='GPKG')
+    assert shapely.wkt.loads(read_aoi(wgs84_path)).equals_exact(shapely.wkt.loads(aoi), 0.01)
+
+
+def test_compact_features(stub_server):
+    stub_server.load('test_query_layer')
+    full = query_layer(empty_aoi, 10)
+    compact = query_layer(empty_aoi, 10, compact=True)
+    assert compact.index.dtype == 'int64'
+    assert list(compact.index) == [int(id) for id in full.index]
+    assert 'url' not in compact.columns
+    assert list(feature_urls(compact)) == list(full['url'])
+    assert all(a.equals(b) for a, b in zip(compact.geometry, full.geometry))
+
+    chunks = list(iter_layer(empty_aoi, 10, chunk_size=3, compact=True))
+    concatenated = concat_features(chunks)
+    assert list(concatenated.index) == list(compact.index)
+    assert list(feature_urls(concatenated)) == list(full['url'])
+
+    # URLs not made of the feature IDs are kept
+    mixed = full.copy()
+    mixed['url'] = ['other.php?id=1'] + list(full['url'][1:])
+    assert list(feature_urls(compact_features(mixed))) == list(mixed['url'])
+    assert list(feature_urls(concat_features([compact_features(mixed), compact]))) == \
+        list(mixed['url']) + list(full['url'])
+
+
+def test_feature_store(stub_server, tmpdir):
+    stub_server.load('test_query_layer')
+    area = box(*query_layer(empty_aoi, 10).total_bounds)
+    minx, miny, maxx, maxy = area.bounds
+    half = box(minx, miny, (minx + maxx) / 2, maxy)
+    del stub_server.requests_made[:]
+    store = FeatureStore(str(tmpdir), ttl=60)
+    with Client(store=store) as client:
+        first = client.query_layer(half.wkt, 10)
+        assert len(stub_server.requests_made) == 1
+        assert len(first) > 0
+
+        # Answered from the store
+        quarter = box(*half.buffer(-100).bounds)
+        local = client.query_layer(quarter.wkt, 10)
+        assert len(stub_server.requests_made) == 1
+        assert 0 < len(local) < len(first)
+        assert set(local.index) <= set(first.index)
+        assert all(local.intersects(quarter))
+
+        # Only the uncovered half is queried from the server
+        full = client.query_layer(area.wkt, 10)
+        assert len(stub_server.requests_made) == 2
+        assert set(first.index) < set(full.index)
+        assert list(full.columns) == list(first.columns)
+    store.close()
+
+
+def test_iter_layer(stub_server):
+    stub_server.load('test_query_layer')
+    chunks = list(iter_layer(empty_aoi, 10, chunk_size=3))
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 3 for chunk in chunks)
+    gdf = query_layer(empty_aoi, 10)
+    assert gdf.crs == chunks[0].crs
+    pd.testing.assert_frame_equal(pd.concat(chunks), gdf)
+
+
+def test_wkt_to_geometries():
+    wkts = pd.Series([
+        'POLYGON ((0 0, 1 0, 1 1, 0 0))',
+        # Unclosed ring
+        'POLYGON ((0 0, 1 0, 1 1, 0 1))',
+        'GEOMETRYCOLLECTION (POLYGON ((0 0, 1 0, 1 1, 0 0)), LINESTRING (0 0, 5 5), '
+        'POLYGON ((2 2, 3 2, 3 3, 2 2)))',
+    ], index=['a', 'b', 'c'])
+    geometries = wkt_to_geometries(wkts)
+    assert len(geometries) == 3
+    assert geometries[2].geom_type == 'MultiPolygon'
+    for geometry, wkt in zip(geometries, wkts):
+        assert geometry.equals(_wkt_to_geometry(wkt))
+
+
+@pytest.mark.parametrize('tiled_aoi', [
+    Point(1000, 1000).buffer(700).wkt,
+    # Edges along the grid lines, touching some cells only along an edge or at a point
+    'POLYGON ((0 0, 2000 0, 2000 1000, 1000 1000, 1000 2000, 0 2000, 0 0))',
+], ids=['circle', 'grid-aligned'])
+def test_query_layer_tiled(monkeypatch, tiled_aoi):
+    # A fake layer of 20 x 20 square features, each 100 m wide
+    features = gpd.GeoDataFrame(
+        {'url': ['info.php?id=%d' % i for i in range(400)]},
+        index=[str(i) for i in range(400)],
+        geometry=[box(x * 100, y * 100, x * 100 + 90, y * 100 + 90)
+                  for y in range(20) for x in range(20)],
+        crs={'init': 'epsg:3301'}
+    )
+    features.index.name = 'id'
+    queried = []
+
+    def fake_query_layer(self, aoi, layer_id=10, compact=False):
+        geom = shapely.wkt.loads(aoi)
+        queried.append((self, geom))
+        # In an order other than that of the IDs, like the server
+        return features[features.intersects(geom)].iloc[::-1]
+
+    monkeypatch.setattr(Client, 'query_layer', fake_query_layer)
+    aoi = tiled_aoi
+    expected = fake_query_layer(None, aoi).sort_index()
+    ret = query_layer_tiled(aoi, tile_size=500, max_features=30, concurrency=3)
+    assert len(queried) > 10
+    assert all(g.geom_type in ('Polygon', 'MultiPolygon') and g.area > 0 for _, g in queried)
+    assert ret.equals(expected)
+
+    # The settings of the client are used
+    with Client(base_url='http://example.com/') as client:
+        del queried[:]
+        ret = client.query_layer_tiled(aoi, tile_size=500, max_features=30, concurrency=3)
+        assert all(c is client for c, _ in queried)
+    assert ret.equals(expected)
+
+
+def test_tiles_touching_aoi():
+    # Cells and quadrants meeting the AOI only along an edge or at a point are dropped
+    aoi = shapely.wkt.loads('POLYGON ((0 0, 20 0, 20 10, 10 10, 10 20, 0 20, 0 0))')
+    expected = [(0, 0, 10, 10), (0, 10, 10, 20), (10, 0, 20, 10)]
+    assert sorted(tile.bounds for tile in grid_tiles(aoi, 10)) == expected
+    assert sorted(tile.bounds for tile in split_tile(aoi)) == expected
+
+
 def test_command_line_interface():
     runner = CliRunner()
     help_result = runner.invoke(cli.cli, ['--help'])
@@ -118,6 +811,30 @@ def test_command_line_interface():
     assert '--help  Show this message and exit.' in help_result.output
 
 
+# Regression budgets for the cumulative import time of the modules in seconds, measured with
+# `python -X importtime`. Most of the time of metsaregister.metsaregister goes to requests.
+@pytest.mark.parametrize('module, budget', [
+    ('metsaregister', 0.1),
+    ('metsaregister.cli', 0.3),
+    ('metsaregister.metsaregister', 1.0),
+    ('metsaregister.sync', 1.0),
+    ('metsaregister.batch', 1.0),
+])
+def test_import_time(module, budget):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    command = [sys.executable, '-X', 'importtime', '-c', 'import ' + module]
+    stderr = subprocess.check_output(command, stderr=subprocess.STDOUT, env=env).decode('utf8')
+    imported = {}
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line.split('|')
+            if cumulative.strip().isdigit():
+                imported[name.strip()] = int(cumulative) / 1e6
+    # The heavy dependencies are only imported when they are used
+    assert not {'pandas', 'geopandas', 'shapely', 'numpy', 'tqdm'} & set(imported)
+    assert imported[module] < budget
+
+
 @pytest.mark.vcr
 def test_list_layers_cli():
     runner = CliRunner()